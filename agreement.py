@@ -0,0 +1,243 @@
+import os
+import secrets
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import common
+import export
+
+CONFLICT_COLUMNS = ['Set', 'URL', 'Company Name', 'Tag', 'Labels']
+
+
+def cohen_kappa(confusion):
+    """
+    Cohen's kappa from a Counter of (label_a, label_b) -> rows, in O(labels²).
+
+    Returns:
+        float or None: None when kappa is undefined (no rows, or both raters
+        always used the same single label).
+    """
+    total = sum(confusion.values())
+    if not total:
+        return None
+    observed = sum(count for (label_a, label_b), count in confusion.items() if label_a == label_b) / total
+    marginals_a, marginals_b = Counter(), Counter()
+    for (label_a, label_b), count in confusion.items():
+        marginals_a[label_a] += count
+        marginals_b[label_b] += count
+    expected = sum(marginals_a[label] * marginals_b[label] for label in marginals_a) / (total * total)
+    if expected >= 1:
+        return None
+    return (observed - expected) / (1 - expected)
+
+
+def fleiss_kappa(rows, raters, agree_sum, label_totals):
+    """
+    Fleiss' kappa from aggregate counts over rows that each have `raters` labels.
+
+    Args:
+        rows: Number of fully rated rows.
+        raters: Labels per row.
+        agree_sum: Sum over rows and labels of n_ij * (n_ij - 1).
+        label_totals: Counter of label -> labels given over those rows.
+
+    Returns:
+        float or None: None when kappa is undefined.
+    """
+    if rows == 0 or raters < 2:
+        return None
+    observed = agree_sum / (rows * raters * (raters - 1))
+    expected = sum((count / (rows * raters)) ** 2 for count in label_totals.values())
+    if expected >= 1:
+        return None
+    return (observed - expected) / (1 - expected)
+
+
+class _Group:
+    """Running Fleiss counts for the rows of one set, all rated by the same number of users."""
+
+    def __init__(self, raters):
+        self.raters = raters
+        self.rows = 0
+        self.agree_sum = 0
+        self.label_totals = Counter()
+        self.conflicts = 0
+
+    def add(self, labels, sign):
+        """Add (sign=1) or remove (sign=-1) a row's labels, counting it only once fully rated."""
+        counts = Counter(labels.values())
+        if len(counts) > 1:
+            self.conflicts += sign
+        if len(labels) != self.raters:
+            return
+        self.rows += sign
+        for label, count in counts.items():
+            self.agree_sum += sign * count * (count - 1)
+            self.label_totals[label] += sign * count
+
+
+class AgreementTracker:
+    """
+    Inter-annotator agreement maintained as tags arrive.
+
+    Keeps each user's current label per row, a confusion Counter per pair of
+    users that labelled the same rows, and per-set Fleiss counts. Each tag
+    updates them in O(users on the row); kappas are then computed from the
+    counts in O(labels²) without rescanning any tags. Rows whose users
+    disagree are tracked for adjudication.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rebuild()
+
+    def rebuild(self, sets=None, set_to_users=None, annotations=(), raters_per_row=None):
+        """
+        Reset the assignment and replay stored labels.
+
+        Args:
+            sets: List of row-index lists, one per set.
+            set_to_users: Dict of set index -> users assigned to it.
+            annotations: Iterable of (row_idx, account_id, tag), e.g. from
+                storage.load_annotations().
+            raters_per_row: With no sets (dynamic assignment), the number of
+                users each row goes to; Fleiss' kappa is then reported for all
+                rows as set -1.
+        """
+        sets = sets or []
+        set_to_users = set_to_users or {}
+        with self._lock:
+            self.row_to_set = {}
+            for set_idx, rows in enumerate(sets):
+                self.row_to_set.update(dict.fromkeys(np.asarray(rows, dtype=np.int64).tolist(), set_idx))
+            self.groups = {set_idx: _Group(len(set_to_users.get(set_idx, []))) for set_idx in range(len(sets))}
+            self.default_group = None
+            if not sets and raters_per_row:
+                self.default_group = self.groups[-1] = _Group(raters_per_row)
+            self.labels = {}
+            self.pairs = {}
+            self.conflicts = set()
+        for row_idx, account_id, tag in annotations:
+            self.record(row_idx, account_id, tag)
+
+    def _group(self, row_idx):
+        set_idx = self.row_to_set.get(row_idx)
+        return self.default_group if set_idx is None else self.groups[set_idx]
+
+    def record(self, row_idx, account_id, tag):
+        """Account for account_id (re)labelling row_idx with tag; a missing tag withdraws the label."""
+        row_idx, tag = int(row_idx), None if common.is_blank(tag) else tag
+        with self._lock:
+            row_labels = self.labels.get(row_idx, {})
+            old_tag = row_labels.get(account_id)
+            if old_tag == tag:
+                return
+            group = self._group(row_idx)
+            if group is not None:
+                group.add(row_labels, -1)
+            for other, other_tag in row_labels.items():
+                if other == account_id:
+                    continue
+                key, flip = ((account_id, other), False) if account_id < other else ((other, account_id), True)
+                confusion = self.pairs.setdefault(key, Counter())
+                if old_tag is not None:
+                    confusion[(other_tag, old_tag) if flip else (old_tag, other_tag)] -= 1
+                if tag is not None:
+                    confusion[(other_tag, tag) if flip else (tag, other_tag)] += 1
+            if tag is None:
+                row_labels.pop(account_id, None)
+            else:
+                row_labels[account_id] = tag
+            if row_labels:
+                self.labels[row_idx] = row_labels
+            else:
+                self.labels.pop(row_idx, None)
+            if group is not None:
+                group.add(row_labels, 1)
+            if len(set(row_labels.values())) > 1:
+                self.conflicts.add(row_idx)
+            else:
+                self.conflicts.discard(row_idx)
+
+    def pair_stats(self):
+        """Per pair of users: shared rows, raw agreement and Cohen's kappa."""
+        with self._lock:
+            pairs = {key: +confusion for key, confusion in self.pairs.items()}
+        stats = []
+        for (user_a, user_b), confusion in sorted(pairs.items()):
+            shared = sum(confusion.values())
+            if not shared:
+                continue
+            agreed = sum(count for (label_a, label_b), count in confusion.items() if label_a == label_b)
+            stats.append({"User A": user_a, "User B": user_b, "Shared Rows": shared,
+                          "Agreement": agreed / shared, "Cohen's Kappa": cohen_kappa(confusion)})
+        return stats
+
+    def set_stats(self):
+        """Per set: fully rated rows, conflicting rows and Fleiss' kappa."""
+        with self._lock:
+            groups = [(set_idx, group.raters, group.rows, group.agree_sum, +group.label_totals, group.conflicts)
+                      for set_idx, group in sorted(self.groups.items())]
+        return [{"Set": set_idx, "Users": raters, "Fully Rated Rows": rows, "Conflicting Rows": conflicts,
+                 "Fleiss' Kappa": fleiss_kappa(rows, raters, agree_sum, label_totals)}
+                for set_idx, raters, rows, agree_sum, label_totals, conflicts in groups]
+
+    def conflict_rows(self):
+        """Rows whose users currently disagree, with each user's label, in row order."""
+        with self._lock:
+            return [(row_idx, dict(self.labels[row_idx])) for row_idx in sorted(self.conflicts)]
+
+    def summary(self):
+        with self._lock:
+            return {"labelled_rows": len(self.labels), "conflicting_rows": len(self.conflicts),
+                    "pairs": sum(1 for confusion in self.pairs.values() if any(confusion.values()))}
+
+    def snapshot(self):
+        """Every current label as (row_idx, account_id, tag), e.g. for persisting on compaction."""
+        with self._lock:
+            return [(row_idx, account_id, tag) for row_idx, row_labels in self.labels.items()
+                    for account_id, tag in row_labels.items()]
+
+
+def iter_conflict_chunks(tracker, news_data, chunk_size=export.CHUNK_SIZE, report=None):
+    """Yield the conflicting rows with their item details as DataFrames of at most chunk_size rows."""
+    report = report or common.no_progress
+    conflicts = tracker.conflict_rows()
+    conflicts = [(row_idx, labels) for row_idx, labels in conflicts if row_idx < len(news_data)]
+    for offset in range(0, len(conflicts), chunk_size):
+        chunk = conflicts[offset:offset + chunk_size]
+        rows = [row_idx for row_idx, _ in chunk]
+        frame = news_data.to_frame(['URL', 'Company Name', 'Tag'], rows)
+        frame.insert(0, 'Row', rows)
+        frame.insert(1, 'Set', [tracker.row_to_set.get(row_idx) for row_idx in rows])
+        frame['Labels'] = ["; ".join(f"{account_id}={tag}" for account_id, tag in sorted(labels.items()))
+                           for _, labels in chunk]
+        yield frame
+        report(min(1.0, (offset + chunk_size) / len(conflicts)), f"Exported {offset + len(chunk):,} conflicts")
+
+
+def export_conflicts(report, tracker, news_data, fmt, export_dir=export.EXPORT_DIR):
+    """
+    Background job: write the rows annotators disagree on to a new file in export_dir for adjudication.
+
+    Returns:
+        tuple: (path of the written file, number of rows exported)
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"conflicts_{time.strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(3)}.{fmt}")
+    written = export.write_chunks(path, fmt, iter_conflict_chunks(tracker, news_data, report=report),
+                                  CONFLICT_COLUMNS)
+    return path, written
+
+
+def stats_frames(tracker):
+    """Pair and set statistics as DataFrames for the Summary tab."""
+    pair_df = pd.DataFrame(tracker.pair_stats(), columns=["User A", "User B", "Shared Rows", "Agreement",
+                                                          "Cohen's Kappa"])
+    set_df = pd.DataFrame(tracker.set_stats(), columns=["Set", "Users", "Fully Rated Rows", "Conflicting Rows",
+                                                        "Fleiss' Kappa"])
+    return pair_df, set_df
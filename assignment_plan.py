@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+from collections.abc import Mapping
+
+import numpy as np
+
+import common
+
+PLAN_FILE = "plan.json"  # Written last; a directory without it is incomplete
+
+
+def _pack(groups, num_rows):
+    """Concatenate a list of row lists into (values, offsets) arrays."""
+    dtype = common.index_dtype(num_rows)
+    offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(group) for group in groups])
+    values = np.empty(offsets[-1], dtype=dtype)
+    for i, group in enumerate(groups):
+        values[offsets[i]:offsets[i + 1]] = group
+    return values, offsets
+
+
+class UserRows(Mapping):
+    """Read-only account_id -> rows mapping backed by (memory-mapped) offset arrays."""
+
+    def __init__(self, account_ids, rows, offsets):
+        self._index = {account_id: i for i, account_id in enumerate(account_ids)}
+        self._rows = rows
+        self._offsets = offsets
+
+    def __getitem__(self, account_id):
+        i = self._index[account_id]
+        return self._rows[self._offsets[i]:self._offsets[i + 1]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def save_plan(plan_dir, num_rows, sets, set_to_users, user_to_rows):
+    """
+    Save an assignment plan as .npy arrays plus a small JSON header.
+
+    The plan is written to a temporary directory and swapped in, so a crash
+    never leaves a half-written plan behind.
+
+    Args:
+        plan_dir: Directory to write the plan to.
+        num_rows: Number of rows in the dataset the plan was built for.
+        sets: List of row index lists, one per set.
+        set_to_users: Dict of set index -> list of account_ids.
+        user_to_rows: Dict of account_id -> list of row indices.
+    """
+    tmp_dir = plan_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    account_ids = list(user_to_rows.keys())
+    set_rows, set_offsets = _pack(sets, num_rows)
+    user_rows, user_offsets = _pack([user_to_rows[account_id] for account_id in account_ids], num_rows)
+    for name, array in (("set_rows", set_rows), ("set_offsets", set_offsets),
+                        ("user_rows", user_rows), ("user_offsets", user_offsets)):
+        np.save(os.path.join(tmp_dir, name + ".npy"), array)
+    header = {"num_rows": int(num_rows), "account_ids": account_ids,
+              "set_to_users": {str(set_idx): list(users) for set_idx, users in set_to_users.items()}}
+    with open(os.path.join(tmp_dir, PLAN_FILE), "w") as f:
+        json.dump(header, f)
+    shutil.rmtree(plan_dir, ignore_errors=True)
+    os.replace(tmp_dir, plan_dir)
+
+
+def load_plan(plan_dir, num_rows=None):
+    """
+    Memory-map a saved assignment plan.
+
+    Args:
+        plan_dir: Directory the plan was saved to.
+        num_rows: If given, the plan is only used when it was built for a
+            dataset of this size.
+
+    Returns:
+        tuple: (sets, set_to_users, user_to_rows), or None if there is no
+        usable plan. Row lists are read-only numpy views.
+    """
+    for path in (plan_dir, plan_dir + ".tmp"):
+        if os.path.exists(os.path.join(path, PLAN_FILE)):
+            break
+    else:
+        return None
+    with open(os.path.join(path, PLAN_FILE), "r") as f:
+        header = json.load(f)
+    if num_rows is not None and header["num_rows"] != num_rows:
+        return None
+    arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+              for name in ("set_rows", "set_offsets", "user_rows", "user_offsets")}
+    set_offsets = arrays["set_offsets"]
+    sets = [arrays["set_rows"][set_offsets[i]:set_offsets[i + 1]] for i in range(len(set_offsets) - 1)]
+    set_to_users = {int(set_idx): users for set_idx, users in header["set_to_users"].items()}
+    user_to_rows = UserRows(header["account_ids"], arrays["user_rows"], arrays["user_offsets"])
+    return sets, set_to_users, user_to_rows
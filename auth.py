@@ -0,0 +1,168 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+import pandas as pd
+
+HASH_ITERATIONS = 10000
+CREDENTIAL_COLUMNS = ['account_id', 'salt', 'password_hash']
+SESSION_TTL = 30 * 60  # Seconds a session token stays valid after login
+
+_lock = threading.Lock()
+# Held while the credential index is reloaded, so concurrent logins wait for one reload instead of each doing it
+_load_lock = threading.Lock()
+
+# account_id -> (salt, password hash), reloaded only when the stored credentials change
+_credentials = {}
+_credentials_version = None
+
+# token -> (account_id, expires_at)
+_sessions = {}
+# account_ids of sessions check_session() found expired, until expire_sessions() reports them
+_expired = []
+
+
+def hash_password(password, salt):
+    return hashlib.pbkdf2_hmac('sha256', str(password).encode('utf-8'), salt, HASH_ITERATIONS)
+
+
+def hash_credentials(account_ids, passwords):
+    """
+    The stored form of new credentials: a random salt and the password hash
+    per account, hex-encoded. Passwords themselves are never persisted.
+
+    Returns:
+        pd.DataFrame: Columns 'account_id', 'salt' and 'password_hash'.
+    """
+    salts = [os.urandom(16) for _ in account_ids]
+    return pd.DataFrame({
+        'account_id': [str(account_id) for account_id in account_ids],
+        'salt': [salt.hex() for salt in salts],
+        'password_hash': [hash_password(password, salt).hex() for password, salt in zip(passwords, salts)]
+    }, columns=CREDENTIAL_COLUMNS)
+
+
+def load_credentials(store):
+    """
+    Return the credential index, re-reading the stored hashes only if their
+    version (file mtime and size, or the database token) changed since the
+    last load. Only one thread reloads; the others wait and reuse its index.
+
+    Args:
+        store: The app's storage backend.
+
+    Returns:
+        dict: Maps account_id to a (salt, password hash) tuple; empty if no
+        credentials have been stored.
+    """
+    global _credentials, _credentials_version
+    version = store.credentials_version()
+    if version is not None and version == _credentials_version:
+        return _credentials
+    with _load_lock:
+        # Re-check: another login may have reloaded this version while we waited
+        version = store.credentials_version()
+        if version is None or version != _credentials_version:
+            index = store.read_credentials() if version is not None else {}
+            with _lock:
+                _credentials, _credentials_version = index, version
+        return _credentials
+
+
+def authenticate(store, account_id, password):
+    """
+    Check a password against the credential index.
+
+    Returns:
+        tuple: (success, message)
+    """
+    credentials = load_credentials(store)
+    if not credentials:
+        return False, "No credentials found. Please upload files first."
+    entry = credentials.get(account_id)
+    if entry is None:
+        return False, "Account ID not found."
+    salt, expected = entry
+    if not hmac.compare_digest(hash_password(password, salt), expected):
+        return False, "Incorrect password."
+    return True, "Login successful!"
+
+
+def issue_session(account_id, ttl=SESSION_TTL):
+    token = secrets.token_urlsafe(16)
+    with _lock:
+        _sessions[token] = (account_id, time.time() + ttl)
+    return token
+
+
+def check_session(token):
+    """Return the account_id a session token belongs to, or None if it is unknown or expired."""
+    if not token:
+        return None
+    session = _sessions.get(token)
+    if session is None:
+        return None
+    account_id, expires_at = session
+    if time.time() > expires_at:
+        with _lock:
+            if _sessions.pop(token, None) is not None:
+                _expired.append(account_id)
+        return None
+    return account_id
+
+
+def revoke_session(token):
+    with _lock:
+        _sessions.pop(token, None)
+
+
+def revoke_all_sessions():
+    """Drop every session, e.g. after new passwords have been generated."""
+    with _lock:
+        _sessions.clear()
+        _expired.clear()
+
+
+def expire_sessions(now=None):
+    """
+    Drop every expired session.
+
+    Returns:
+        set: account_ids whose sessions expired (since the last call) and
+        that have no live session left, i.e. users who left without logging
+        out.
+    """
+    now = time.time() if now is None else now
+    with _lock:
+        expired = set(_expired)
+        _expired.clear()
+        for token, (account_id, expires_at) in list(_sessions.items()):
+            if now > expires_at:
+                del _sessions[token]
+                expired.add(account_id)
+        return expired - {account_id for account_id, _ in _sessions.values()}
+
+
+def start_session_sweeper(on_expire, interval=60):
+    """
+    Call on_expire(account_id) for every user expire_sessions() reports,
+    every interval seconds on a daemon thread.
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                for account_id in expire_sessions():
+                    on_expire(account_id)
+            except Exception as e:
+                print(f"Error occurred while expiring sessions: {e}")
+
+    thread = threading.Thread(target=run, name="session-sweeper", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+
+def no_progress(fraction, message=None):
+    """Progress callback that ignores the updates, for callers that pass none."""
+    pass
+
+
+def is_missing(value):
+    """True for None, pd.NA and NaN (as read from pandas)."""
+    return value is None or value is pd.NA or (isinstance(value, float) and value != value)
+
+
+def is_blank(value):
+    """True for a missing value or an empty string, e.g. a tag that was never set."""
+    return is_missing(value) or value == ''
+
+
+def index_dtype(n):
+    """Smallest of int32/int64 that holds row indexes below n."""
+    return np.int32 if n < 2 ** 31 else np.int64
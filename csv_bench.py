@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import text_clean
+
+COMMON_PREFIX = "https://example.com/files/"
+# Words with the characters the cleaning removes or must keep: commas, backticks, control and format characters, accents, emoji
+WORDS = np.array(["market", "shares", "rose,", "fell", "`quoted`", "tab\there", "line\nbreak", "nul\x00byte",
+                  "zero\u200bwidth", "soft\u00adhyphen", "café", "Zürich", "日本", "emoji\U0001F600", "İstanbul",
+                  "bell\x07", "del\x7f", "nbsp\u00a0space", "private\ue000use", "plain"], dtype=object)
+COMPANIES = np.array(["Acme Corp", "Globex", "Initech Ltd.", "Umbrella & Co", "Société Générale", "Wayne Enterprises"],
+                     dtype=object)
+REMOVED = {"Title": ",", "Body": "`,"}
+TEXT_LENGTH = 50  # Cleaned characters csv_export.py keeps of each Title and Body
+
+
+def generate_articles(rows, words_per_title=12, words_per_body=60, nan_density=0.02, seed=0):
+    """Synthetic export with the columns csv_export.py reads."""
+    rng = np.random.default_rng(seed)
+
+    def text(num_words):
+        picked = WORDS[rng.integers(0, len(WORDS), (rows, num_words))]
+        values = pd.Series([" ".join(row) for row in picked.tolist()])
+        return values.where(rng.random(rows) >= nan_density)
+
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 2000, rows), unit="D")
+    urls = pd.Series([f"https://news.example.com/{i}" for i in range(rows)])
+    return pd.DataFrame({
+        "ArticleID": rng.integers(1, 10 ** 7, rows),
+        "Company": COMPANIES[rng.integers(0, len(COMPANIES), rows)],
+        "Date": pd.Series(dates).where(rng.random(rows) >= nan_density),
+        "URL": urls.where(rng.random(rows) >= 0.5, ""),  # Half the rows get a generated link
+        "Title": text(words_per_title),
+        "Body": text(words_per_body),
+    })
+
+
+def reference_links(df, common_prefix):
+    """The link generation csv_export.py did before text_clean.make_links()."""
+    suffix = (df['ArticleID'].astype(str) + '_' + df['Company'].str.replace(' ', '_') + '_' +
+              df['Date'].dt.strftime('%Y-%m-%d'))
+    clean_suffix = suffix.str.lower().str.replace(r'[^a-z0-9_-]', '', regex=True)
+    return df['URL'].where(df['URL'].notna() & (df['URL'].str.strip() != ''), common_prefix + clean_suffix)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run_once(df, reference=True):
+    """
+    Time cleaning Title and Body (to their first TEXT_LENGTH characters, as
+    csv_export.py does) and generating the links, vectorized and (optionally)
+    with the per-row reference, and check they match.
+
+    Returns:
+        dict: Seconds per step and whether each output is identical.
+    """
+    result = {}
+    # The first call scans Unicode for the control characters; time it apart from the cleaning
+    _, result["pattern_build_s"] = _timed(text_clean.removal_pattern, REMOVED["Title"])
+    for column, remove_chars in REMOVED.items():
+        values = df[column].fillna('')
+        cleaned, seconds = _timed(text_clean.clean_prefix, values, remove_chars, TEXT_LENGTH)
+        step = {"vectorized_s": seconds}
+        if reference:
+            expected, step["reference_s"] = _timed(
+                lambda: values.apply(lambda text: text_clean.clean_text(text, remove_chars)).str[:TEXT_LENGTH])
+            step["speedup"] = step["reference_s"] / seconds if seconds else None
+            step["identical"] = cleaned.tolist() == expected.tolist()
+        result[column.lower()] = step
+    dates = df['Date'].dt.strftime('%Y-%m-%d')
+    links, seconds = _timed(text_clean.make_links, df, COMMON_PREFIX, dates)
+    step = {"vectorized_s": seconds}
+    if reference:
+        expected, step["reference_s"] = _timed(reference_links, df, COMMON_PREFIX)
+        step["identical"] = links.fillna('').tolist() == expected.fillna('').tolist()
+    result["links"] = step
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark csv_export.py's text cleaning and link generation")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000],
+                        help="Synthetic export sizes; one benchmark per value (e.g. 100000 3000000)")
+    parser.add_argument("--no-reference", action="store_true",
+                        help="Skip the per-row reference (slow on millions of rows) and the output check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="csv_bench_results.json", help="Where to write the results JSON")
+    args = parser.parse_args()
+
+    runs = []
+    for rows in args.rows:
+        df = generate_articles(rows, seed=args.seed)
+        result = run_once(df, reference=not args.no_reference)
+        runs.append(dict(rows=rows, **result))
+        for step in ("title", "body", "links"):
+            stats = result[step]
+            line = f"{rows:>10,} rows {step:>6}: vectorized={stats['vectorized_s']:.2f}s"
+            if "reference_s" in stats:
+                line += f" reference={stats['reference_s']:.2f}s identical={stats['identical']}"
+            print(line)
+    results = {"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                           "cpus": os.cpu_count(), "pandas": pd.__version__, "numpy": np.__version__},
+               "config": vars(args), "runs": runs}
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if any(not run[step].get("identical", True) for run in runs for step in ("title", "body", "links")):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
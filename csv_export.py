@@ -0,0 +1,155 @@
+import argparse
+import os
+
+import pandas as pd
+
+import text_clean
+
+# Define the common prefix for link generation (modify as needed)
+COMMON_PREFIX = "https://example.com/files/"
+CHUNK_SIZE = 50000  # Input rows read, transformed and written at a time
+INPUT_FORMATS = (".xlsx", ".csv", ".parquet")
+OUTPUT_COLUMNS = ['Index', 'Title', 'Body', 'Date', 'HiddenMarker']
+# Columns used through the .str accessor, read as strings whatever values a batch happens to hold
+TEXT_COLUMNS = ('Company', 'URL', 'Title', 'Body')
+# Format of the 'Date' strings; fixed rather than inferred, which pandas does from each batch's first date
+DATE_FORMAT = "ISO8601"
+
+
+def _iter_xlsx_batches(path, batch_size):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+        width = len(columns)
+        batch, blank_rows = [], 0
+        for values in rows:
+            values = tuple(values[:width]) + (None,) * (width - len(values))
+            # Like pd.read_excel, keep blank rows only when a row with data follows
+            if all(value is None for value in values):
+                blank_rows += 1
+                continue
+            batch.extend([(None,) * width] * blank_rows)
+            blank_rows = 0
+            batch.append(values)
+            if len(batch) >= batch_size:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+
+def iter_input_batches(path, batch_size=CHUNK_SIZE):
+    """
+    Yield the rows of an .xlsx (first sheet), .csv or .parquet file as
+    DataFrames of at most batch_size rows.
+
+    Column types do not depend on where the batches split: .xlsx and .csv
+    columns are read as object (cell values and strings as they are), and
+    .parquet columns keep the file's schema.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".xlsx":
+        yield from _iter_xlsx_batches(path, batch_size)
+    elif ext == ".csv":
+        with pd.read_csv(path, chunksize=batch_size, dtype=object) as reader:
+            yield from reader
+    elif ext == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            # Integer columns stay integers in a batch with nulls rather than turning float
+            yield batch.to_pandas(integer_object_nulls=True)
+    else:
+        raise ValueError(f"Unsupported input format '{ext}'. Use one of: {', '.join(INPUT_FORMATS)}.")
+
+
+def transform_batch(df, first_index=1, common_prefix=COMMON_PREFIX, date_format=DATE_FORMAT):
+    """
+    The CSV rows of one batch of articles.
+
+    HiddenMarker values are written as they are in the input, so whole numbers
+    stay whole (3, where reading the whole sheet with pd.read_excel wrote 3.0
+    as soon as the column had a blank cell).
+
+    Args:
+        df: Articles ('ArticleID', 'Company', 'Date', 'URL', 'Title', 'Body', 'hiddenMarker').
+        first_index: Index of the batch's first row in the whole output.
+        common_prefix: Prefix of the links generated for rows without a URL.
+        date_format: Format of 'Date' strings (see pd.to_datetime); dates that
+            do not match are left empty. Date cells of an .xlsx are used as they are.
+    """
+    df = df.reset_index(drop=True)
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].astype(pd.StringDtype())
+
+    # Convert 'Date' column to datetime, coercing invalid dates to NaT
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce', format=date_format)
+
+    # Format the dates once, for the links and the Date column
+    dates = df['Date'].dt.strftime('%Y-%m-%d')
+
+    # Create the link: use URL if non-empty; otherwise, use common_prefix + the ArticleID_Company_Date slug
+    link = text_clean.make_links(df, common_prefix, dates)
+
+    return pd.DataFrame({
+        # Index: running row number over the whole output
+        'Index': range(first_index, first_index + len(df)),
+
+        # Title: Clean (remove commas and control chars), take first 50 chars, append "..."
+        'Title': text_clean.clean_prefix(df['Title'].fillna(''), ',', 50) + "...",
+
+        # Body: Clean (remove backticks, commas, control chars), take first 50 chars, append "...", then "`" and link
+        'Body': (text_clean.clean_prefix(df['Body'].fillna(''), '`,', 50) + "...") + "`" + link,
+
+        # Date: Format as YYYY-MM-DD
+        'Date': dates,
+
+        # HiddenMarker: Copy as is
+        'HiddenMarker': df['hiddenMarker']
+    }, columns=OUTPUT_COLUMNS)
+
+
+def export_csv(input_file='input.xlsx', output_file='output.csv', common_prefix=COMMON_PREFIX, chunk_size=CHUNK_SIZE,
+               date_format=DATE_FORMAT):
+    """
+    Convert an article export to the CSV upload format one batch of rows at a
+    time, so memory stays flat however large the input is.
+
+    Args:
+        input_file: .xlsx, .csv or .parquet file of articles.
+        output_file: CSV file to write (UTF-8).
+        common_prefix: Prefix of the links generated for rows without a URL.
+        chunk_size: Rows read, transformed and written at a time.
+        date_format: Format of the 'Date' strings (see pd.to_datetime).
+
+    Returns:
+        int: Number of rows written.
+    """
+    written = 0
+    with open(output_file, "w", newline="", encoding="utf-8") as f:
+        pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(f, index=False)
+        for batch in iter_input_batches(input_file, chunk_size):
+            transform_batch(batch, written + 1, common_prefix, date_format).to_csv(f, index=False, header=False)
+            written += len(batch)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an article export to the CSV upload format")
+    parser.add_argument("input_file", nargs="?", default="input.xlsx",
+                        help=f"Articles to convert ({', '.join(INPUT_FORMATS)}, by extension)")
+    parser.add_argument("output_file", nargs="?", default="output.csv", help="CSV file to write")
+    parser.add_argument("--prefix", default=COMMON_PREFIX, help="Prefix of the links generated for rows without a URL")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows read and written at a time")
+    parser.add_argument("--date-format", default=DATE_FORMAT,
+                        help="Format of the Date strings, e.g. %%d/%%m/%%Y (default: ISO 8601)")
+    args = parser.parse_args()
+
+    rows = export_csv(args.input_file, args.output_file, args.prefix, args.chunk_size, args.date_format)
+    print(f"CSV file '{args.output_file}' has been generated successfully ({rows} rows).")
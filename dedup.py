@@ -0,0 +1,248 @@
+import re
+import zlib
+from urllib.parse import parse_qsl, urlencode
+
+import numpy as np
+import pandas as pd
+
+import common
+
+NUM_PERM = 64
+BANDS = 16  # NUM_PERM / BANDS rows per band; candidates from a Jaccard of about (1 / BANDS) ** (BANDS / NUM_PERM)
+THRESHOLD = 0.8  # Estimated Jaccard similarity at which two texts count as the same story
+MIN_TOKENS = 4  # Headlines with fewer words are only matched exactly
+MAX_BUCKET = 32  # LSH buckets up to this size have every pair verified
+CHUNK_SIZE = 5000
+_PRIME = (1 << 31) - 1
+
+# Query parameters that only track the click and never change the article
+_TRACKING_PARAMS = re.compile(r"^(utm_.*|mc_.*|pk_.*|hsa_.*|fbclid|gclid|dclid|gclsrc|msclkid|yclid|igshid|"
+                              r"ref|ref_src|ref_url|cmpid|ocid|smid|spm|sr_share|amp|outputtype|__twitter_impression)$",
+                              re.IGNORECASE)
+_HOST_PREFIXES = ("www.", "m.", "amp.", "mobile.")
+# scheme, credentials, host, port, path, query (urlsplit is several times slower on large uploads)
+_URL = re.compile(r"^(?:[a-z][a-z0-9+.\-]*:)?(?://)?(?:[^@/?#]*@)?([^/:?#]*)(?::(\d+))?([^?#]*)(?:\?([^#]*))?", re.IGNORECASE)
+_PATH_END = re.compile(r"(/amp)?/*$", re.IGNORECASE)
+_WORDS = re.compile(r"[a-z0-9]+")
+
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for exact duplicate matching: no scheme, www/m/amp
+    host prefix, default port, fragment, tracking parameters, AMP suffix or
+    trailing slash, and the remaining query parameters sorted.
+
+    Returns:
+        str or None: None if url is missing or not a string.
+    """
+    if not isinstance(url, str) or not url.strip():
+        return None
+    match = _URL.match(url.strip())
+    if match is None:
+        return url.strip()
+    host, port, path, query = match.groups()
+    host = host.lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if port and port not in ("80", "443"):
+        host = f"{host}:{port}"
+    if "//" in path:
+        path = re.sub(r"/{2,}", "/", path)
+    path = _PATH_END.sub("", path)
+    if not query:
+        return host + path
+    query = sorted((key, value) for key, value in parse_qsl(query, keep_blank_values=True)
+                   if not _TRACKING_PARAMS.match(key))
+    return host + path + ("?" + urlencode(query) if query else "")
+
+
+def _normalize_text(value):
+    if not isinstance(value, str):
+        return None
+    words = _WORDS.findall(value.lower())
+    return " ".join(words) if words else None
+
+
+def _text_tokens(headline):
+    """
+    Words to shingle for near-duplicate matching. Only headlines qualify: URL
+    slugs of different stories often differ by a single word (a date, an id),
+    so rows without a headline are only matched on their normalized URL.
+    """
+    return headline.split() if headline else []
+
+
+def _shingle_hashes(tokens):
+    shingles = {" ".join(tokens[i:i + 2]) for i in range(len(tokens) - 1)}
+    return [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles]
+
+
+def minhash_signatures(token_lists, num_perm=NUM_PERM, seed=1, chunk_size=CHUNK_SIZE):
+    """
+    MinHash signatures of word-bigram shingle sets, vectorized per chunk of rows.
+
+    Args:
+        token_lists: One list of words per row (each with at least two words).
+        num_perm: Number of hash permutations.
+
+    Returns:
+        np.ndarray: (rows, num_perm) uint32 signatures.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)[:, None]
+    b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)[:, None]
+    signatures = np.empty((len(token_lists), num_perm), dtype=np.uint32)
+    for start in range(0, len(token_lists), chunk_size):
+        hashes = [_shingle_hashes(tokens) for tokens in token_lists[start:start + chunk_size]]
+        lengths = np.fromiter(map(len, hashes), dtype=np.int64, count=len(hashes))
+        flat = np.fromiter((h for row in hashes for h in row), dtype=np.uint64, count=int(lengths.sum())) % _PRIME
+        permuted = (a * flat[None, :] + b) % _PRIME
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        signatures[start:start + len(hashes)] = np.minimum.reduceat(permuted, offsets, axis=1).T
+    return signatures
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, x, y):
+        root_x, root_y = self.find(x), self.find(y)
+        if root_x != root_y:
+            # The lower row index stays the root, so the first copy is the representative
+            self.parent[max(root_x, root_y)] = min(root_x, root_y)
+
+
+def _bucket_pairs(keys):
+    """
+    Pair every row with the first row sharing its key (a 1-D int64 array), so
+    a bucket of k rows costs k - 1 pairs instead of k².
+
+    Returns:
+        tuple: (first, other) arrays of positions into keys.
+    """
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    firsts = np.repeat(order[starts], np.diff(np.r_[starts, len(order)]))
+    pairs = order != firsts
+    return firsts[pairs], order[pairs]
+
+
+def _candidate_pairs(keys, max_bucket=MAX_BUCKET):
+    """
+    Pairs of rows sharing an LSH band key, to verify against the threshold.
+
+    Every pair of a bucket of up to max_bucket rows is returned, so a first
+    row that is an outlier cannot hide two near-duplicates behind it. Larger
+    buckets (usually boilerplate headlines) pair each row with the bucket's
+    first row and with its predecessor.
+
+    Returns:
+        tuple: (first, other) arrays of positions into keys, first < other.
+    """
+    first, other = _bucket_pairs(keys)
+    if len(keys) < 2:
+        return first, other
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    small = np.repeat(sizes <= max_bucket, sizes)
+    firsts, others = [first], [other]
+    # Positions d apart in sorted order share a bucket exactly when their keys match
+    for d in range(1, min(max_bucket, int(sizes.max()))):
+        same = sorted_keys[:-d] == sorted_keys[d:]
+        if d > 1:
+            same &= small[d:]
+        positions = np.flatnonzero(same)
+        firsts.append(order[positions])
+        others.append(order[positions + d])
+    return np.concatenate(firsts), np.concatenate(others)
+
+
+def _combine(company_codes, codes):
+    # One 64-bit key per (company, value) pair; a hash collision only adds a candidate, never a match
+    with np.errstate(over="ignore"):
+        return (company_codes.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) ^ codes.astype(np.uint64)).view(np.int64)
+
+
+def find_duplicates(df, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS, report=None):
+    """
+    Cluster rows that are copies of the same story for the same company.
+
+    Rows are joined when they share a company and any of: the normalized URL,
+    the normalized headline, or a MinHash/LSH match on the headline with an
+    estimated Jaccard similarity of at least threshold; rows without a
+    headline are only matched on their URL. LSH only compares rows that share
+    a band bucket, so the cost grows with the number of rows rather than with
+    their pairs.
+
+    Args:
+        df: The uploaded dataset ('URL', 'Company Name', optional 'Headline').
+        threshold: Minimum estimated Jaccard similarity for near-duplicates.
+        report: Optional report(fraction, message) progress callback.
+
+    Returns:
+        np.ndarray: For each row the index of its cluster's representative
+        (its first row), or -1 for rows that are their own representative.
+    """
+    report = report or common.no_progress
+    num_rows = len(df)
+    if num_rows == 0:
+        return np.empty(0, dtype=np.int64)
+    clusters = _UnionFind(num_rows)
+    companies = [_normalize_text(value) for value in df['Company Name'].tolist()]
+    company_codes, _ = pd.factorize(pd.Series(companies, dtype=object), use_na_sentinel=True)
+    company_codes = company_codes.astype(np.int64)
+
+    report(0.0, "Matching URLs")
+    urls = [normalize_url(url) for url in df['URL'].tolist()]
+    url_codes, _ = pd.factorize(pd.Series(urls, dtype=object), use_na_sentinel=True)
+    headlines = ([_normalize_text(value) for value in df['Headline'].tolist()] if 'Headline' in df.columns
+                 else [None] * num_rows)
+    headline_codes, _ = pd.factorize(pd.Series(headlines, dtype=object), use_na_sentinel=True)
+    for codes in (url_codes, headline_codes):
+        known = np.flatnonzero(codes >= 0)
+        first, other = _bucket_pairs(_combine(company_codes[known], codes[known]))
+        for x, y in zip(known[first].tolist(), known[other].tolist()):
+            clusters.union(x, y)
+
+    report(0.3, "Hashing headlines")
+    tokens = [_text_tokens(headline) for headline in headlines]
+    candidates = np.flatnonzero(np.fromiter(map(len, tokens), dtype=np.int64, count=num_rows) >= MIN_TOKENS)
+    if len(candidates) > 1:
+        signatures = minhash_signatures([tokens[row_idx] for row_idx in candidates.tolist()], num_perm)
+        report(0.7, "Comparing candidates")
+        rows_per_band = num_perm // bands
+        pair_keys = []
+        for band in range(bands):
+            band_hash = np.zeros(len(candidates), dtype=np.uint64)
+            with np.errstate(over="ignore"):
+                for column in signatures[:, band * rows_per_band:(band + 1) * rows_per_band].T:
+                    band_hash = band_hash * np.uint64(1000003) ^ column.astype(np.uint64)
+            first, other = _candidate_pairs(_combine(company_codes[candidates], band_hash))
+            pair_keys.append(first.astype(np.int64) * len(candidates) + other)
+        # A similar pair usually shares several bands; verify each pair once
+        pair_keys = np.unique(np.concatenate(pair_keys))
+        left, right = np.divmod(pair_keys, len(candidates))
+        similar = (signatures[left] == signatures[right]).mean(axis=1) >= threshold
+        for x, y in zip(candidates[left[similar]].tolist(), candidates[right[similar]].tolist()):
+            clusters.union(x, y)
+    report(1.0, "Clustering")
+    roots = np.fromiter((clusters.find(row_idx) for row_idx in range(num_rows)), dtype=np.int64, count=num_rows)
+    return np.where(roots == np.arange(num_rows), -1, roots)
+
@@ -0,0 +1,192 @@
+import os
+import secrets
+import time
+
+import numpy as np
+import pandas as pd
+
+import common
+import metrics
+
+TAGGED_BY = 'Tagged By'
+TAGGED_AT = 'Tagged At'
+PROVENANCE_COLUMNS = [TAGGED_BY, TAGGED_AT]
+# Row index of the representative a near-duplicate row takes its tag from (blank for representatives)
+DUPLICATE_OF = 'Duplicate Of'
+UNTAGGED = "Untagged"
+
+EXPORT_FORMATS = ("csv", "parquet", "xlsx")
+EXPORT_DIR = "exports"
+CHUNK_SIZE = 10000
+
+
+def item_columns(news_data):
+    """Columns of the items in order, with the provenance columns last."""
+    columns = [col for col in news_data.columns if col not in PROVENANCE_COLUMNS]
+    return columns + PROVENANCE_COLUMNS
+
+
+def parse_list(text):
+    """Split a comma-separated filter field into its non-empty values."""
+    return [value.strip() for value in (text or "").split(",") if value.strip()]
+
+
+def parse_time(value):
+    """Parse a filter bound (epoch seconds or a date/time string, UTC if no zone is given) to epoch seconds."""
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    timestamp = pd.Timestamp(str(value).strip())
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.timestamp()
+
+
+def format_time(value):
+    if common.is_blank(value):
+        return None
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(float(value)))
+
+
+def select_rows(num_rows, sets=None, set_indexes=None):
+    """Row indices to export: every row, or the union of the chosen sets in row order."""
+    if not set_indexes:
+        return range(num_rows)
+    chosen = [sets[set_idx] for set_idx in set_indexes if 0 <= set_idx < len(sets)]
+    if not chosen:
+        return []
+    return np.unique(np.concatenate([np.asarray(rows) for rows in chosen]))
+
+
+def iter_export_chunks(news_data, rows, columns=None, users=None, tags=None, start=None, end=None,
+                       chunk_size=CHUNK_SIZE, report=None):
+    """
+    Yield filtered export rows as DataFrames of at most chunk_size rows, so
+    only one chunk is ever held in memory. The filters are applied to the
+    item store's columns as a whole before any row is materialized. Rows
+    marked as near-duplicates (DUPLICATE_OF) take the tag, tagger and time
+    of their representative, for filtering and in the output.
+
+    Args:
+        news_data: An item_store.ItemStore.
+        rows: Row indices to consider, e.g. from select_rows().
+        columns: Item columns to export; defaults to item_columns(news_data).
+        users: Only rows last tagged by one of these account ids.
+        tags: Only rows with one of these tags (UNTAGGED for rows without one).
+        start: Only rows tagged at or after this epoch time.
+        end: Only rows tagged before this epoch time.
+        chunk_size: Rows per chunk.
+        report: Optional report(fraction, message) progress callback.
+    """
+    report = report or common.no_progress
+    columns = list(columns or item_columns(news_data))
+    rows = np.asarray(rows, dtype=np.int64)
+    sources = rows
+    if DUPLICATE_OF in news_data.columns:
+        duplicate_of = news_data.floats(DUPLICATE_OF, rows)
+        sources = np.where(np.isnan(duplicate_of), rows, np.nan_to_num(duplicate_of)).astype(np.int64)
+    keep = np.ones(len(rows), dtype=bool)
+    if tags:
+        keep &= news_data.isin('Tag', tags, sources, missing_as=UNTAGGED)
+    if users:
+        keep &= news_data.isin(TAGGED_BY, users, sources)
+    if start is not None or end is not None:
+        tagged_at = news_data.floats(TAGGED_AT, sources)
+        with np.errstate(invalid="ignore"):
+            keep &= ~np.isnan(tagged_at)
+            if start is not None:
+                keep &= tagged_at >= start
+            if end is not None:
+                keep &= tagged_at < end
+    selected, selected_sources = rows[keep], sources[keep]
+    tag_columns = [col for col in ['Tag'] + PROVENANCE_COLUMNS if col in columns]
+    for offset in range(0, len(selected), chunk_size):
+        chunk_rows = selected[offset:offset + chunk_size]
+        chunk = news_data.to_frame(columns, chunk_rows)
+        if sources is not rows:
+            source = news_data.to_frame(tag_columns, selected_sources[offset:offset + chunk_size])
+            for col in tag_columns:
+                chunk[col] = source[col].to_numpy()
+            if DUPLICATE_OF in chunk:
+                chunk[DUPLICATE_OF] = chunk[DUPLICATE_OF].astype("Int64")
+        if TAGGED_AT in chunk:
+            chunk[TAGGED_AT] = [format_time(value) for value in chunk[TAGGED_AT].tolist()]
+        chunk.insert(0, 'Row', chunk_rows)
+        yield chunk
+        if offset + chunk_size < len(selected):
+            report((offset + chunk_size) / len(selected), f"Exported {offset + len(chunk_rows):,} rows")
+
+
+def _as_text(chunk):
+    # Keep column types identical across chunks (an all-empty chunk would otherwise infer a null type)
+    return chunk.astype({col: "string" for col in chunk.columns if col != 'Row'})
+
+
+def write_chunks(path, fmt, chunks, columns):
+    """
+    Write DataFrame chunks to path as CSV, Parquet or .xlsx, appending one
+    chunk at a time.
+
+    Returns:
+        int: Number of rows written.
+    """
+    header = ['Row'] + list(columns)
+    written = 0
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            pd.DataFrame(columns=header).to_csv(f, index=False)
+            for chunk in chunks:
+                chunk.to_csv(f, index=False, header=False)
+                written += len(chunk)
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([('Row', pa.int64())] + [(col, pa.string()) for col in columns])
+        with pq.ParquetWriter(path, schema) as writer:
+            for chunk in chunks:
+                writer.write_table(pa.Table.from_pandas(_as_text(chunk), schema=schema, preserve_index=False))
+                written += len(chunk)
+    elif fmt == "xlsx":
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Results")
+        sheet.append(header)
+        for chunk in chunks:
+            for values in chunk.itertuples(index=False, name=None):
+                sheet.append([None if common.is_blank(value) else value for value in values])
+            written += len(chunk)
+        workbook.save(path)
+    else:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(EXPORT_FORMATS)}.")
+    return written
+
+
+def write_items_csv(path, news_data, chunk_size=CHUNK_SIZE):
+    """Write every item to a CSV file in chunks, with the item columns only (no Row column)."""
+    columns = item_columns(news_data) if news_data else []
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        pd.DataFrame(columns=columns).to_csv(f, index=False)
+        for start in range(0, len(news_data), chunk_size):
+            rows = np.arange(start, min(start + chunk_size, len(news_data)))
+            news_data.to_frame(columns, rows).to_csv(f, index=False, header=False)
+
+
+@metrics.timed("export.export_results")
+def export_results(report, news_data, fmt, rows, users=None, tags=None, start=None, end=None, export_dir=EXPORT_DIR):
+    """
+    Background job: stream the filtered results to a new file in export_dir.
+
+    Returns:
+        tuple: (path of the written file, number of rows exported)
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    columns = item_columns(news_data)
+    # A random suffix keeps two exports started in the same second apart
+    path = os.path.join(export_dir, f"tagged_results_{time.strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(3)}.{fmt}")
+    chunks = iter_export_chunks(news_data, rows, columns, users, tags, start, end, report=report)
+    written = write_chunks(path, fmt, chunks, columns)
+    metrics.add_io("export.export_results", written=os.path.getsize(path), rows=written)
+    return path, written
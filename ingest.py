@@ -0,0 +1,126 @@
+import os
+from itertools import islice
+
+import pandas as pd
+
+import common
+import item_store
+import metrics
+
+REQUIRED_COLUMNS = ['URL', 'Company Name', 'Tag']
+OPTIONAL_COLUMNS = ['Headline']  # Kept in the items when present, e.g. for batch tagging
+CHUNK_SIZE = 50000
+SUPPORTED_EXTENSIONS = ('.xlsx', '.csv', '.parquet')
+
+
+def validate_columns(columns):
+    """Return an error message if a required column is missing, otherwise None."""
+    if not set(REQUIRED_COLUMNS).issubset(columns):
+        return "Excel file must contain 'URL', 'Company Name', and 'Tag'."
+    return None
+
+
+def _iter_xlsx(path, chunk_size):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        total = max((sheet.max_row or 0) - 1, 0)
+        done = 0
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            done += len(chunk)
+            yield pd.DataFrame(chunk, columns=list(header)), (done / total if total else None)
+    finally:
+        workbook.close()
+
+
+def _iter_csv(path, chunk_size):
+    size = os.path.getsize(path) or 1
+    with open(path, "rb") as f:
+        for chunk in pd.read_csv(f, chunksize=chunk_size):
+            yield chunk, min(f.tell() / size, 1.0)
+
+
+def _iter_parquet(path, chunk_size):
+    import pyarrow.parquet as pq
+    parquet_file = pq.ParquetFile(path)
+    total = parquet_file.metadata.num_rows or 1
+    done = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        done += batch.num_rows
+        yield batch.to_pandas(), done / total
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield (DataFrame chunk, fraction read) pairs from an .xlsx, .csv or
+    .parquet file. The fraction is None when the total size is unknown.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        return _iter_xlsx(path, chunk_size)
+    if ext == '.csv':
+        return _iter_csv(path, chunk_size)
+    if ext == '.parquet':
+        return _iter_parquet(path, chunk_size)
+    raise ValueError(f"Unsupported file type '{ext}'. Upload one of: {', '.join(SUPPORTED_EXTENSIONS)}.")
+
+
+@metrics.timed("ingest.read_items")
+def read_items(path, report=None, chunk_size=CHUNK_SIZE):
+    """
+    Read a news file in chunks, validating the columns on the first chunk.
+
+    Args:
+        path: Path to an .xlsx, .csv or .parquet file.
+        report: Optional report(fraction, message) progress callback.
+        chunk_size: Rows per chunk.
+
+    Returns:
+        pd.DataFrame: The full dataset.
+
+    Raises:
+        ValueError: If the file type is unsupported or a required column is missing.
+    """
+    report = report or common.no_progress
+    chunks = []
+    rows = 0
+    for chunk, fraction in iter_chunks(path, chunk_size):
+        if not chunks:
+            error = validate_columns(chunk.columns)
+            if error:
+                raise ValueError(error)
+        chunks.append(chunk)
+        rows += len(chunk)
+        report(fraction if fraction is not None else 0.0, f"Read {rows:,} rows")
+    if not chunks:
+        raise ValueError(validate_columns([]))
+    metrics.add_io("ingest.read_items", read=os.path.getsize(path), rows=rows)
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0].reset_index(drop=True)
+
+
+def item_columns(columns):
+    """Return REQUIRED_COLUMNS plus whichever OPTIONAL_COLUMNS the file has."""
+    return REQUIRED_COLUMNS + [col for col in OPTIONAL_COLUMNS if col in columns]
+
+
+def build_items(df, columns=None):
+    """
+    Build the in-memory item store column by column instead of walking the rows.
+
+    Args:
+        df: The uploaded dataset.
+        columns: Columns to keep in each item; defaults to REQUIRED_COLUMNS.
+
+    Returns:
+        item_store.ItemStore: The items.
+    """
+    columns = list(REQUIRED_COLUMNS if columns is None else columns)
+    return item_store.ItemStore.from_frame(df, columns)
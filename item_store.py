@@ -0,0 +1,301 @@
+from collections import Counter
+from collections.abc import MutableMapping
+
+import numpy as np
+import pandas as pd
+
+import common
+import export
+
+# Low-cardinality columns stored as small integer codes into a list of distinct values
+CATEGORY_COLUMNS = ('Company Name', 'Tag', export.TAGGED_BY)
+# Numeric columns stored as float64 with NaN for missing
+FLOAT_COLUMNS = (export.TAGGED_AT, export.DUPLICATE_OF)
+
+
+class _TextColumn:
+    """Immutable strings in one contiguous UTF-8 buffer with offsets; rare writes go to an overlay."""
+
+    def __init__(self, values, nulls):
+        encoded = [b"" if null else value.encode("utf-8") for value, null in zip(values, nulls)]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=self.offsets[1:])
+        self.buffer = b"".join(encoded)
+        self.nulls = np.asarray(nulls, dtype=bool)
+        self.overrides = {}
+
+    def get(self, row_idx):
+        if self.overrides and row_idx in self.overrides:
+            return self.overrides[row_idx]
+        if self.nulls[row_idx]:
+            return None
+        return self.buffer[self.offsets[row_idx]:self.offsets[row_idx + 1]].decode("utf-8")
+
+    def set(self, row_idx, value):
+        self.overrides[row_idx] = None if common.is_missing(value) else value
+
+    def take(self, rows):
+        return [self.get(row_idx) for row_idx in rows.tolist()]
+
+    @property
+    def nbytes(self):
+        return len(self.buffer) + self.offsets.nbytes + self.nulls.nbytes
+
+
+class _CategoryColumn:
+    """Values as int32 codes into a list of distinct values; -1 means missing."""
+
+    def __init__(self, codes, categories):
+        self.codes = np.array(codes, dtype=np.int32)
+        self.categories = list(categories)
+        self._index = {value: code for code, value in enumerate(self.categories)}
+
+    @classmethod
+    def empty(cls, num_rows):
+        return cls(np.full(num_rows, -1, dtype=np.int32), [])
+
+    def get(self, row_idx):
+        code = self.codes[row_idx]
+        return None if code < 0 else self.categories[code]
+
+    def set(self, row_idx, value):
+        if common.is_missing(value):
+            self.codes[row_idx] = -1
+            return
+        code = self._index.get(value)
+        if code is None:
+            # Publish the category before any code can point at it; readers do not lock
+            self.categories.append(value)
+            code = self._index[value] = len(self.categories) - 1
+        self.codes[row_idx] = code
+
+    def take(self, rows):
+        lookup = np.empty(len(self.categories) + 1, dtype=object)
+        lookup[:-1] = self.categories
+        lookup[-1] = None
+        return lookup[self.codes[rows]]
+
+    def isin(self, values, rows, missing_as=None):
+        """Boolean mask over rows of values in `values`, with missing (and '') treated as missing_as."""
+        keys = [missing_as if value == '' else value for value in self.categories] + [missing_as]
+        lookup = np.fromiter((key in values for key in keys), dtype=bool, count=len(keys))
+        return lookup[self.codes[rows]]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(len(str(value)) + 49 for value in self.categories)
+
+
+class _FloatColumn:
+    def __init__(self, values):
+        # A copy: arrays from pandas (e.g. pd.to_numeric under pandas 3) can be read-only
+        self.values = np.array(values, dtype=np.float64)
+
+    @classmethod
+    def empty(cls, num_rows):
+        return cls(np.full(num_rows, np.nan))
+
+    def get(self, row_idx):
+        value = self.values[row_idx]
+        return None if value != value else float(value)
+
+    def set(self, row_idx, value):
+        self.values[row_idx] = np.nan if common.is_missing(value) else float(value)
+
+    def take(self, rows):
+        return self.values[rows]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+
+class _ObjectColumn:
+    """Fallback for columns that mix types (e.g. numbers read from a spreadsheet)."""
+
+    def __init__(self, values, nulls):
+        self.values = np.empty(len(values), dtype=object)
+        self.values[:] = [None if null else value for value, null in zip(values, nulls)]
+
+    @classmethod
+    def empty(cls, num_rows):
+        return cls([None] * num_rows, [True] * num_rows)
+
+    def get(self, row_idx):
+        return self.values[row_idx]
+
+    def set(self, row_idx, value):
+        self.values[row_idx] = None if common.is_missing(value) else value
+
+    def take(self, rows):
+        return self.values[rows]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+
+def _build_column(name, series):
+    if name in FLOAT_COLUMNS:
+        return _FloatColumn(pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan))
+    if name in CATEGORY_COLUMNS:
+        codes, uniques = pd.factorize(series)
+        return _CategoryColumn(codes, uniques.tolist())
+    if pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty"):
+        return _TextColumn(series.tolist(), series.isna().to_numpy())
+    return _ObjectColumn(series.tolist(), series.isna().to_numpy())
+
+
+def _empty_column(name, num_rows):
+    if name in FLOAT_COLUMNS:
+        return _FloatColumn.empty(num_rows)
+    if name in CATEGORY_COLUMNS:
+        return _CategoryColumn.empty(num_rows)
+    return _ObjectColumn.empty(num_rows)
+
+
+class ItemRow(MutableMapping):
+    """Dict-like view of one row; reads and writes go straight to the columns."""
+
+    __slots__ = ("_items", "_row_idx")
+
+    def __init__(self, items, row_idx):
+        self._items = items
+        self._row_idx = row_idx
+
+    def __getitem__(self, column):
+        return self._items.column(column).get(self._row_idx)
+
+    def __setitem__(self, column, value):
+        self._items.set(self._row_idx, column, value)
+
+    def __delitem__(self, column):
+        raise TypeError("Columns cannot be removed from a single row")
+
+    def __iter__(self):
+        return iter(self._items.columns)
+
+    def __len__(self):
+        return len(self._items.columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ItemStore:
+    """
+    Columnar in-memory dataset, replacing a list with one dict per row.
+
+    Text is kept in one UTF-8 buffer per column, company names, tags and
+    taggers as int32 codes, and tag times as float64, so a few million rows
+    take a fraction of the memory. Indexing returns an ItemRow, which reads
+    and writes like the old row dict; vectorized helpers (tag_counts, isin,
+    to_frame) serve summaries and exports without walking the rows. Missing
+    values read back as None.
+
+    Only the tag writer mutates an ItemStore; readers do not lock.
+    """
+
+    def __init__(self, columns=None, num_rows=0):
+        self._columns = dict(columns or {})
+        self._num_rows = num_rows
+
+    @classmethod
+    def from_frame(cls, df, columns=None):
+        """
+        Build the store from a DataFrame.
+
+        Args:
+            df: The dataset.
+            columns: Columns to keep; defaults to all of them. The provenance
+                columns are always present.
+        """
+        columns = list(df.columns if columns is None else columns)
+        store = cls({name: _build_column(name, df[name]) for name in columns}, len(df))
+        for name in export.PROVENANCE_COLUMNS:
+            if name not in store._columns:
+                store._columns[name] = _empty_column(name, len(df))
+        return store
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, name):
+        try:
+            return self._columns[name]
+        except KeyError:
+            raise KeyError(name) from None
+
+    def __len__(self):
+        return self._num_rows
+
+    def _row_index(self, row_idx):
+        row_idx = int(row_idx)
+        if row_idx < 0:
+            row_idx += self._num_rows
+        if not 0 <= row_idx < self._num_rows:
+            raise IndexError("item index out of range")
+        return row_idx
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [ItemRow(self, row_idx) for row_idx in range(*key.indices(self._num_rows))]
+        return ItemRow(self, self._row_index(key))
+
+    def __iter__(self):
+        return (ItemRow(self, row_idx) for row_idx in range(self._num_rows))
+
+    def get(self, row_idx, column, default=None):
+        """Value of one cell, or default if the column does not exist."""
+        col = self._columns.get(column)
+        return default if col is None else col.get(self._row_index(row_idx))
+
+    def set(self, row_idx, column, value):
+        row_idx = self._row_index(row_idx)
+        col = self._columns.get(column)
+        if col is None:
+            col = self._columns[column] = _empty_column(column, self._num_rows)
+        col.set(row_idx, value)
+
+    def _column_or_empty(self, name):
+        # Columns a dataset lacks (e.g. every column of an empty store) read as all missing
+        col = self._columns.get(name)
+        return col if col is not None else _empty_column(name, self._num_rows)
+
+    def _rows(self, rows):
+        return np.arange(self._num_rows) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    def isin(self, column, values, rows=None, missing_as=None):
+        """
+        Boolean mask over rows (default: all) whose value in a category column
+        is one of `values`; missing values count as missing_as.
+        """
+        return self._column_or_empty(column).isin(set(values), self._rows(rows), missing_as)
+
+    def floats(self, column, rows=None):
+        """Values of a float column as a float64 array (NaN for missing)."""
+        return self._column_or_empty(column).values[self._rows(rows)]
+
+    def tag_counts(self, column='Tag'):
+        """Counter of non-empty values in a category column, counted with one bincount."""
+        col = self._column_or_empty(column)
+        codes = col.codes[col.codes >= 0]
+        counts = np.bincount(codes, minlength=len(col.categories))
+        return Counter({value: int(count) for value, count in zip(col.categories, counts)
+                        if count and value != ''})
+
+    def to_frame(self, columns=None, rows=None):
+        """DataFrame of the given columns (default: all) for the given row indices (default: all)."""
+        rows = self._rows(rows)
+        columns = self.columns if columns is None else list(columns)
+        data = {}
+        for name in columns:
+            col = self._columns.get(name)
+            data[name] = col.take(rows) if col is not None else [None] * len(rows)
+        return pd.DataFrame(data, columns=columns)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the columns."""
+        return sum(col.nbytes for col in self._columns.values())
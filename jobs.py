@@ -0,0 +1,69 @@
+import asyncio
+import functools
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# job_id -> status dict; finished jobs are kept so late polls still see the result
+_jobs = {}
+_lock = threading.Lock()
+MAX_FINISHED_JOBS = 100
+
+# Bounded pool for blocking file I/O, parsing and hashing called from async handlers
+BLOCKING_WORKERS = 8
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+
+def _update(job_id, **fields):
+    with _lock:
+        _jobs[job_id].update(fields)
+
+
+def start_job(fn, *args, name="job", **kwargs):
+    """
+    Run fn(report, *args, **kwargs) on a background thread and return a job id
+    immediately. fn calls report(fraction, message) to publish progress; its
+    return value becomes the job result and any exception its error.
+    """
+    job_id = uuid.uuid4().hex
+    with _lock:
+        _prune()
+        _jobs[job_id] = {"name": name, "state": "running", "progress": 0.0, "message": "Starting",
+                         "result": None, "error": None, "started_at": time.time(), "finished_at": None}
+
+    def report(fraction, message=None):
+        fields = {"progress": max(0.0, min(1.0, float(fraction)))}
+        if message is not None:
+            fields["message"] = message
+        _update(job_id, **fields)
+
+    def run():
+        try:
+            result = fn(report, *args, **kwargs)
+        except Exception as e:
+            _update(job_id, state="error", error=str(e), message=str(e), finished_at=time.time())
+        else:
+            _update(job_id, state="done", result=result, progress=1.0, message="Done", finished_at=time.time())
+
+    threading.Thread(target=run, name=f"{name}-{job_id[:8]}", daemon=True).start()
+    return job_id
+
+
+def job_status(job_id):
+    """Return a copy of the job's status dict, or None for an unknown job."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def _prune():
+    finished = [job_id for job_id, job in _jobs.items() if job["state"] != "running"]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the bounded executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
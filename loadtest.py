@@ -0,0 +1,399 @@
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+APPS = ("test", "test2", "stremlit")
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# Synthetic news file with the columns the apps expect
+def write_dataset(path, num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    companies = np.array([f"Company {i}" for i in range(1000)])
+    df = pd.DataFrame({
+        "URL": [f"https://news.example.com/article/{i}" for i in range(num_rows)],
+        "Company Name": companies[rng.integers(0, len(companies), num_rows)],
+        "Tag": [""] * num_rows,
+    })
+    df.to_csv(path, index=False)
+
+
+def write_account_ids(path, num_annotators):
+    account_ids = [f"annotator{i:04d}" for i in range(num_annotators)]
+    with open(path, "w") as f:
+        f.write("\n".join(account_ids))
+    return account_ids
+
+
+# Load one of the app scripts by path ("test" clashes with the standard library package)
+def load_app(name):
+    spec = importlib.util.spec_from_file_location(f"loadtest_{name}", os.path.join(REPO_DIR, f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size in MB of this process, or of pid when given (Linux only)."""
+    if pid is None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class InProcessDriver:
+    """Calls the app's handler functions directly, one session per annotator."""
+
+    def __init__(self, app_name, storage_backend):
+        self.app_name = app_name
+        self.app = load_app(app_name)
+        # Async handlers all share one event loop, as they do under Gradio
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="loadtest-loop", daemon=True).start()
+        if storage_backend != "csv":
+            files = {"output_file": self.app.output_file, "progress_file": getattr(self.app, "progress_file", None),
+                     "credentials_file": self.app.credentials_file, "tag_log_file": self.app.tag_log_file}
+            self.app.store = self.app.storage.open_storage(storage_backend, "tagging.db", **files)
+
+    def upload(self, data_path, ids_path, num_sets, users_per_set):
+        report = lambda fraction, message=None: None
+        if self.app_name == "stremlit":
+            credentials = self.app.process_upload(report, data_path, ids_path)
+        else:
+            credentials = self.app.process_upload(report, data_path, ids_path, num_sets, users_per_set)[1]
+        return dict(zip(credentials["account_id"], credentials["password"]))
+
+    def call(self, fn, *args):
+        """Call a handler: coroutine functions run on the shared loop, plain ones on the calling thread."""
+        if inspect.iscoroutinefunction(fn):
+            return asyncio.run_coroutine_threadsafe(fn(*args), self._loop).result()
+        return fn(*args)
+
+    def session(self, account_id, password):
+        return InProcessSession(self, account_id, password)
+
+    def summary(self):
+        if self.app_name == "test2":
+            return self.call(self.app.view_summary)
+        return self.call(self.app.show_summary, self.app.admin_password)
+
+
+class InProcessSession:
+    def __init__(self, driver, account_id, password):
+        self.app = driver.app
+        self.app_name = driver.app_name
+        self.call = driver.call
+        self.needs_login = driver.app_name != "test2"  # test2 checks the password on the first tag
+        self.account_id = account_id
+        self.password = password
+        self.token = None
+
+    def login(self):
+        if self.app_name == "test":
+            result = self.call(self.app.user_login, self.account_id, self.password)
+            self.rows, self.idx, self.token = result[6], result[7], result[-1]
+        elif self.app_name == "stremlit":
+            # stremlit.py builds its login handler inside main(); this is the same check
+            if self.app.authenticate(self.account_id, self.password):
+                self.token = self.app.auth.issue_session(self.account_id)
+            self.idx = 0
+        if self.token is None:
+            raise RuntimeError(f"Login failed for {self.account_id}")
+        return True
+
+    def tag(self, tag):
+        """Submit one tag; returns False once the annotator has nothing left to tag."""
+        if self.app_name == "test":
+            if self.rows is None or self.idx < 0 or self.idx >= len(self.rows):
+                return False
+            result = self.call(self.app.submit_tag, self.token, self.rows, self.idx, tag)
+            if result[0] == "**Authentication failed.**":
+                raise RuntimeError(f"Session rejected for {self.account_id}")
+            self.idx, self.rows = result[3], result[4]
+            return True
+        if self.app_name == "stremlit":
+            if self.idx < 0:
+                return False
+            self.idx = self.call(self.app.tag_news, self.token, self.idx, tag)[3]
+            return True
+        message, tagged, self.token = self.call(self.app.tag_news, self.account_id, self.password, tag, self.token)
+        return tagged is not None
+
+
+class HttpDriver:
+    """Drives a running app over its Gradio API; each annotator gets its own client session."""
+
+    def __init__(self, app_name, url, admin_password):
+        from gradio_client import Client
+        self.app_name = app_name
+        self.url = url
+        self.admin_password = admin_password
+        self._client_class = Client
+        self._summary_client = Client(url, verbose=False)
+
+    def session(self, account_id, password):
+        return HttpSession(self, account_id, password)
+
+    def summary(self):
+        if self.app_name == "test2":
+            return self._summary_client.predict(api_name="/view_summary")
+        return self._summary_client.predict(self.admin_password, api_name="/show_summary")
+
+
+class HttpSession:
+    def __init__(self, driver, account_id, password):
+        self.driver = driver
+        self.client = driver._client_class(driver.url, verbose=False)
+        self.needs_login = driver.app_name != "test2"
+        self.account_id = account_id
+        self.password = password
+        self.idx = 0
+
+    def login(self):
+        self.client.predict(self.account_id, self.password, api_name="/user_login")
+        return True
+
+    def tag(self, tag):
+        app_name = self.driver.app_name
+        if app_name == "test":
+            result = self.client.predict(tag, api_name="/submit_tag")
+            return result[0] != "**All records tagged.**"
+        if app_name == "stremlit":
+            if self.idx < 0:
+                return False
+            self.idx = int(self.client.predict(self.idx, tag, api_name="/tag_news")[3])
+            return True
+        result = self.client.predict(self.account_id, self.password, tag, api_name="/tag_news")
+        return result[1] is not None
+
+
+class Recorder:
+    """Thread-safe latency samples per operation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def time(self, op, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            with self._lock:
+                self.errors[op] = self.errors.get(op, 0) + 1
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples.setdefault(op, []).append(elapsed)
+        return result
+
+    def summary(self):
+        ops = {}
+        for op, samples in self.samples.items():
+            latencies = np.array(samples) * 1000
+            ops[op] = {"count": len(samples), "errors": self.errors.get(op, 0),
+                       "mean_ms": float(latencies.mean()),
+                       "p50_ms": float(np.percentile(latencies, 50)),
+                       "p95_ms": float(np.percentile(latencies, 95)),
+                       "p99_ms": float(np.percentile(latencies, 99)),
+                       "max_ms": float(latencies.max())}
+        for op, errors in self.errors.items():
+            ops.setdefault(op, {"count": 0, "errors": errors})
+        return ops
+
+
+def run_annotator(driver, recorder, account_id, password, tags, think_time, seed):
+    rng = random.Random(seed)
+    session = driver.session(account_id, password)
+    if session.needs_login and recorder.time("login", session.login) is None:
+        return
+    for _ in range(tags):
+        if not recorder.time("tag", session.tag, rng.choice(("Yes", "No"))):
+            break
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+
+
+def run_summaries(driver, recorder, interval, stop):
+    while not stop.wait(interval):
+        recorder.time("summary", driver.summary)
+
+
+def run(args):
+    """Run one load test and return the results dict."""
+    recorder = Recorder()
+    data_dir = args.data_dir
+    if args.mode == "inprocess":
+        work_dir = args.work_dir or tempfile.mkdtemp(prefix="loadtest_")
+        os.makedirs(work_dir, exist_ok=True)
+        os.chdir(work_dir)
+        data_dir = work_dir
+        write_dataset("dataset.csv", args.rows, args.seed)
+        account_ids = write_account_ids("account_ids.txt", args.annotators)
+        driver = InProcessDriver(args.app, args.storage)
+        start = time.perf_counter()
+        credentials = driver.upload("dataset.csv", "account_ids.txt", args.num_sets or args.annotators,
+                                    args.users_per_set)
+        upload_seconds = time.perf_counter() - start
+    else:
+        credentials_df = pd.read_csv(args.credentials)
+        credentials = dict(zip(credentials_df["account_id"], credentials_df["password"]))
+        account_ids = list(credentials)[:args.annotators]
+        driver = HttpDriver(args.app, args.url, args.admin_password)
+        upload_seconds = None
+
+    bytes_before = dir_size(data_dir) if data_dir else None
+    stop = threading.Event()
+    summary_thread = None
+    if args.summary_interval > 0:
+        summary_thread = threading.Thread(target=run_summaries, args=(driver, recorder, args.summary_interval, stop),
+                                          daemon=True)
+        summary_thread.start()
+    threads = [threading.Thread(target=run_annotator,
+                                args=(driver, recorder, account_id, credentials[account_id], args.tags_per_annotator,
+                                      args.think_time, args.seed + i))
+               for i, account_id in enumerate(account_ids)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    if summary_thread:
+        summary_thread.join()
+
+    ops = recorder.summary()
+    tags = ops.get("tag", {}).get("count", 0)
+    bytes_written = dir_size(data_dir) - bytes_before if data_dir else None
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "output")},
+        "ops": ops,
+        "elapsed_s": elapsed,
+        "upload_s": upload_seconds,
+        "throughput_tags_per_s": tags / elapsed if elapsed else 0.0,
+        "bytes_per_tag": bytes_written / tags if bytes_written is not None and tags else None,
+        "peak_rss_mb": peak_rss_mb(args.server_pid),
+    }
+
+
+# Metrics compared against a baseline: name -> True if higher is better
+COMPARED_METRICS = {
+    "throughput_tags_per_s": True,
+    "bytes_per_tag": False,
+    "peak_rss_mb": False,
+}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with a baseline run.
+
+    Returns:
+        list: (metric, baseline value, current value, relative change, regressed) tuples.
+    """
+    rows = []
+    metrics = dict(COMPARED_METRICS)
+    for op in results["ops"]:
+        for percentile in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"ops.{op}.{percentile}"] = False
+    for metric, higher_is_better in metrics.items():
+        old, new = baseline, results
+        for part in metric.split("."):
+            old = old.get(part) if isinstance(old, dict) else None
+            new = new.get(part) if isinstance(new, dict) else None
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        regressed = -change > tolerance if higher_is_better else change > tolerance
+        rows.append((metric, old, new, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the news tagging apps with simulated annotators")
+    parser.add_argument("--app", choices=APPS, default="test", help="App script to drive")
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess",
+                        help="Call handlers directly or go through a running app's Gradio API")
+    parser.add_argument("--rows", type=int, default=10000, help="Synthetic dataset size (in-process mode)")
+    parser.add_argument("--annotators", type=int, default=20, help="Number of concurrent annotators")
+    parser.add_argument("--tags-per-annotator", type=int, default=200)
+    parser.add_argument("--num-sets", type=int, default=0, help="Sets to split the rows into (default: one per annotator)")
+    parser.add_argument("--users-per-set", type=int, default=1)
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds between an annotator's tags")
+    parser.add_argument("--summary-interval", type=float, default=1.0, help="Seconds between summary calls (0 disables)")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv", help="Storage backend (in-process mode)")
+    parser.add_argument("--work-dir", help="Directory for the app's files in in-process mode (default: a temp dir)")
+    parser.add_argument("--url", default="http://127.0.0.1:7860/", help="App URL (http mode)")
+    parser.add_argument("--credentials", default="passwords.csv",
+                        help="CSV of account_id,password pairs copied from the upload's credentials table (http mode); "
+                             "the app itself only stores password hashes")
+    parser.add_argument("--admin-password", default="x", help="Admin password for summary calls (http mode)")
+    parser.add_argument("--data-dir", help="The app's working directory, to measure bytes written (http mode)")
+    parser.add_argument("--server-pid", type=int, help="Report the peak RSS of this process instead of the harness")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="loadtest_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change treated as a regression")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    results = run(args)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for op, stats in sorted(results["ops"].items()):
+        if stats["count"]:
+            print(f"{op:>8}: n={stats['count']:<7} p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms "
+                  f"p99={stats['p99_ms']:.2f}ms errors={stats['errors']}")
+    print(f"throughput: {results['throughput_tags_per_s']:.1f} tags/s")
+    if results["bytes_per_tag"] is not None:
+        print(f"bytes/tag: {results['bytes_per_tag']:.1f}")
+    if results["peak_rss_mb"] is not None:
+        print(f"peak RSS: {results['peak_rss_mb']:.1f} MB")
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = 0
+        for metric, old, new, change, regressed in compare(results, baseline, args.tolerance):
+            regressions += regressed
+            print(f"{metric:>28}: {old:.2f} -> {new:.2f} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
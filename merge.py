@@ -1,87 +1,388 @@
-import pandas as pd
+import argparse
+import contextlib
+import glob
+import hashlib
+import json
+import os
+import pickle
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import merge_writers
 
-def merge_excel_sheets(input_files, special_col, output_file):
+KEY_COLS = ['A', 'B', 'C']
+ALL_SHEETS = "all"
+STREAMING_INPUTS = (".csv", ".parquet")
+CHUNK_SIZE = 100000
+PARTITION_BYTES = 16 << 20  # Input bytes per spill partition; a partition takes several times that once parsed
+SKIPPED_REASON = "Conflicting Columns"
+CACHE_VERSION = 1
+
+def merge_groups(combined_df, special_col):
     """
-    Merge four Excel files based on columns A, B, and C with special handling for a specified column.
+    Merge the rows of combined_df that share columns A, B and C, using grouped
+    aggregates instead of a Python loop over the groups.
+    
+    A group is skipped when any non-special column holds more than one value
+    in it (NaN counts as a value). Otherwise it becomes one row: A, B, C, the
+    "{val}-{file_id}" entries of its non-NaN special values joined with ", ",
+    and the value of every other column ('' when it is NaN throughout).
     
     Parameters:
-    input_files (list): List of four input Excel file paths.
+    combined_df (DataFrame): The concatenated sheets, with a file_id column.
+    special_col (str): The special column to concatenate.
+    
+    Returns:
+    tuple: (merged DataFrame in group order, DataFrame of the skipped groups'
+    A, B and C with their SKIPPED_REASON)
+    """
+    non_special_cols = [col for col in combined_df.columns if col not in KEY_COLS + [special_col, 'file_id']]
+    grouped = combined_df.groupby(KEY_COLS)
+    
+    # One nunique pass over all non-special columns finds the conflicting groups
+    if non_special_cols:
+        multiple = grouped[non_special_cols].nunique(dropna=False) > 1
+        conflicts = multiple.any(axis=1)
+    else:
+        multiple = pd.DataFrame(index=grouped.size().index)
+        conflicts = pd.Series(False, index=multiple.index)
+    skipped_df = conflicts.index[conflicts.to_numpy()].to_frame(index=False)
+    # Name the conflicting columns of each skipped group ("D, E") with one object matrix product
+    names = np.array([f"{col}, " for col in non_special_cols], dtype=object)
+    reasons = multiple[conflicts].to_numpy(dtype=object) @ names if len(skipped_df) else []
+    skipped_df[SKIPPED_REASON] = [reason[:-2] for reason in reasons]
+    if conflicts.all():
+        return pd.DataFrame(), skipped_df
+    
+    # Label every non-NaN special value with its file, then join the labels of each group in row order
+    group_ids = grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    labelled_rows = combined_df[special_col].notna().to_numpy() & (group_ids >= 0)
+    labelled = combined_df[labelled_rows]
+    labels = np.array([f"{val}-{file_id}" for val, file_id in zip(labelled[special_col], labelled['file_id'])],
+                      dtype=object)
+    order = np.argsort(group_ids[labelled_rows], kind="stable")
+    ids, labels = group_ids[labelled_rows][order], labels[order]
+    special_combined = np.full(len(conflicts), '', dtype=object)
+    if len(ids):
+        follows = np.r_[False, ids[1:] == ids[:-1]]
+        labels[follows] = ", " + labels[follows]
+        starts = np.flatnonzero(~follows)
+        special_combined[ids[starts]] = np.add.reduceat(labels, starts)
+    
+    # Without conflicts every non-NaN value of a group is the same, so the first one is the value
+    merged_df = grouped[non_special_cols].first() if non_special_cols else pd.DataFrame(index=conflicts.index)
+    merged_df = merged_df[~conflicts.to_numpy()]
+    merged_df.insert(0, special_col, special_combined[~conflicts.to_numpy()])
+    merged_df[non_special_cols] = merged_df[non_special_cols].fillna('')
+    # Give the columns the types they would get if the rows had been built one by one
+    return merged_df.reset_index().infer_objects(), skipped_df
+
+def expand_inputs(patterns):
+    """
+    Expand glob patterns into input paths, keeping the order of the patterns;
+    the matches of one pattern are sorted. Plain paths are kept as given.
+    """
+    paths = []
+    for pattern in patterns:
+        if any(char in pattern for char in "*?["):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise FileNotFoundError(f"No files match {pattern}")
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+    return paths
+
+def list_sources(paths, sheets=None):
+    """
+    The (path, sheet) pairs to read, in input order.
+    
+    Parameters:
+    paths (list): Workbook paths.
+    sheets (str or list): None for the first sheet of each workbook, ALL_SHEETS
+        for every sheet in workbook order, or a list of sheet names.
+    """
+    if sheets is None:
+        return [(path, 0) for path in paths]
+    sources = []
+    for path in paths:
+        if sheets == ALL_SHEETS:
+            with pd.ExcelFile(path) as workbook:
+                sources.extend((path, sheet) for sheet in workbook.sheet_names)
+        else:
+            sources.extend((path, sheet) for sheet in sheets)
+    return sources
+
+def _read_source(source):
+    path, sheet = source
+    return pd.read_excel(path, sheet_name=sheet)
+
+def read_sources(sources, workers=None):
+    """
+    Parse the sheets in a process pool, since parsing a workbook is CPU-bound.
+    
+    Returns:
+    list: One DataFrame per source, in the order of sources.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(sources))
+    if workers <= 1:
+        return [_read_source(source) for source in sources]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_read_source, sources))
+
+def merged_columns(columns, special_col):
+    """Columns of the merged output for input columns in concatenation order."""
+    return KEY_COLS + [special_col] + [col for col in columns if col not in KEY_COLS + [special_col, 'file_id']]
+
+def skipped_path(output_file):
+    """Default path of the skipped-keys report next to the output, e.g. merged_skipped.csv."""
+    return f"{os.path.splitext(output_file)[0]}_skipped.csv"
+
+def _check_output_format(path):
+    if os.path.splitext(path)[1].lower() not in merge_writers.OUTPUT_FORMATS:
+        formats = ', '.join(merge_writers.OUTPUT_FORMATS)
+        print(f"Error: Unsupported output format for {path}. Use one of: {formats}")
+        sys.exit(1)
+
+def _print_skipped(skipped, skipped_file):
+    if skipped:
+        print(f"Skipped {skipped} groups due to multiple values in non-special columns; their keys are in {skipped_file}")
+    else:
+        print("No merges were skipped.")
+
+def _read_inputs(sources, file_ids, special_col, sheets, workers):
+    """Read the (path, sheet) sources, check their columns and give each its file_id."""
+    for file, sheet in sources:
+        print(f"Reading {file}" if sheets is None else f"Reading {file} [{sheet}]")
+    dfs = read_sources(sources, workers)
+    for (file, sheet), df, file_id in zip(sources, dfs, file_ids):
+        # Check for required columns: A, B, C, and the special column
+        required_cols = ['A', 'B', 'C', special_col]
+        missing_cols = [col for col in required_cols if col not in df.columns]
+        if missing_cols:
+            name = file if sheets is None else f"{file} [{sheet}]"
+            print(f"Error: File {name} is missing columns: {', '.join(missing_cols)}")
+            sys.exit(1)
+        df['file_id'] = file_id  # Assign file identifier based on input order
+    return dfs
+
+def _write_outputs(merged_df, skipped_df, columns, output_file, skipped_file):
+    # Step 4: Report the merged DataFrame
+    if not merged_df.empty:
+        print(f"Merged shape: {merged_df.shape}")
+    else:
+        print("No rows to merge after filtering")
+    
+    # Step 5: Stream the merged DataFrame to the output file in chunks
+    print(f"Writing to {output_file}")
+    with merge_writers.replace_on_success(output_file) as output_tmp, \
+            merge_writers.open_writer(output_tmp, columns) as writer:
+        for start in range(0, len(merged_df), CHUNK_SIZE):
+            writer.write(merged_df.iloc[start:start + CHUNK_SIZE])
+    print("Merge completed successfully!")
+    
+    # Step 6: Report the keys of the skipped groups
+    with merge_writers.replace_on_success(skipped_file) as skipped_tmp, \
+            merge_writers.open_writer(skipped_tmp, KEY_COLS + [SKIPPED_REASON]) as writer:
+        writer.write(skipped_df)
+    _print_skipped(len(skipped_df), skipped_file)
+
+def _no_phase(name):
+    return contextlib.nullcontext()
+
+def merge_excel_sheets(input_files, special_col, output_file, sheets=None, workers=None, skipped_file=None,
+                       phase=None):
+    """
+    Merge Excel files based on columns A, B, and C with special handling for a specified column.
+    
+    Parameters:
+    input_files (list): Input Excel file paths or glob patterns, in order.
     special_col (str): The special column to handle differently during merging.
-    output_file (str): Path for the output Excel file.
+    output_file (str): Path for the output file (.xlsx, .csv or .parquet).
+    sheets (str or list): Sheets to read from each workbook (see list_sources); defaults to the first.
+    workers (int): Processes parsing the workbooks; defaults to the number of CPUs.
+    skipped_file (str): Report of the skipped groups' keys; defaults to skipped_path(output_file).
+    phase (callable): Optional phase(name) returning a context manager around each of the "read",
+        "concat", "merge" and "write" steps, e.g. to time them (see merge_bench.py).
     """
+    skipped_file = skipped_file or skipped_path(output_file)
+    phase = phase or _no_phase
+    _check_output_format(output_file)
+    _check_output_format(skipped_file)
     try:
-        # Step 1: Read and validate input Excel files
-        dfs = []
-        for i, file in enumerate(input_files, start=1):
-            print(f"Reading {file}")
-            df = pd.read_excel(file)
-            # Check for required columns: A, B, C, and the special column
-            required_cols = ['A', 'B', 'C', special_col]
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                print(f"Error: File {file} is missing columns: {', '.join(missing_cols)}")
-                sys.exit(1)
-            df['file_id'] = i  # Assign file identifier based on input order
-            dfs.append(df)
+        # Step 1: Read and validate input Excel files (each sheet gets the next file_id in input order)
+        with phase("read"):
+            sources = list_sources(expand_inputs(input_files), sheets)
+            dfs = _read_inputs(sources, range(1, len(sources) + 1), special_col, sheets, workers)
         
         # Step 2: Concatenate all DataFrames
-        print("Concatenating the sheets")
-        combined_df = pd.concat(dfs, axis=0, ignore_index=True)
-        print(f"Combined shape: {combined_df.shape}")
+        with phase("concat"):
+            print("Concatenating the sheets")
+            combined_df = pd.concat(dfs, axis=0, ignore_index=True)
+            del dfs
+            print(f"Combined shape: {combined_df.shape}")
         
-        # Step 3: Group by A, B, C and process each group
-        print("Processing groups based on columns A, B, C")
-        grouped = combined_df.groupby(['A', 'B', 'C'], as_index=False)
-        merged_rows = []
-        skipped_a_values = []
+        # Step 3: Group by A, B, C and merge each group
+        with phase("merge"):
+            print("Processing groups based on columns A, B, C")
+            merged_df, skipped_df = merge_groups(combined_df, special_col)
+            columns = merged_columns(combined_df.columns, special_col)
+            del combined_df
         
-        for name, group in grouped:
-            # Identify non-special columns (excluding A, B, C, special_col, and file_id)
-            non_special_cols = [col for col in group.columns if col not in ['A', 'B', 'C', special_col, 'file_id']]
-            # Check if any non-special column has multiple unique values
-            has_multiple_values = any(group[col].nunique(dropna=False) > 1 for col in non_special_cols)
-            
-            if has_multiple_values:
-                # Skip merging this group and record column A value
-                skipped_a_values.append(name[0])  # name[0] is the value of A
-                continue
-            
-            # Process the special column: concatenate values with file identifiers
-            special_values = group[[special_col, 'file_id']].dropna(subset=[special_col])
-            if not special_values.empty:
-                special_combined = ', '.join(
-                    f"{val}-{file_id}" for val, file_id in zip(special_values[special_col], special_values['file_id'])
-                )
-            else:
-                special_combined = ''
-            
-            # Create the merged row for this group
-            merged_row = {'A': name[0], 'B': name[1], 'C': name[2], special_col: special_combined}
-            for col in non_special_cols:
-                # Take the first non-NaN value for non-special columns (should be unique due to check)
-                merged_row[col] = group[col].iloc[0] if not group[col].isna().all() else ''
-            merged_rows.append(merged_row)
+        # Steps 4-6: Report and write the merged DataFrame and the skipped keys
+        with phase("write"):
+            _write_outputs(merged_df, skipped_df, columns, output_file, skipped_file)
         
-        # Step 4: Create the merged DataFrame from processed rows
-        if merged_rows:
-            merged_df = pd.DataFrame(merged_rows)
-            print(f"Merged shape: {merged_df.shape}")
-        else:
-            print("No rows to merge after filtering")
-            merged_df = pd.DataFrame()
+    except FileNotFoundError as e:
+        print(f"Error: One of the input files was not found - {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        sys.exit(1)
+
+def cache_path(output_file):
+    """Default cache directory of the incremental mode next to the output, e.g. merged_merge_cache."""
+    return f"{os.path.splitext(output_file)[0]}_merge_cache"
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _key_index(df):
+    return pd.MultiIndex.from_frame(df[KEY_COLS])
+
+def _concat_columns(dfs):
+    # The column order pd.concat gives the frames
+    columns = []
+    for df in dfs:
+        columns += [col for col in df.columns if col not in columns]
+    return columns
+
+def key_digests(df):
+    """
+    One 64-bit digest per (A, B, C) of a source's rows, covering their values
+    and order, so two versions of an input can be compared key by key.
+    
+    Returns:
+    Series: uint64 digests indexed by (A, B, C).
+    """
+    df = df[df[KEY_COLS].notna().all(axis=1)]
+    rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    position = df.groupby(KEY_COLS, sort=False).cumcount().to_numpy(dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        digests = pd.util.hash_array(rows ^ (position * np.uint64(0x9E3779B97F4A7C15)))
+    # uint64 sums wrap around, which keeps them order-independent across rows but position-aware per row
+    return pd.Series(digests, index=_key_index(df)).groupby(level=[0, 1, 2]).sum()
+
+def _changed_keys(old, new):
+    """Keys whose rows were added, removed or changed between two key_digests()."""
+    common = old.index.intersection(new.index, sort=False)
+    differs = old.reindex(common).to_numpy() != new.reindex(common).to_numpy()
+    return old.index.symmetric_difference(new.index, sort=False).append(common[differs])
+
+def _load_cache(cache_dir, sources, special_col):
+    """The previous run's manifest, or None if there is none or it was built for other inputs."""
+    try:
+        with open(os.path.join(cache_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (manifest.get("version") != CACHE_VERSION or manifest.get("special_col") != special_col
+            or [tuple(source) for source in manifest.get("sources", [])] != list(sources)):
+        return None
+    return manifest
+
+def _load_pickle(cache_dir, name):
+    with open(os.path.join(cache_dir, name), "rb") as f:
+        return pickle.load(f)
+
+def _save_pickle(cache_dir, name, value):
+    with open(os.path.join(cache_dir, name), "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _patch(cached_df, new_df, affected):
+    """Replace the rows of the affected keys in a cached result and restore the key order."""
+    kept = cached_df[~_key_index(cached_df).isin(affected)] if len(cached_df) else cached_df
+    if not len(new_df):
+        return kept.reset_index(drop=True)
+    patched = pd.concat([kept, new_df.reindex(columns=cached_df.columns)], axis=0, ignore_index=True)
+    return patched.sort_values(KEY_COLS, kind="stable", ignore_index=True)
+
+def merge_incremental(input_files, special_col, output_file, sheets=None, workers=None, skipped_file=None,
+                      cache_dir=None):
+    """
+    Merge like merge_excel_sheets, re-merging only what changed since the last run.
+    
+    The cache keeps every input's content hash and parsed rows, a digest per
+    (A, B, C) of each input's rows, and the merged and skipped frames. Only
+    inputs whose hash changed are read again. The keys whose digest changed
+    in them are re-merged from the rows of all inputs, and those groups
+    replace theirs in the cached result, which is then written out again.
+    Without a usable cache (first run, or other inputs, special column or
+    columns) everything is merged and cached.
+    
+    Parameters:
+    input_files, special_col, output_file, sheets, workers, skipped_file: As for merge_excel_sheets.
+    cache_dir (str): Directory of the cache; defaults to cache_path(output_file).
+    """
+    skipped_file = skipped_file or skipped_path(output_file)
+    cache_dir = cache_dir or cache_path(output_file)
+    _check_output_format(output_file)
+    _check_output_format(skipped_file)
+    try:
+        sources = list_sources(expand_inputs(input_files), sheets)
+        hashes = {path: _file_digest(path) for path in dict.fromkeys(path for path, _ in sources)}
+        manifest = _load_cache(cache_dir, sources, special_col)
+        changed = [i for i, (path, _) in enumerate(sources)
+                   if manifest is None or manifest["hashes"][i] != hashes[path]]
+        if manifest is not None and not changed and os.path.exists(output_file) and os.path.exists(skipped_file):
+            print("No input changed since the last merge; the output is up to date.")
+            return
         
-        # Step 5: Write the merged DataFrame to the output file
-        print(f"Writing to {output_file}")
-        merged_df.to_excel(output_file, index=False)
-        print("Merge completed successfully!")
+        # Read only the changed inputs; the others come from the cache
+        new_dfs = dict(zip(changed, _read_inputs([sources[i] for i in changed], [i + 1 for i in changed],
+                                                 special_col, sheets, workers)))
+        dfs = [new_dfs[i] if i in new_dfs else _load_pickle(cache_dir, f"source_{i}.pkl") for i in range(len(sources))]
+        columns = _concat_columns(dfs)
+        digests = {i: key_digests(df) for i, df in new_dfs.items()}
         
-        # Step 6: Print skipped column A values
-        if skipped_a_values:
-            print("Skipped column A values due to multiple values in non-special columns:")
-            print(', '.join(map(str, skipped_a_values)))
+        if manifest is None or manifest["columns"] != columns:
+            print("Merging all inputs (no cache for these inputs yet)")
+            merged_df, skipped_df = merge_groups(pd.concat(dfs, axis=0, ignore_index=True), special_col)
+            merged_df = merged_df.reindex(columns=merged_columns(columns, special_col))
         else:
-            print("No merges were skipped.")
+            affected = pd.MultiIndex.from_tuples([], names=KEY_COLS)
+            for i in changed:
+                affected = affected.union(_changed_keys(_load_pickle(cache_dir, f"digests_{i}.pkl"), digests[i]),
+                                          sort=False)
+            print(f"{len(changed)} of {len(sources)} inputs changed; re-merging {len(affected)} keys")
+            subset = pd.concat([df[_key_index(df).isin(affected)] for df in dfs], axis=0, ignore_index=True)
+            merged_part, skipped_part = merge_groups(subset.reindex(columns=columns), special_col)
+            merged_df = _patch(_load_pickle(cache_dir, "merged.pkl"), merged_part, affected)
+            skipped_df = _patch(_load_pickle(cache_dir, "skipped.pkl"), skipped_part, affected)
+        
+        _write_outputs(merged_df, skipped_df, merged_columns(columns, special_col), output_file, skipped_file)
+        
+        # The manifest goes last, so an interrupted save leaves no cache rather than a mismatched one
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(os.path.join(cache_dir, "manifest.json")):
+            os.remove(os.path.join(cache_dir, "manifest.json"))
+        for i in changed:
+            _save_pickle(cache_dir, f"source_{i}.pkl", dfs[i])
+            _save_pickle(cache_dir, f"digests_{i}.pkl", digests[i])
+        _save_pickle(cache_dir, "merged.pkl", merged_df)
+        _save_pickle(cache_dir, "skipped.pkl", skipped_df)
+        with open(os.path.join(cache_dir, "manifest.json"), "w") as f:
+            json.dump({"version": CACHE_VERSION, "special_col": special_col, "columns": columns,
+                       "sources": [list(source) for source in sources],
+                       "hashes": [hashes[path] for path, _ in sources]}, f)
         
     except FileNotFoundError as e:
         print(f"Error: One of the input files was not found - {e}")
@@ -90,16 +391,170 @@ def merge_excel_sheets(input_files, special_col, output_file):
         print(f"Error occurred: {e}")
         sys.exit(1)
 
-if __name__ == "__main__":
-    # Validate command-line arguments
-    if len(sys.argv) != 7:
-        print("Usage: python merge_sheets.py input1.xlsx input2.xlsx input3.xlsx input4.xlsx special_col output.xlsx")
-        sys.exit(1)
+def _input_columns(path):
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+def iter_input_chunks(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield a CSV or Parquet input as DataFrames of at most chunk_size rows.
+    CSV values are read as text, so every chunk of a file has the same types.
+    """
+    if path.lower().endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, dtype=str, chunksize=chunk_size)
+
+def _partition_of(keys, partitions):
+    # Numbers are hashed as floats so 1 and 1.0 from different files land in the same partition, as they group
+    keys = keys.apply(lambda col: col.astype("float64") if pd.api.types.is_numeric_dtype(col)
+                      and not pd.api.types.is_bool_dtype(col) else col)
+    return (pd.util.hash_pandas_object(keys, index=False).to_numpy() % np.uint64(partitions)).astype(np.int64)
+
+def _read_spill(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+def merge_streaming(input_files, special_col, output_file, partitions=None, chunk_size=CHUNK_SIZE, tmp_dir=None,
+                    skipped_file=None):
+    """
+    Merge CSV/Parquet inputs larger than memory with the rules of merge_groups.
+    
+    Each input is read in chunks, and its rows are hash-partitioned on A, B
+    and C into temporary spill files, so every group lands whole in one
+    partition. The partitions are then merged one at a time and appended to
+    the output, so memory holds one chunk or one partition at a time.
+    The outputs are written to temporary files that replace output_file and
+    skipped_file only once every partition is merged. Rows come out ordered
+    by A, B, C within each partition, not across partitions.
+    
+    Parameters:
+    input_files (list): Input .csv/.parquet paths or glob patterns, in file_id order.
+    special_col (str): The special column to handle differently during merging.
+    output_file (str): Path for the output file (.xlsx, .csv or .parquet).
+    partitions (int): Number of spill partitions; defaults to one per PARTITION_BYTES of input.
+    chunk_size (int): Rows read from an input at a time.
+    tmp_dir (str): Directory for the spill files; defaults to the system temp directory.
+    skipped_file (str): Report of the skipped groups' keys; defaults to skipped_path(output_file).
+    """
+    skipped_file = skipped_file or skipped_path(output_file)
+    _check_output_format(output_file)
+    _check_output_format(skipped_file)
+    try:
+        paths = expand_inputs(input_files)
+        unsupported = [path for path in paths if not path.lower().endswith(STREAMING_INPUTS)]
+        if unsupported:
+            print(f"Error: Streaming mode reads .csv/.parquet files, got: {', '.join(unsupported)}")
+            sys.exit(1)
+        
+        # Step 1: Check the headers and lay the columns out as pd.concat would
+        columns = []
+        for path in paths:
+            input_columns = _input_columns(path)
+            missing_cols = [col for col in KEY_COLS + [special_col] if col not in input_columns]
+            if missing_cols:
+                print(f"Error: File {path} is missing columns: {', '.join(missing_cols)}")
+                sys.exit(1)
+            columns += [col for col in input_columns + ['file_id'] if col not in columns]
+        if partitions is None:
+            partitions = max(1, -(-sum(os.path.getsize(path) for path in paths) // PARTITION_BYTES))
+        
+        with tempfile.TemporaryDirectory(prefix="merge_", dir=tmp_dir) as spill_dir:
+            # Step 2: Spill every chunk's rows to the partitions of their keys, keeping input order
+            spill_paths = [os.path.join(spill_dir, f"part_{part}.pkl") for part in range(partitions)]
+            spills = [open(path, "wb") for path in spill_paths]
+            try:
+                rows = 0
+                for i, path in enumerate(paths, start=1):
+                    print(f"Reading {path}")
+                    for chunk in iter_input_chunks(path, chunk_size):
+                        chunk['file_id'] = i
+                        # Rows with a missing key never form a group
+                        chunk = chunk[chunk[KEY_COLS].notna().all(axis=1)]
+                        if chunk.empty:
+                            continue
+                        rows += len(chunk)
+                        parts = _partition_of(chunk[KEY_COLS], partitions)
+                        # A stable sort by partition keeps the input order of the rows within each partition
+                        order = np.argsort(parts, kind="stable")
+                        chunk, parts = chunk.take(order), parts[order]
+                        bounds = np.flatnonzero(np.r_[True, parts[1:] != parts[:-1], True])
+                        for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                            pickle.dump(chunk.iloc[start:end], spills[parts[start]], protocol=pickle.HIGHEST_PROTOCOL)
+            finally:
+                for spill in spills:
+                    spill.close()
+            print(f"Partitioned {rows} rows into {partitions} partitions")
+            
+            # Step 3: Merge one partition at a time and append it to the output
+            print(f"Processing groups based on columns A, B, C and writing to {output_file}")
+            with merge_writers.replace_on_success(output_file) as output_tmp, \
+                    merge_writers.replace_on_success(skipped_file) as skipped_tmp, \
+                    merge_writers.open_writer(output_tmp, merged_columns(columns, special_col)) as writer, \
+                    merge_writers.open_writer(skipped_tmp, KEY_COLS + [SKIPPED_REASON]) as skipped_writer:
+                for spill_path in spill_paths:
+                    chunks = list(_read_spill(spill_path))
+                    if not chunks:
+                        continue
+                    partition_df = pd.concat(chunks, axis=0, ignore_index=True).reindex(columns=columns)
+                    del chunks
+                    merged_df, skipped_df = merge_groups(partition_df, special_col)
+                    writer.write(merged_df)
+                    skipped_writer.write(skipped_df)
+                    os.remove(spill_path)
+        
+        print(f"Merged rows: {writer.rows}")
+        print("Merge completed successfully!")
+        _print_skipped(skipped_writer.rows, skipped_file)
     
-    # Extract arguments
-    input_files = sys.argv[1:5]  # First four arguments are input files
-    special_col = sys.argv[5]    # Fifth argument is the special column name
-    output_file = sys.argv[6]    # Sixth argument is the output file
+    except FileNotFoundError as e:
+        print(f"Error: One of the input files was not found - {e}")
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge Excel sheets on columns A, B and C.")
+    parser.add_argument("input_files", nargs="+", help="Input workbooks or glob patterns, in file_id order")
+    parser.add_argument("special_col", help="Column whose values are concatenated with their file_id")
+    parser.add_argument("output_file",
+                        help=f"Output file ({', '.join(merge_writers.OUTPUT_FORMATS)}, by extension)")
+    parser.add_argument("--sheets", default=None,
+                        help=f"Comma-separated sheet names to read from every workbook, or '{ALL_SHEETS}' "
+                             "(default: the first sheet)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes parsing workbooks in parallel (default: number of CPUs)")
+    parser.add_argument("--skipped-file", default=None,
+                        help="Report of the keys of skipped groups (default: <output>_skipped.csv)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-merge only the keys of inputs changed since the last run, using a cache")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Cache of the incremental mode (default: <output>_merge_cache)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Merge .csv/.parquet inputs larger than memory through on-disk partitions")
+    parser.add_argument("--partitions", type=int, default=None,
+                        help="Spill partitions in streaming mode (default: one per 16 MB of input)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows read at a time in streaming mode")
+    parser.add_argument("--tmp-dir", default=None, help="Directory for the streaming spill files")
+    args = parser.parse_args()
+    sheets = args.sheets if args.sheets in (None, ALL_SHEETS) else args.sheets.split(",")
     
     # Run the merge function
-    merge_excel_sheets(input_files, special_col, output_file)
+    if args.incremental:
+        merge_incremental(args.input_files, args.special_col, args.output_file, sheets, args.workers,
+                          args.skipped_file, args.cache_dir)
+    elif args.streaming:
+        merge_streaming(args.input_files, args.special_col, args.output_file, args.partitions, args.chunk_size,
+                        args.tmp_dir, args.skipped_file)
+    else:
+        merge_excel_sheets(args.input_files, args.special_col, args.output_file, sheets, args.workers,
+                           args.skipped_file)
@@ -0,0 +1,289 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import merge
+import merge_writers
+
+SPECIAL_COL = "Special"
+PHASES = ("read", "concat", "merge", "write")
+B_VALUES = np.array(["north", "south", "east", "west"])
+C_VALUES = 10
+SPECIAL_VALUES = np.array(["yes", "no", "maybe"])
+TEXT_VALUES = 100000  # Distinct strings the text columns draw from
+GENERATOR_FILE = "generator.json"
+
+
+def generate_frame(rows, key_cardinality, conflict_rate=0.01, nan_density=0.05, columns=4, seed=0):
+    """
+    Synthetic merge input with columns A, B, C, SPECIAL_COL and V1..V<columns>.
+
+    Each row draws one of key_cardinality (A, B, C) keys uniformly. The V
+    columns (alternately text and numbers) are a function of the key, so the
+    rows of a key agree, except that in a conflict_rate fraction of the keys
+    V1 differs from row to row and the key is skipped once it has two rows.
+    nan_density is the fraction of missing special values and of missing
+    (key, V column) values; V values are missing for a whole key so they do
+    not add conflicts.
+    """
+    rng = np.random.default_rng(seed)
+    keys = rng.integers(0, key_cardinality, rows)
+    a, rest = np.divmod(keys, len(B_VALUES) * C_VALUES)
+    b, c = np.divmod(rest, C_VALUES)
+    df = pd.DataFrame({"A": a, "B": B_VALUES[b], "C": c})
+    special = SPECIAL_VALUES[rng.integers(0, len(SPECIAL_VALUES), rows)].astype(object)
+    special[rng.random(rows) < nan_density] = None
+    df[SPECIAL_COL] = special
+    text_values = np.array([f"text {i}" for i in range(min(key_cardinality, TEXT_VALUES))], dtype=object)
+    conflicting = (rng.random(key_cardinality) < conflict_rate)[keys]
+    row_ids = np.arange(rows)
+    for i in range(1, columns + 1):
+        # Spread the keys over the values differently in every column
+        codes = (keys * (2 * i + 1) + i) % len(text_values)
+        if i == 1:
+            codes = np.where(conflicting, (codes + row_ids) % len(text_values), codes)
+        values = text_values[codes] if i % 2 else codes * 0.25
+        missing = (rng.random(key_cardinality) < nan_density)[keys]
+        if i == 1:
+            missing &= ~conflicting
+        df[f"V{i}"] = pd.Series(values).where(~missing)
+    return df
+
+
+def generate_inputs(data_dir, rows, files=4, key_cardinality=None, conflict_rate=0.01, nan_density=0.05,
+                    columns=4, seed=0):
+    """
+    Write a synthetic input set to data_dir as files workbooks, dealing the
+    rows of generate_frame() out in turn. A set generated earlier with the
+    same parameters is reused.
+
+    Returns:
+        dict: The generator parameters and statistics, including "files"
+        (the workbook paths in file_id order).
+    """
+    # Every workbook has to fit on one worksheet, since merge_excel_sheets reads the first
+    files = max(files, -(-rows // (merge_writers.XLSX_MAX_ROWS - 1)))
+    params = {"rows": rows, "files": files, "key_cardinality": key_cardinality or max(1, rows // 2),
+              "conflict_rate": conflict_rate, "nan_density": nan_density, "columns": columns, "seed": seed}
+    manifest = os.path.join(data_dir, GENERATOR_FILE)
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            generated = json.load(f)
+        if generated["params"] == params and all(os.path.exists(path) for path in generated["files"]):
+            return generated
+    os.makedirs(data_dir, exist_ok=True)
+    df = generate_frame(rows, params["key_cardinality"], conflict_rate, nan_density, columns, seed)
+    paths = [os.path.join(data_dir, f"input_{i + 1}.xlsx") for i in range(files)]
+    for i, path in enumerate(paths):
+        with merge_writers.open_writer(path, df.columns) as writer:
+            writer.write(df.iloc[i::files])
+    generated = {"params": params, "files": paths,
+                 "distinct_keys": int(len(df.drop_duplicates(merge.KEY_COLS))),
+                 "input_bytes": sum(os.path.getsize(path) for path in paths)}
+    with open(manifest, "w") as f:
+        json.dump(generated, f, indent=2)
+    return generated
+
+
+def _status_mb(field):
+    """A memory field of /proc/self/status (e.g. VmHWM, the peak RSS) in MB, or None off Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS of this process to its current RSS; False where the kernel does not allow it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class PhaseRecorder:
+    """
+    The phase hook of merge.merge_excel_sheets: wall time and peak RSS per phase.
+
+    The peak is reset before every phase on Linux, so it is that phase's own
+    high-water mark; elsewhere it is the process peak up to the phase's end.
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def __call__(self, name):
+        reset = _reset_peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = _status_mb("VmHWM") if reset else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.phases[name] = {"seconds": elapsed, "peak_rss_mb": peak, "rss_after_mb": _status_mb("VmRSS"),
+                                 "peak_is_per_phase": reset}
+
+
+def run_merge(input_files, output_file, workers=1, verbose=False):
+    """
+    Run merge.merge_excel_sheets once with a PhaseRecorder.
+
+    Returns:
+        dict: Per-phase timings and memory, total seconds and output sizes.
+    """
+    recorder = PhaseRecorder()
+    skipped_file = merge.skipped_path(output_file)
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(sys.stdout if verbose else log):
+            merge.merge_excel_sheets(input_files, SPECIAL_COL, output_file, workers=workers, phase=recorder)
+    except SystemExit:
+        # merge_excel_sheets reports errors on stdout before exiting
+        sys.stderr.write(log.getvalue())
+        raise
+    total = time.perf_counter() - start
+    with open(skipped_file) as f:
+        skipped_keys = sum(1 for _ in f) - 1
+    return {
+        "phases": {name: recorder.phases.get(name) for name in PHASES},
+        "total_s": total,
+        "peak_rss_mb": max((phase["peak_rss_mb"] for phase in recorder.phases.values()), default=None),
+        # Peak of the largest workbook-parsing process when workers > 1
+        "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024 if workers > 1 else None,
+        "skipped_keys": skipped_keys,
+        "output_bytes": os.path.getsize(output_file),
+    }
+
+
+def machine_info():
+    return {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count(),
+            "pandas": pd.__version__, "numpy": np.__version__}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare each run with the baseline run of the same row count and NaN
+    density (the fastest repeat of each); lower is better for every metric.
+
+    Returns:
+        list: (metric, baseline value, current value, relative change, regressed) tuples.
+    """
+    def best(runs):
+        fastest = {}
+        for run in runs:
+            case = (run["config"]["rows"], run["config"]["nan_density"])
+            if case not in fastest or run["total_s"] < fastest[case]["total_s"]:
+                fastest[case] = run
+        return fastest
+
+    old_runs, new_runs = best(baseline["runs"]), best(results["runs"])
+    compared = []
+    for (rows, nan_density), new_run in sorted(new_runs.items()):
+        old_run = old_runs.get((rows, nan_density))
+        if old_run is None:
+            continue
+        metrics = [("total_s", old_run["total_s"], new_run["total_s"]),
+                   ("peak_rss_mb", old_run["peak_rss_mb"], new_run["peak_rss_mb"])]
+        for name in PHASES:
+            old_phase, new_phase = old_run["phases"].get(name), new_run["phases"].get(name)
+            if old_phase and new_phase:
+                metrics.append((f"{name}_s", old_phase["seconds"], new_phase["seconds"]))
+        for metric, old, new in metrics:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            compared.append((f"{rows}.nan{nan_density:g}.{metric}", old, new, change, change > tolerance))
+    return compared
+
+
+def run(args):
+    """
+    Generate (or reuse) the inputs of every row count and NaN density, merge
+    each args.repeat times and return the results.
+    """
+    runs = []
+    for rows, nan_density in itertools.product(args.rows, args.nan_density):
+        data_dir = os.path.join(args.data_dir, f"rows_{rows}_nan_{nan_density:g}")
+        print(f"Generating {rows:,} rows with NaN density {nan_density:g} in {data_dir}")
+        generated = generate_inputs(data_dir, rows, args.files, args.key_cardinality, args.conflict_rate,
+                                    nan_density, args.columns, args.seed)
+        config = dict(generated["params"], output_format=args.output_format, workers=args.workers)
+        for repeat in range(args.repeat):
+            out_dir = tempfile.mkdtemp(prefix="merge_bench_")
+            try:
+                result = run_merge(generated["files"], os.path.join(out_dir, f"merged{args.output_format}"),
+                                   args.workers, args.verbose)
+            finally:
+                shutil.rmtree(out_dir, ignore_errors=True)
+            runs.append(dict(config=config, repeat=repeat, distinct_keys=generated["distinct_keys"],
+                             input_bytes=generated["input_bytes"], **result))
+            phases = "  ".join(f"{name}={phase['seconds']:.2f}s" for name, phase in result["phases"].items() if phase)
+            print(f"{rows:>10,} rows, NaN {nan_density:<4g}: {phases}  total={result['total_s']:.2f}s  peak RSS={result['peak_rss_mb']:.0f} MB")
+    return {"machine": machine_info(), "runs": runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark merge.py's merge_excel_sheets on synthetic workbooks")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000],
+                        help="Total input rows; one benchmark per value (e.g. 10000 100000 1000000 10000000)")
+    parser.add_argument("--files", type=int, default=4,
+                        help="Input workbooks to spread the rows over (raised so each fits on one worksheet)")
+    parser.add_argument("--key-cardinality", type=int, default=None,
+                        help="Distinct (A, B, C) keys the rows draw from (default: half the rows)")
+    parser.add_argument("--conflict-rate", type=float, default=0.01,
+                        help="Fraction of keys whose rows disagree in a non-special column")
+    parser.add_argument("--nan-density", type=float, nargs="+", default=[0.05, 1.0],
+                        help="Fractions of missing values; one benchmark per value and row count (1.0 leaves "
+                             "the special column empty)")
+    parser.add_argument("--columns", type=int, default=4, help="Non-special columns besides A, B and C")
+    parser.add_argument("--output-format", choices=merge_writers.OUTPUT_FORMATS, default=".xlsx")
+    parser.add_argument("--workers", type=int, default=1, help="Processes parsing the workbooks")
+    parser.add_argument("--repeat", type=int, default=1, help="Merges per row count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "merge_bench_data"),
+                        help="Where the synthetic workbooks are kept and reused between runs")
+    parser.add_argument("--verbose", action="store_true", help="Show merge.py's own progress messages")
+    parser.add_argument("--output", default="merge_bench_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change treated as a regression")
+    args = parser.parse_args()
+
+    results = run(args)
+    results["config"] = {key: value for key, value in vars(args).items() if key not in ("baseline", "output")}
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = 0
+        for metric, old, new, change, regressed in compare(results, baseline, args.tolerance):
+            regressions += regressed
+            print(f"{metric:>24}: {old:.2f} -> {new:.2f} ({change:+.1%}){'  REGRESSION' if regressed else ''}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import contextlib
+import datetime
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+OUTPUT_FORMATS = (".xlsx", ".csv", ".parquet")
+XLSX_MAX_ROWS = 1048576  # Rows per worksheet, header included; longer outputs continue on another sheet
+
+@contextlib.contextmanager
+def replace_on_success(path):
+    """
+    Yield a temporary path next to path, with the same extension, and move it
+    over path only when the block succeeds, so a failed run never leaves a
+    partly written output that looks complete.
+    """
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.partial{ext}"
+    try:
+        yield tmp_path
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+class _OutputWriter:
+    """Appends DataFrame chunks with a fixed list of columns to an output file."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = 0
+
+    def write(self, df):
+        if len(df):
+            self._write(df.reindex(columns=self.columns))
+            self.rows += len(df)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class _CsvWriter(_OutputWriter):
+    def __init__(self, path, columns):
+        super().__init__(columns)
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        pd.DataFrame(columns=self.columns).to_csv(self._file, index=False)
+
+    def _write(self, df):
+        df.to_csv(self._file, index=False, header=False)
+
+    def close(self):
+        self._file.close()
+
+class _ParquetWriter(_OutputWriter):
+    """Every column as text, since a merged column can mix values and '' across chunks."""
+
+    def __init__(self, path, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        super().__init__(columns)
+        self._pa = pa
+        self._schema = pa.schema([(str(col), pa.string()) for col in self.columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def _write(self, df):
+        df = df.astype("string")
+        df.columns = [str(col) for col in df.columns]
+        self._writer.write_table(self._pa.Table.from_pandas(df, schema=self._schema, preserve_index=False))
+
+    def close(self):
+        self._writer.close()
+
+_XLSX_EMPTY = '<c/>'  # Cells carry no reference, so an empty cell still has to hold its place
+# Characters XML cannot hold, and the underscore of text that already reads like an _xHHHH_ escape
+_XLSX_ESCAPED = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]|_(?=x[0-9A-Fa-f]{4}_)")
+_EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+_XLSX_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_XLSX_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_XLSX_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XLSX_CT = "application/vnd.openxmlformats-officedocument.spreadsheetml"
+# Style 1 shows date/time cells as dates
+_XLSX_STYLES = (f'<styleSheet xmlns="{_XLSX_NS}"><numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/>'
+                '</numFmts><fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts><fills count="2">'
+                '<fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+                '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+                '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+                '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+                '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+                '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles></styleSheet>')
+
+def _xlsx_escape(match):
+    # Written in the _xHHHH_ form Excel decodes, so "_x0041_" itself is stored as "_x005F_x0041_"
+    return f"_x{ord(match.group()):04X}_"
+
+def _xlsx_text(text):
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XLSX_ESCAPED.sub(_xlsx_escape, text))}</t></is></c>' \
+        if text else _XLSX_EMPTY
+
+def _xlsx_cell(value):
+    """One <c> element for a value of unknown type."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return _XLSX_EMPTY
+    if isinstance(value, (bool, np.bool_)):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return f'<c><v>{value}</v></c>' if np.isfinite(value) else _XLSX_EMPTY
+    if isinstance(value, datetime.datetime):
+        serial = (value.replace(tzinfo=None) - _EXCEL_EPOCH) / datetime.timedelta(days=1)
+        return f'<c s="1"><v>{serial}</v></c>'
+    if isinstance(value, datetime.date):
+        return f'<c s="1"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    return _xlsx_text(value if isinstance(value, str) else str(value))
+
+def _xlsx_cells(series):
+    """The <c> elements of one column as an object array, built column-wise for typed columns."""
+    cells = np.full(len(series), _XLSX_EMPTY, dtype=object)
+    if pd.api.types.is_bool_dtype(series) and not series.hasnans:
+        cells[:] = np.where(series.to_numpy(dtype=bool), '<c t="b"><v>1</v></c>', '<c t="b"><v>0</v></c>')
+    elif pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        finite = np.isfinite(series.to_numpy(dtype=np.float64, na_value=np.nan))
+        cells[finite] = '<c><v>' + series[finite].astype(str).to_numpy(dtype=object) + '</v></c>'
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        present = series.notna().to_numpy()
+        serials = (series[present].dt.tz_localize(None) if series.dt.tz is not None else series[present]) - _EXCEL_EPOCH
+        cells[present] = ('<c s="1"><v>' + (serials / pd.Timedelta(days=1)).astype(str).to_numpy(dtype=object)
+                          + '</v></c>')
+    elif pd.api.types.is_string_dtype(series) and not pd.api.types.is_object_dtype(series):
+        present = (series.notna() & (series != '')).to_numpy()
+        text = (series[present].str.replace('&', '&amp;', regex=False).str.replace('<', '&lt;', regex=False)
+                .str.replace('>', '&gt;', regex=False).str.replace(_XLSX_ESCAPED, _xlsx_escape, regex=True))
+        cells[present] = ('<c t="inlineStr"><is><t xml:space="preserve">' + text.to_numpy(dtype=object)
+                          + '</t></is></c>')
+    else:
+        cells[:] = [_xlsx_cell(value) for value in series.tolist()]
+    return cells
+
+class _XlsxWriter(_OutputWriter):
+    """
+    Constant-memory .xlsx writer: rows are rendered to sheet XML a chunk at a
+    time, column by column, and streamed into the zip archive, with inline
+    strings so no shared-string table has to be held. Outputs longer than a
+    worksheet continue on Sheet2, Sheet3, ... with the header repeated.
+    """
+
+    def __init__(self, path, columns):
+        super().__init__(columns)
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+        self._sheets = 0
+        self._sheet = None
+        self._new_sheet()
+
+    def _new_sheet(self):
+        if self._sheet is not None:
+            self._sheet.write(b'</sheetData></worksheet>')
+            self._sheet.close()
+        self._sheets += 1
+        self._sheet_rows = 1
+        self._sheet = self._zip.open(f"xl/worksheets/sheet{self._sheets}.xml", "w", force_zip64=True)
+        header = "".join(_xlsx_text(str(col)) for col in self.columns)
+        self._sheet.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{_XLSX_NS}">'
+                          f'<sheetData><row>{header}</row>'.encode("utf-8"))
+
+    def _write(self, df):
+        while len(df):
+            if self._sheet_rows == XLSX_MAX_ROWS:
+                self._new_sheet()
+            part, df = df.iloc[:XLSX_MAX_ROWS - self._sheet_rows], df.iloc[XLSX_MAX_ROWS - self._sheet_rows:]
+            rows = np.full(len(part), '<row>', dtype=object)
+            for col in range(part.shape[1]):
+                rows += _xlsx_cells(part.iloc[:, col])
+            rows += '</row>'
+            self._sheet.write("".join(rows.tolist()).encode("utf-8"))
+            self._sheet_rows += len(part)
+
+    def close(self):
+        self._sheet.write(b'</sheetData></worksheet>')
+        self._sheet.close()
+        sheets = range(1, self._sheets + 1)
+        overrides = "".join(f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{_XLSX_CT}.worksheet+xml"/>'
+                            for i in sheets)
+        self._zip.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'<Override PartName="/xl/workbook.xml" ContentType="{_XLSX_CT}.sheet.main+xml"/>'
+            f'<Override PartName="/xl/styles.xml" ContentType="{_XLSX_CT}.styles+xml"/>{overrides}</Types>'))
+        self._zip.writestr("_rels/.rels", (
+            f'<Relationships xmlns="{_XLSX_PKG_REL}"><Relationship Id="rId1" '
+            f'Type="{_XLSX_REL}/officeDocument" Target="xl/workbook.xml"/></Relationships>'))
+        self._zip.writestr("xl/workbook.xml", (
+            f'<workbook xmlns="{_XLSX_NS}" xmlns:r="{_XLSX_REL}"><sheets>'
+            + "".join(f'<sheet name="Sheet{i}" sheetId="{i}" r:id="rId{i}"/>' for i in sheets)
+            + '</sheets></workbook>'))
+        self._zip.writestr("xl/_rels/workbook.xml.rels", (
+            f'<Relationships xmlns="{_XLSX_PKG_REL}">'
+            + "".join(f'<Relationship Id="rId{i}" Type="{_XLSX_REL}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                      for i in sheets)
+            + f'<Relationship Id="rId{self._sheets + 1}" Type="{_XLSX_REL}/styles" Target="styles.xml"/>'
+            '</Relationships>'))
+        self._zip.writestr("xl/styles.xml", _XLSX_STYLES)
+        self._zip.close()
+
+def open_writer(path, columns):
+    """
+    Streaming writer for path, chosen by its extension (one of OUTPUT_FORMATS).
+    Use as a context manager and call write(df) with each chunk of rows.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return _CsvWriter(path, columns)
+    if ext == ".parquet":
+        return _ParquetWriter(path, columns)
+    if ext == ".xlsx":
+        return _XlsxWriter(path, columns)
+    raise ValueError(f"Unsupported output format '{ext}'. Use one of: {', '.join(OUTPUT_FORMATS)}.")
@@ -0,0 +1,162 @@
+import atexit
+import functools
+import inspect
+import json
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds in seconds of the latency histogram buckets (plus +Inf)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PREFIX = "tagging"
+
+_lock = threading.Lock()
+_ops = {}
+
+
+def _new_op():
+    return {"calls": 0, "errors": 0, "latency_sum": 0.0, "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            "bytes_read": 0, "bytes_written": 0, "rows_scanned": 0}
+
+
+def _op(name):
+    op = _ops.get(name)
+    if op is None:
+        op = _ops[name] = _new_op()
+    return op
+
+
+def observe(name, seconds, error=False):
+    """Record one call of `name` that took `seconds`."""
+    with _lock:
+        op = _op(name)
+        op["calls"] += 1
+        op["errors"] += bool(error)
+        op["latency_sum"] += seconds
+        op["buckets"][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+
+def add_io(name, read=0, written=0, rows=0):
+    """Add bytes read/written and rows scanned to the counters of `name`."""
+    with _lock:
+        op = _op(name)
+        op["bytes_read"] += int(read)
+        op["bytes_written"] += int(written)
+        op["rows_scanned"] += int(rows)
+
+
+def timed(name=None):
+    """Decorator recording call count, errors and latency of a (sync or async) function."""
+    def decorate(fn):
+        op_name = name or fn.__name__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                error = False
+                try:
+                    return await fn(*args, **kwargs)
+                except BaseException:
+                    error = True
+                    raise
+                finally:
+                    observe(op_name, time.perf_counter() - start, error)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                observe(op_name, time.perf_counter() - start, error)
+        return wrapper
+    return decorate
+
+
+def snapshot():
+    """Return a copy of every counter as plain dicts."""
+    with _lock:
+        ops = {name: dict(op, buckets=list(op["buckets"])) for name, op in _ops.items()}
+    for op in ops.values():
+        op["latency_buckets"] = {str(bound): count for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), op.pop("buckets"))}
+        op["latency_mean"] = op["latency_sum"] / op["calls"] if op["calls"] else 0.0
+    return ops
+
+
+def reset():
+    with _lock:
+        _ops.clear()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus():
+    """Render all counters in the Prometheus text exposition format."""
+    with _lock:
+        ops = sorted((name, dict(op, buckets=list(op["buckets"]))) for name, op in _ops.items())
+    lines = []
+    for metric, key, kind, help_text in (
+            ("calls_total", "calls", "counter", "Calls per handler or storage operation."),
+            ("errors_total", "errors", "counter", "Calls that raised an exception."),
+            ("bytes_read_total", "bytes_read", "counter", "Bytes read from disk."),
+            ("bytes_written_total", "bytes_written", "counter", "Bytes written to disk."),
+            ("rows_scanned_total", "rows_scanned", "counter", "Dataset rows read or walked.")):
+        lines.append(f"# HELP {PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+        lines.extend(f'{PREFIX}_{metric}{{op="{_label(name)}"}} {op[key]}' for name, op in ops)
+    lines.append(f"# HELP {PREFIX}_latency_seconds Call latency.")
+    lines.append(f"# TYPE {PREFIX}_latency_seconds histogram")
+    for name, op in ops:
+        if not op["calls"]:
+            continue
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), op["buckets"]):
+            cumulative += count
+            lines.append(f'{PREFIX}_latency_seconds_bucket{{op="{_label(name)}",le="{bound}"}} {cumulative}')
+        lines.append(f'{PREFIX}_latency_seconds_sum{{op="{_label(name)}"}} {op["latency_sum"]}')
+        lines.append(f'{PREFIX}_latency_seconds_count{{op="{_label(name)}"}} {op["calls"]}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, content_type = json.dumps(snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Serve /metrics (Prometheus text) and /metrics.json on a side port from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def dump_json(path):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+def dump_json_at_exit(path):
+    """Write the counters to path as JSON when the process exits."""
+    atexit.register(dump_json, path)
@@ -0,0 +1,196 @@
+import random
+import threading
+from collections import deque
+
+import numpy as np
+
+import common
+
+
+def plan_sets(num_rows, num_sets, rows=None):
+    """Split rows 0..num_rows-1 (or just `rows`) round-robin into num_sets compact index arrays."""
+    dtype = common.index_dtype(num_rows)
+    if rows is not None:
+        rows = np.asarray(rows, dtype=dtype)
+        return [rows[i::num_sets] for i in range(num_sets)]
+    return [np.arange(i, num_rows, num_sets, dtype=dtype) for i in range(num_sets)]
+
+
+def plan_set_users(account_ids, num_sets, num_users_per_set, seed=None):
+    """
+    Assign users to sets so that every set gets at least num_users_per_set
+    distinct users and every user gets at least one set.
+
+    Slots are filled round-robin over a shuffled user list, so the number of
+    sets per user differs by at most one.
+
+    Returns:
+        dict: set index -> list of account_ids.
+    """
+    users = list(account_ids)
+    rng = random.Random(seed) if seed is not None else random
+    rng.shuffle(users)
+    M = len(users)
+    if M == 0:
+        return {set_idx: [] for set_idx in range(num_sets)}
+    replication = min(num_users_per_set, M)
+    # Spread any users beyond num_sets * replication over the sets as extra replicas
+    base_users_per_set = max(replication, M // num_sets)
+    extra_users = M % num_sets if M // num_sets >= replication else 0
+    set_to_users = {}
+    slot = 0
+    for set_idx in range(num_sets):
+        num_users = base_users_per_set + (1 if set_idx < extra_users else 0)
+        set_to_users[set_idx] = [users[(slot + k) % M] for k in range(num_users)]
+        slot += num_users
+    return set_to_users
+
+
+def plan_user_rows(account_ids, sets, set_to_users, num_rows):
+    """
+    Build each user's sorted row index array in time linear in the total
+    number of assignments.
+
+    Returns:
+        dict: account_id -> numpy array of row indices.
+    """
+    user_to_sets = {account_id: [] for account_id in account_ids}
+    for set_idx, users in set_to_users.items():
+        for user in users:
+            user_to_sets[user].append(set_idx)
+    dtype = common.index_dtype(num_rows)
+    user_to_rows = {}
+    for account_id, assigned_sets in user_to_sets.items():
+        if not assigned_sets:
+            user_to_rows[account_id] = np.empty(0, dtype=dtype)
+        elif len(assigned_sets) == 1:
+            user_to_rows[account_id] = sets[assigned_sets[0]]
+        else:
+            user_to_rows[account_id] = np.sort(np.concatenate([sets[set_idx] for set_idx in assigned_sets]))
+    return user_to_rows
+
+
+def plan_assignments(num_rows, account_ids, num_sets, num_users_per_set, seed=None, rows=None):
+    """
+    Compute a static assignment plan.
+
+    Args:
+        num_rows: Number of rows in the dataset.
+        account_ids: List of annotator account ids.
+        num_sets: Number of disjoint row sets.
+        num_users_per_set: Replication factor, i.e. distinct users per set.
+        seed: Optional seed for the user shuffle.
+        rows: Sorted row indices to assign, e.g. without near-duplicates;
+            defaults to every row.
+
+    Returns:
+        tuple: (sets, set_to_users, user_to_rows)
+    """
+    sets = plan_sets(num_rows, num_sets, rows)
+    set_to_users = plan_set_users(account_ids, num_sets, num_users_per_set, seed)
+    user_to_rows = plan_user_rows(account_ids, sets, set_to_users, num_rows)
+    return sets, set_to_users, user_to_rows
+
+
+class WorkQueue:
+    """
+    Shared queue that hands out rows on demand instead of fixing assignments
+    up front, so fast annotators keep working while slow ones hold only the
+    row they are on. Each row is handed to `replication` distinct users.
+
+    Every user walks the row order with their own cursor and never sees a
+    row twice; rows handed back with release() are offered again first.
+    """
+
+    def __init__(self, rows, replication=1):
+        self._order = np.asarray(rows)
+        self._replication = max(1, int(replication))
+        self._claims = np.zeros(len(self._order), dtype=np.int16)
+        self._position = {int(row): i for i, row in enumerate(self._order)}
+        self._low = 0  # Everything before this position is fully claimed
+        self._cursors = {}
+        self._claimed = {}
+        self._returned = deque()
+        self._lock = threading.Lock()
+
+    def claim(self, account_id, row_idx):
+        """
+        Mark row_idx as taken by account_id, e.g. when replaying earlier tags.
+
+        Returns:
+            bool: False if the row is not in the queue or account_id already holds it.
+        """
+        with self._lock:
+            pos = self._position.get(int(row_idx))
+            return pos is not None and self._claim(account_id, pos)
+
+    def _claim(self, account_id, pos):
+        claimed = self._claimed.setdefault(account_id, set())
+        if pos in claimed:
+            return False
+        claimed.add(pos)
+        self._claims[pos] += 1
+        return True
+
+    def next_row(self, account_id):
+        """Hand out the next row for account_id, or None when nothing is left for them."""
+        with self._lock:
+            claimed = self._claimed.setdefault(account_id, set())
+            for _ in range(len(self._returned)):
+                pos = self._returned.popleft()
+                if pos not in claimed and self._claims[pos] < self._replication:
+                    self._claim(account_id, pos)
+                    return int(self._order[pos])
+                self._returned.append(pos)
+            while self._low < len(self._order) and self._claims[self._low] >= self._replication:
+                self._low += 1
+            pos = max(self._cursors.get(account_id, 0), self._low)
+            while pos < len(self._order) and (self._claims[pos] >= self._replication or pos in claimed):
+                pos += 1
+            self._cursors[account_id] = pos + 1
+            if pos >= len(self._order):
+                return None
+            self._claim(account_id, pos)
+            return int(self._order[pos])
+
+    def release(self, account_id, row_idx):
+        """Give back a claimed but untagged row so another annotator can take it."""
+        with self._lock:
+            pos = self._position[int(row_idx)]
+            claimed = self._claimed.get(account_id, set())
+            if pos in claimed:
+                claimed.discard(pos)
+                self._claims[pos] -= 1
+                self._returned.append(pos)
+                self._low = min(self._low, pos)
+
+    def remaining(self):
+        """Number of row replicas not yet handed out."""
+        with self._lock:
+            return int(self._replication * len(self._order) - self._claims.sum())
+
+
+def restore_work_queue(rows, replication, account_ids, annotations):
+    """
+    Rebuild the shared queue after a restart, when claims are gone and only
+    the stored labels are left: every row a user labelled is claimed for them
+    again, so it is neither handed back to them nor to more than
+    `replication` users in total.
+
+    Args:
+        rows: Rows the queue hands out, as given to WorkQueue.
+        replication: Distinct users per row.
+        account_ids: Every annotator, including those without labels yet.
+        annotations: Iterable of (row_idx, account_id, tag), e.g. from
+            storage.load_annotations().
+
+    Returns:
+        tuple: (work_queue, user_to_rows) where user_to_rows maps each
+        account_id to the rows it labelled, in the order they were stored.
+    """
+    work_queue = WorkQueue(rows, replication)
+    user_to_rows = {account_id: [] for account_id in account_ids}
+    for row_idx, account_id, _ in annotations:
+        if work_queue.claim(account_id, row_idx):
+            user_to_rows.setdefault(account_id, []).append(int(row_idx))
+    return work_queue, user_to_rows
@@ -0,0 +1,317 @@
+import hashlib
+import html
+import http.client
+import ipaddress
+import os
+import re
+import socket
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+CACHE_DIR = "preview_cache"
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+FETCH_TIMEOUT = 10
+PREFETCH_DEPTH = 3  # Upcoming articles fetched per annotator once prefetching is switched on
+USER_AGENT = "Mozilla/5.0 (compatible; news-tagging-preview)"
+
+# Elements that can run code or pull in other documents are dropped with their content
+_BLOCK_TAGS = re.compile(r"<(script|iframe|frame|frameset|object|embed|applet|noscript|template)\b.*?</\1\s*>",
+                         re.IGNORECASE | re.DOTALL)
+_SINGLE_TAGS = re.compile(r"<(script|iframe|frame|object|embed|applet|base|meta\s+http-equiv)\b[^>]*>",
+                          re.IGNORECASE)
+_EVENT_ATTRS = re.compile(r"""\s+on[a-z]+\s*=\s*("[^"]*"|'[^']*'|[^\s>]+)""", re.IGNORECASE)
+_JS_URLS = re.compile(r"""(href|src|action|formaction)\s*=\s*(["']?)\s*javascript:[^"'\s>]*\2""", re.IGNORECASE)
+_HEAD = re.compile(r"<head\b[^>]*>", re.IGNORECASE)
+
+
+def sanitize_html(page, base_url, max_bytes=MAX_PAGE_BYTES):
+    """
+    Strip scripts, frames, plugins, event handlers and javascript: links from a
+    page and point relative links at the original site.
+
+    Args:
+        page: Raw HTML text.
+        base_url: URL the page was fetched from.
+        max_bytes: Size cap for the returned snapshot.
+
+    Returns:
+        str: The sanitized snapshot.
+    """
+    page = _BLOCK_TAGS.sub("", page)
+    page = _SINGLE_TAGS.sub("", page)
+    page = _EVENT_ATTRS.sub("", page)
+    page = _JS_URLS.sub(r'\1="#"', page)
+    base = f'<base href="{html.escape(base_url, quote=True)}" target="_blank">'
+    if _HEAD.search(page):
+        page = _HEAD.sub(lambda m: m.group(0) + base, page, count=1)
+    else:
+        page = base + page
+    data = page.encode("utf-8")
+    if len(data) > max_bytes:
+        page = data[:max_bytes].decode("utf-8", errors="ignore")
+    return page
+
+
+def is_public_address(address):
+    """Whether an IP address is publicly routable (not private, loopback, link-local, multicast or reserved)."""
+    ip = ipaddress.ip_address(address)
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """
+    socket.create_connection() that only connects to public addresses.
+
+    The host is resolved once and the connection goes to an address that was
+    checked, so a name that resolves to an internal address (e.g. the cloud
+    metadata service at 169.254.169.254, or a DNS rebinding) is refused.
+
+    Raises:
+        ValueError: If the host resolves to any non-public address.
+    """
+    host, port = address
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    blocked = sorted({info[4][0] for info in infos if not is_public_address(info[4][0])})
+    if blocked:
+        raise ValueError(f"Refusing to fetch from non-public address {', '.join(blocked)} ({host})")
+    error = None
+    for family, socktype, proto, _, sockaddr in infos:
+        sock = socket.socket(family, socktype, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f"Could not resolve {host}")
+
+
+def _public_connection(connection_class):
+    def connect(host, **kwargs):
+        conn = connection_class(host, **kwargs)
+        conn._create_connection = connect_public
+        return conn
+    return connect
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_public_connection(http.client.HTTPConnection), req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_public_connection(http.client.HTTPSConnection), req, context=self._context)
+
+
+# Every connection, including redirects, goes through connect_public; proxies are not used, since the check would
+# then only see the proxy's address
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler)
+
+
+def fetch_page(url, timeout=FETCH_TIMEOUT, max_bytes=MAX_PAGE_BYTES):
+    """
+    Download at most max_bytes of a page and decode it with the charset the
+    server sent. Only http(s) URLs on public addresses are fetched, also
+    after redirects.
+
+    Raises:
+        ValueError: If the URL is not http(s), resolves to a non-public
+            address, or is not a page.
+    """
+    scheme = urllib.parse.urlsplit(url).scheme.lower()
+    if scheme not in ("http", "https"):
+        raise ValueError(f"Unsupported URL scheme '{scheme}'")
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with _opener.open(request, timeout=timeout) as response:
+        content_type = response.headers.get_content_type()
+        if content_type not in ("text/html", "application/xhtml+xml", "text/plain"):
+            raise ValueError(f"Unsupported content type '{content_type}'")
+        charset = response.headers.get_content_charset() or "utf-8"
+        data = response.read(max_bytes + 1)
+    return data[:max_bytes].decode(charset, errors="replace")
+
+
+class PreviewCache:
+    """
+    Bounded on-disk LRU cache of sanitized page snapshots, one file per URL.
+
+    Recency is tracked in memory and seeded from file modification times, so
+    the cache survives restarts. Entries beyond max_bytes are evicted oldest
+    first.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".html"):
+                st = os.stat(os.path.join(cache_dir, name))
+                files.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".html")
+
+    def __contains__(self, url):
+        with self._lock:
+            return self.key(url) in self._entries
+
+    def get(self, url):
+        """Return the cached snapshot for url, or None on a miss."""
+        key = self.key(url)
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                page = f.read()
+        except OSError:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        metrics.add_io("preview_cache.get", read=len(page.encode("utf-8")))
+        return page
+
+    def put(self, url, page):
+        """Store a snapshot, replacing any older one, and evict down to max_bytes."""
+        key = self.key(url)
+        data = page.encode("utf-8")
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        metrics.add_io("preview_cache.put", written=len(data))
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self._size, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class Prefetcher:
+    """
+    Fetches upcoming article pages on a small thread pool and stores sanitized
+    snapshots in a PreviewCache. URLs already cached or in flight are skipped.
+    """
+
+    def __init__(self, cache, workers=4, depth=PREFETCH_DEPTH, fetch=fetch_page):
+        self.cache = cache
+        self.depth = depth
+        self._fetch = fetch
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self.fetched = 0
+        self.failed = 0
+
+    def schedule(self, urls):
+        """Queue background fetches for the given URLs; returns the number queued."""
+        queued = 0
+        for url in urls:
+            if not isinstance(url, str) or not url.startswith(("http://", "https://")) or url in self.cache:
+                continue
+            with self._lock:
+                if url in self._in_flight:
+                    continue
+                self._in_flight.add(url)
+            self._executor.submit(self._load, url)
+            queued += 1
+        return queued
+
+    def schedule_rows(self, news_data, rows, start):
+        """Prefetch the next `depth` URLs of an annotator's assigned rows, starting at position start."""
+        upcoming = rows[start:start + self.depth]
+        return self.schedule(news_data[int(row_idx)]['URL'] for row_idx in upcoming
+                             if 0 <= row_idx < len(news_data))
+
+    def _load(self, url):
+        try:
+            self.cache.put(url, sanitize_html(self._fetch(url), url))
+        except Exception:
+            with self._lock:
+                self.failed += 1
+        else:
+            with self._lock:
+                self.fetched += 1
+        finally:
+            with self._lock:
+                self._in_flight.discard(url)
+
+    def wait(self):
+        """Block until all queued fetches are done (mainly for tests and benchmarks)."""
+        while True:
+            with self._lock:
+                if not self._in_flight:
+                    return
+            time.sleep(0.01)
+
+    def stats(self):
+        with self._lock:
+            in_flight, fetched, failed = len(self._in_flight), self.fetched, self.failed
+        return dict(self.cache.stats(), in_flight=in_flight, fetched=fetched, failed=failed)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def preview_html(url, cache=None, height="500px"):
+    """
+    Build the preview for an article: the cached snapshot via srcdoc in a
+    sandboxed iframe when available, otherwise the live page.
+    """
+    page = cache.get(url) if cache is not None else None
+    if page is None:
+        return f'<iframe src="{url}" width="100%" height="{height}"></iframe>'
+    return (f'<iframe srcdoc="{html.escape(page, quote=True)}" sandbox="allow-popups allow-popups-to-escape-sandbox" '
+            f'width="100%" height="{height}"></iframe>')
@@ -0,0 +1,429 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import auth
+import export
+import item_store
+import metrics
+import tag_log
+
+DEFAULT_ADMIN_STATE = {"logged_in": False, "excel_file": None, "account_ids_file": None, "num_sets": 1, "num_users_per_set": 1}
+
+
+class Storage:
+    """
+    Persistence layer for the tagging apps: news items, tags, user progress,
+    credentials and admin state. Handlers keep serving reads from the in-memory
+    dataset returned by load_state(); every mutation goes through a backend.
+    Hold `lock` while recording a tag and applying it in memory so that
+    compaction/export always sees both in agreement (the apps do this on
+    their tag_writer.TagWriter thread).
+    """
+
+    lock = None
+
+    def load_state(self):
+        """Return (news_data, progress) as an item_store.ItemStore and an account_id -> index dict."""
+        raise NotImplementedError
+
+    def save_dataset(self, df, account_ids):
+        """Replace the dataset, discarding previous tags and resetting every account's progress."""
+        raise NotImplementedError
+
+    def record_tag(self, row_idx, account_id, tag, current_idx=None):
+        """Durably store one tag and, if given, the account's new progress."""
+        raise NotImplementedError
+
+    def record_tags(self, events, progress=None):
+        """
+        Durably store a batch of tags as one write.
+
+        Args:
+            events: List of (row_idx, account_id, tag) tuples.
+            progress: Optional dict of account_id -> new progress.
+        """
+        for row_idx, account_id, tag in events:
+            self.record_tag(row_idx, account_id, tag)
+        for account_id, current_idx in (progress or {}).items():
+            self.save_progress(account_id, current_idx)
+
+    def save_progress(self, account_id, current_idx):
+        raise NotImplementedError
+
+    def load_annotations(self):
+        """
+        Return each user's latest label per row as (row_idx, account_id, tag)
+        tuples; later entries supersede earlier ones. Unlike the items, these
+        keep every user's label on rows that several users tag.
+        """
+        raise NotImplementedError
+
+    def save_credentials(self, credentials_df):
+        """Replace the credentials with the salted hashes of auth.hash_credentials(); passwords are never stored."""
+        raise NotImplementedError
+
+    def read_credentials(self):
+        """Return a dict of account_id -> (salt, password hash) as bytes."""
+        raise NotImplementedError
+
+    def credentials_version(self):
+        """Return a value that changes whenever the credentials change, or None if there are none."""
+        raise NotImplementedError
+
+    def load_admin_state(self):
+        raise NotImplementedError
+
+    def save_admin_state(self, state):
+        raise NotImplementedError
+
+    def reset_admin_state(self):
+        raise NotImplementedError
+
+    def compact(self, news_data, progress=None, annotations=None):
+        """
+        Bring the CSV exports (tagged results and progress) up to date.
+
+        Args:
+            news_data: The in-memory items.
+            progress: Optional dict of account_id -> progress.
+            annotations: Optional zero-argument callable returning the current
+                per-user labels, for backends that only keep them in memory.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FileStorage(Storage):
+    """The original on-disk layout: CSV/JSON files plus the append-only tag log."""
+
+    def __init__(self, output_file="tagged_results.csv", progress_file="user_progress.csv",
+                 credentials_file="user_credentials.csv", tag_log_file="tag_events.log",
+                 admin_state_file="admin_state.json", annotations_file="tag_annotations.csv"):
+        self.output_file = output_file
+        self.progress_file = progress_file
+        self.credentials_file = credentials_file
+        self.tag_log_file = tag_log_file
+        self.admin_state_file = admin_state_file
+        self.annotations_file = annotations_file
+        self.lock = tag_log.log_lock
+
+    @metrics.timed("storage.load_state")
+    def load_state(self):
+        return tag_log.load_tagged_state(self.output_file, self.tag_log_file, self.progress_file)
+
+    @metrics.timed("storage.save_dataset")
+    def save_dataset(self, df, account_ids):
+        tag_log.reset_tag_log(self.tag_log_file)
+        if self.annotations_file and os.path.exists(self.annotations_file):
+            os.remove(self.annotations_file)
+        df.to_csv(self.output_file, index=False)
+        if self.progress_file:
+            progress_df = pd.DataFrame({'account_id': account_ids, 'current_idx': [0] * len(account_ids)})
+            progress_df.to_csv(self.progress_file, index=False)
+        metrics.add_io("storage.save_dataset", rows=len(df), written=os.path.getsize(self.output_file) + (
+            os.path.getsize(self.progress_file) if self.progress_file else 0))
+
+    def record_tag(self, row_idx, account_id, tag, current_idx=None):
+        tag_log.append_tag_event(self.tag_log_file, row_idx, account_id, tag, current_idx)
+
+    @metrics.timed("storage.record_tags")
+    def record_tags(self, events, progress=None):
+        tag_log.append_tag_events(self.tag_log_file, events, progress)
+
+    def save_progress(self, account_id, current_idx):
+        # Logged like a tag, so it survives a restart before the next compaction
+        tag_log.append_tag_events(self.tag_log_file, [], {account_id: current_idx})
+
+    def load_annotations(self):
+        return tag_log.load_annotations(self.annotations_file, self.tag_log_file)
+
+    def save_credentials(self, credentials_df):
+        credentials_df[auth.CREDENTIAL_COLUMNS].to_csv(self.credentials_file, index=False)
+
+    @metrics.timed("storage.read_credentials")
+    def read_credentials(self):
+        credentials = pd.read_csv(self.credentials_file, dtype=str, keep_default_na=False)
+        if 'password' in credentials.columns:
+            # Files written before passwords were hashed: replace the plaintext once
+            credentials = auth.hash_credentials(credentials['account_id'], credentials['password'])
+            self.save_credentials(credentials)
+        return _credential_index(zip(credentials['account_id'], credentials['salt'], credentials['password_hash']))
+
+    def credentials_version(self):
+        try:
+            stat = os.stat(self.credentials_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load_admin_state(self):
+        if os.path.exists(self.admin_state_file):
+            with open(self.admin_state_file, "r") as f:
+                return json.load(f)
+        return dict(DEFAULT_ADMIN_STATE)
+
+    def save_admin_state(self, state):
+        with open(self.admin_state_file, "w") as f:
+            json.dump(state, f)
+
+    def reset_admin_state(self):
+        if os.path.exists(self.admin_state_file):
+            os.remove(self.admin_state_file)
+
+    @metrics.timed("storage.compact")
+    def compact(self, news_data, progress=None, annotations=None):
+        return tag_log.compact_tag_log(self.tag_log_file, self.output_file, news_data, progress, self.progress_file,
+                                       annotations, self.annotations_file)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    row_idx INTEGER PRIMARY KEY,
+    url TEXT,
+    company_name TEXT,
+    headline TEXT,
+    tag TEXT,
+    tagged_by TEXT,
+    tagged_at REAL,
+    duplicate_of INTEGER
+);
+CREATE TABLE IF NOT EXISTS annotations (
+    row_idx INTEGER NOT NULL,
+    account_id TEXT NOT NULL,
+    tag TEXT,
+    tagged_at REAL,
+    PRIMARY KEY (row_idx, account_id)
+);
+CREATE TABLE IF NOT EXISTS progress (
+    account_id TEXT PRIMARY KEY,
+    current_idx INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS credentials (
+    account_id TEXT PRIMARY KEY,
+    salt TEXT NOT NULL,
+    password_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+UPSERT_ANNOTATION = ("INSERT INTO annotations (row_idx, account_id, tag, tagged_at) VALUES (?, ?, ?, ?) "
+                     "ON CONFLICT(row_idx, account_id) DO UPDATE SET tag = excluded.tag, tagged_at = excluded.tagged_at")
+
+
+def _none_if_na(value):
+    return None if pd.isna(value) else value
+
+
+def _credential_index(rows):
+    return {account_id: (bytes.fromhex(salt), bytes.fromhex(password_hash)) for account_id, salt, password_hash in rows}
+
+
+class SqliteStorage(Storage):
+    """
+    Single SQLite database in WAL mode. Every tag and progress update is a
+    small transaction, readers never block the writer, and the CSV files are
+    only produced as exports.
+    """
+
+    def __init__(self, db_path="tagging.db", output_file="tagged_results.csv", progress_file="user_progress.csv"):
+        self.db_path = db_path
+        self.output_file = output_file
+        self.progress_file = progress_file
+        self.lock = threading.RLock()
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SQLITE_SCHEMA)
+        # Databases created before near-duplicate detection or stored headlines lack the columns
+        item_columns = [row[1] for row in conn.execute("PRAGMA table_info(items)")]
+        for column, sql_type in (("duplicate_of", "INTEGER"), ("headline", "TEXT")):
+            if column not in item_columns:
+                conn.execute(f"ALTER TABLE items ADD COLUMN {column} {sql_type}")
+        # Databases created before passwords were hashed keep them in plaintext; hash them once
+        if "password" in [row[1] for row in conn.execute("PRAGMA table_info(credentials)")]:
+            self._hash_stored_passwords(conn)
+
+    def _hash_stored_passwords(self, conn):
+        rows = conn.execute("SELECT account_id, password FROM credentials").fetchall()
+        with conn:
+            conn.execute("DROP TABLE credentials")
+        conn.executescript(SQLITE_SCHEMA)
+        if rows:
+            self.save_credentials(auth.hash_credentials([row[0] for row in rows], [row[1] for row in rows]))
+
+    def _connect(self):
+        # sqlite3 connections must not be shared across threads; keep one per worker
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get_meta(self, key):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def _items_query(self, conn):
+        columns = ["url AS 'URL'", "company_name AS 'Company Name'", "tag AS 'Tag'"]
+        # Headlines are optional in uploads (ingest.OPTIONAL_COLUMNS)
+        if conn.execute("SELECT 1 FROM items WHERE headline IS NOT NULL LIMIT 1").fetchone():
+            columns.append("headline AS 'Headline'")
+        # The duplicate column only exists for datasets uploaded with near-duplicate detection
+        if conn.execute("SELECT 1 FROM items WHERE duplicate_of IS NOT NULL LIMIT 1").fetchone():
+            columns.append(f"duplicate_of AS '{export.DUPLICATE_OF}'")
+        columns += [f"tagged_by AS '{export.TAGGED_BY}'", f"tagged_at AS '{export.TAGGED_AT}'"]
+        return f"SELECT {', '.join(columns)} FROM items ORDER BY row_idx"
+
+    @metrics.timed("storage.load_state")
+    def load_state(self):
+        conn = self._connect()
+        news_data = item_store.ItemStore.from_frame(pd.read_sql_query(self._items_query(conn), conn))
+        progress = dict(conn.execute("SELECT account_id, current_idx FROM progress"))
+        metrics.add_io("storage.load_state", rows=len(news_data))
+        return news_data, progress
+
+    @metrics.timed("storage.save_dataset")
+    def save_dataset(self, df, account_ids):
+        duplicate_of = (df[export.DUPLICATE_OF].map(_none_if_na) if export.DUPLICATE_OF in df.columns
+                        else [None] * len(df))
+        headline = df['Headline'].map(_none_if_na) if 'Headline' in df.columns else [None] * len(df)
+        rows = zip(range(len(df)), df['URL'].map(_none_if_na), df['Company Name'].map(_none_if_na), headline,
+                   df['Tag'].map(_none_if_na), duplicate_of)
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM items")
+            conn.execute("DELETE FROM annotations")
+            conn.executemany("INSERT INTO items (row_idx, url, company_name, headline, tag, duplicate_of) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("DELETE FROM progress")
+            conn.executemany("INSERT INTO progress (account_id, current_idx) VALUES (?, 0)",
+                             ((account_id,) for account_id in account_ids))
+        metrics.add_io("storage.save_dataset", rows=len(df))
+
+    def record_tag(self, row_idx, account_id, tag, current_idx=None):
+        conn = self._connect()
+        with conn:
+            conn.execute("UPDATE items SET tag = ?, tagged_by = ?, tagged_at = ? WHERE row_idx = ?",
+                         (tag, account_id, time.time(), int(row_idx)))
+            conn.execute(UPSERT_ANNOTATION, (int(row_idx), account_id, tag, time.time()))
+            if current_idx is not None:
+                self._upsert_progress(conn, account_id, current_idx)
+
+    @metrics.timed("storage.record_tags")
+    def record_tags(self, events, progress=None):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany("UPDATE items SET tag = ?, tagged_by = ?, tagged_at = ? WHERE row_idx = ?",
+                             [(tag, account_id, now, int(row_idx)) for row_idx, account_id, tag in events])
+            conn.executemany(UPSERT_ANNOTATION, [(int(row_idx), account_id, tag, now)
+                                                 for row_idx, account_id, tag in events])
+            for account_id, current_idx in (progress or {}).items():
+                self._upsert_progress(conn, account_id, current_idx)
+
+    def _upsert_progress(self, conn, account_id, current_idx):
+        conn.execute("INSERT INTO progress (account_id, current_idx) VALUES (?, ?) "
+                     "ON CONFLICT(account_id) DO UPDATE SET current_idx = excluded.current_idx",
+                     (account_id, int(current_idx)))
+
+    def save_progress(self, account_id, current_idx):
+        conn = self._connect()
+        with conn:
+            self._upsert_progress(conn, account_id, current_idx)
+
+    def load_annotations(self):
+        return self._connect().execute("SELECT row_idx, account_id, tag FROM annotations").fetchall()
+
+    def save_credentials(self, credentials_df):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM credentials")
+            conn.executemany("INSERT INTO credentials (account_id, salt, password_hash) VALUES (?, ?, ?)",
+                             credentials_df[auth.CREDENTIAL_COLUMNS].itertuples(index=False, name=None))
+            # A random version, so an index cached for another database can never look current
+            self._set_meta(conn, "credentials_version", secrets.token_hex(8))
+
+    @metrics.timed("storage.read_credentials")
+    def read_credentials(self):
+        return _credential_index(self._connect().execute("SELECT account_id, salt, password_hash FROM credentials"))
+
+    def credentials_version(self):
+        return self._get_meta("credentials_version")
+
+    def load_admin_state(self):
+        value = self._get_meta("admin_state")
+        return json.loads(value) if value else dict(DEFAULT_ADMIN_STATE)
+
+    def save_admin_state(self, state):
+        conn = self._connect()
+        with conn:
+            self._set_meta(conn, "admin_state", json.dumps(state))
+
+    def reset_admin_state(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM meta WHERE key = 'admin_state'")
+
+    @metrics.timed("storage.compact")
+    def compact(self, news_data=None, progress=None, annotations=None):
+        # The database is the source of truth; the CSVs are exports
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM items LIMIT 1").fetchone() is None:
+            return False
+        tmp_output = self.output_file + ".tmp"
+        chunks = pd.read_sql_query(self._items_query(conn), conn, chunksize=export.CHUNK_SIZE)
+        # Streamed in chunks so the export never holds the whole table in memory
+        rows = 0
+        with open(tmp_output, "w", newline="", encoding="utf-8") as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, index=False, header=i == 0)
+                rows += len(chunk)
+        written = os.path.getsize(tmp_output)
+        os.replace(tmp_output, self.output_file)
+        if self.progress_file:
+            progress_df = pd.read_sql_query("SELECT account_id, current_idx FROM progress", conn)
+            progress_df.to_csv(self.progress_file + ".tmp", index=False)
+            written += os.path.getsize(self.progress_file + ".tmp")
+            os.replace(self.progress_file + ".tmp", self.progress_file)
+        metrics.add_io("storage.compact", written=written, rows=rows)
+        return True
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def open_storage(backend, db_path="tagging.db", **files):
+    """
+    Create the storage backend selected on the command line.
+
+    Args:
+        backend: "csv" for FileStorage or "sqlite" for SqliteStorage.
+        db_path: Database file used by the SQLite backend.
+        **files: File paths forwarded to the backend constructor.
+    """
+    if backend == "sqlite":
+        return SqliteStorage(db_path, files.get("output_file", "tagged_results.csv"),
+                             files.get("progress_file", "user_progress.csv"))
+    if backend == "csv":
+        return FileStorage(**files)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -1,75 +1,200 @@
 import argparse
 import gradio as gr
 import pandas as pd
-import os
 import secrets
+import time
+import auth
+import export
+import ingest
+import item_store
+import jobs
+import metrics
+import prefetch
+import storage
+import summary_counters
+import tag_log
+import tag_writer
 
 # Global variables
 output_file = "tagged_results.csv"
 admin_password = "x"  # Change this to a secure password
 credentials_file = "user_credentials.csv"
+tag_log_file = "tag_events.log"  # Append-only log of tag submissions, compacted into output_file
 
 # Load dataset
 global news_data
-news_data = []
+news_data = item_store.ItemStore()
 
-# Admin: Upload Excel and Account IDs
+# Rows shown per page in batch tagging mode
+page_size = 10
+BATCH_COLUMNS = ["Row", "Company Name", "Headline", "Tag"]
 
+# Background fetcher for upcoming article previews (off unless --prefetch-depth is given)
+prefetcher = None
+
+# Persistence backend (CSV files + tag log by default, SQLite with --storage sqlite)
+store = storage.FileStorage(output_file, None, credentials_file, tag_log_file)
+
+# Tag counts for the Summary tab, updated as tags are submitted
+counters = summary_counters.SummaryCounters()
+
+# Admin: Upload Excel and Account IDs (checked here, processed as a background job)
+
+@metrics.timed()
 def upload_excel(file, account_ids_file, password):
-    global news_data
     if password != admin_password:
-        return "**Error:** Unauthorized - Incorrect password.", pd.DataFrame()
+        return "**Error:** Unauthorized - Incorrect password.", None, gr.update(active=False)
     if file is None or account_ids_file is None:
-        return "**Error:** Please upload both Excel and Account IDs files.", pd.DataFrame()
-    df = pd.read_excel(file.name)
-    if not {'URL', 'Company Name', 'Tag'}.issubset(df.columns):
-        return "**Error:** Excel file must contain 'URL', 'Company Name', and 'Tag'.", pd.DataFrame()
-    df.to_csv("tagged_results.csv", index=False)
-    news_data = df.to_dict(orient='records')
-
-    account_ids = open(account_ids_file.name).read().splitlines()
+        return "**Error:** Please upload both Excel and Account IDs files.", None, gr.update(active=False)
+    job_id = jobs.start_job(process_upload, file.name, account_ids_file.name, name="upload")
+    return "**Upload started...**", job_id, gr.update(active=True)
+
+@metrics.timed()
+def process_upload(report, data_path, account_ids_path):
+    global news_data
+    df = ingest.read_items(data_path, lambda fraction, message: report(0.8 * fraction, message))
+    account_ids = open(account_ids_path).read().splitlines()
+    report(0.8, "Saving dataset and credentials")
+    # Swap in the new dataset while no tag is being written
+    with store.lock:
+        store.save_dataset(df, account_ids)
+        news_data = ingest.build_items(df, df.columns)
+        counters.rebuild(news_data)
+
     credentials = pd.DataFrame({
         'account_id': account_ids,
         'password': [secrets.token_urlsafe(8) for _ in account_ids]
     })
-    credentials.to_csv(credentials_file, index=False)
+    store.save_credentials(auth.hash_credentials(credentials['account_id'], credentials['password']))
+    auth.revoke_all_sessions()
+    return credentials
 
-    return "**Files uploaded and credentials created successfully!**", credentials
+# Poll the upload job; the timer is switched off once it has finished
+def check_upload(job_id):
+    job = jobs.job_status(job_id)
+    if job is None:
+        return gr.update(), gr.update(), gr.update(active=False)
+    if job["state"] == "running":
+        return f"**Processing upload:** {job['message']} ({job['progress']:.0%})", gr.update(), gr.update()
+    if job["state"] == "error":
+        return f"**Error:** {job['error']}", pd.DataFrame(), gr.update(active=False)
+    return "**Files uploaded and credentials created successfully!**", job["result"], gr.update(active=False)
 
-# User authentication
+# User authentication (in-memory credential index, reloaded when the file changes)
 
+@metrics.timed()
 def authenticate(account_id, password):
-    if not os.path.exists(credentials_file):
-        return False
-    credentials = pd.read_csv(credentials_file)
-    user = credentials[(credentials['account_id'] == account_id) & (credentials['password'] == password)]
-    return not user.empty
+    success, _ = auth.authenticate(store, account_id, password)
+    return success
+
+# Apply a stored tag to the in-memory state (runs on the writer thread)
+def apply_update(account_id, row_idx, tag, current_idx):
+    if row_idx is not None and 0 <= row_idx < len(news_data):
+        counters.record(row_idx, news_data[row_idx]['Tag'], tag)
+        news_data[row_idx]['Tag'] = tag
+        news_data[row_idx][export.TAGGED_BY] = account_id
+        news_data[row_idx][export.TAGGED_AT] = time.time()
 
-def tag_news(account_id, password, index, tag):
+# All tag writes go through one writer thread; handlers only wait for their update
+writer = tag_writer.TagWriter(lambda: store, apply_update)
+
+# Async handlers: writes are awaited on the event loop instead of holding a worker thread
+@metrics.timed()
+async def tag_news(session_token, index, tag):
     global news_data
-    if not authenticate(account_id, password):
+    account_id = auth.check_session(session_token)
+    if account_id is None:
         return "**Authentication failed.**", "", "", -1
     if index == -1 or not news_data:
         return "**All records tagged.**", "", "", -1
     if 0 <= index < len(news_data):
-        news_data[index]['Tag'] = tag
-        pd.DataFrame(news_data).to_csv(output_file, index=False)
+        await writer.write_async(account_id, index, tag)
     if index + 1 < len(news_data):
+        if prefetcher:
+            prefetcher.schedule_rows(news_data, range(len(news_data)), index + 2)
         next_url = news_data[index + 1]['URL']
-        embed_code = f'<iframe src="{next_url}" width="100%" height="500px"></iframe>'
+        embed_code = render_preview(next_url)
         return next_url, news_data[index + 1]['Company Name'], embed_code, index + 1
     else:
         return "**All records tagged.**", "", "", -1
 
+# Batch mode: the page of rows starting at index as an editable table
+@metrics.timed()
+def batch_page(index):
+    if index is None or index < 0 or not news_data:
+        return pd.DataFrame(columns=BATCH_COLUMNS)
+    page = list(range(int(index), min(int(index) + page_size, len(news_data))))
+    return pd.DataFrame({
+        "Row": page,
+        "Company Name": [news_data[row_idx]['Company Name'] for row_idx in page],
+        "Headline": [news_data[row_idx].get('Headline') or news_data[row_idx]['URL'] for row_idx in page],
+        "Tag": [""] * len(page)
+    }, columns=BATCH_COLUMNS)
+
+# Batch mode: store every tag on the page in one write and move on past the last tagged row
+@metrics.timed()
+async def submit_page(session_token, index, page_df):
+    account_id = auth.check_session(session_token)
+    if account_id is None:
+        return "**Authentication failed.**", gr.update(), gr.update(), gr.update(), gr.update(), index
+    updates = []
+    for row_idx, tag in zip(page_df["Row"], page_df["Tag"]):
+        tag = str(tag).strip().capitalize()
+        if tag in ("Yes", "No") and 0 <= int(row_idx) < len(news_data):
+            updates.append((account_id, int(row_idx), tag, None))
+    if not updates:
+        return "**Enter Yes or No in the Tag column.**", gr.update(), gr.update(), gr.update(), gr.update(), index
+    await writer.write_many_async(updates)
+    index = max(row_idx for _, row_idx, _, _ in updates) + 1
+    status = f"**Saved {len(updates)} tag(s).**"
+    if index < len(news_data):
+        url = news_data[index]['URL']
+        return status, batch_page(index), url, news_data[index]['Company Name'], render_preview(url), index
+    return status, batch_page(-1), "**All records tagged.**", "", "", -1
+
+# Article preview, served from the local snapshot cache once it has been prefetched
+@metrics.timed()
+def render_preview(url):
+    return prefetch.preview_html(url, prefetcher.cache if prefetcher else None)
+
+# Bring output_file up to date with the storage backend
+def compact_results():
+    return store.compact(news_data)
+
+@metrics.timed()
 def show_summary(password):
     if password != admin_password:
         return gr.update(visible=False)
-    if not os.path.exists("tagged_results.csv"):
+    if not news_data:
         return gr.update(value=pd.DataFrame({"Error": ["No tagging data found."]}), visible=True)
-    df = pd.read_csv("tagged_results.csv")
-    yes_count = df[df['Tag'] == 'Yes'].shape[0]
-    no_count = df[df['Tag'] == 'No'].shape[0]
-    return gr.update(value=pd.DataFrame({"Tag": ["Yes", "No"], "Count": [yes_count, no_count]}), visible=True)
+    return gr.update(value=pd.DataFrame({"Tag": ["Yes", "No"], "Count": [counters.tag_count('Yes'), counters.tag_count('No')]}), visible=True)
+
+# Admin export: stream the filtered results to a file as a background job, then offer it for download
+@metrics.timed()
+def start_export(password, fmt, user_text, tags, start_text, end_text):
+    if password != admin_password:
+        return "**Error:** Unauthorized - Incorrect password.", None, gr.update(active=False)
+    if not news_data:
+        return "**Error:** No tagging data found.", None, gr.update(active=False)
+    try:
+        start, end = export.parse_time(start_text), export.parse_time(end_text)
+    except ValueError as e:
+        return f"**Error:** {e}", None, gr.update(active=False)
+    rows = export.select_rows(len(news_data))
+    job_id = jobs.start_job(export.export_results, news_data, fmt, rows, export.parse_list(user_text), tags,
+                            start, end, name="export")
+    return "**Export started...**", job_id, gr.update(active=True)
+
+def check_export(job_id):
+    job = jobs.job_status(job_id)
+    if job is None:
+        return gr.update(), gr.update(), gr.update(active=False)
+    if job["state"] == "running":
+        return f"**Exporting:** {job['message']} ({job['progress']:.0%})", gr.update(), gr.update()
+    if job["state"] == "error":
+        return f"**Error:** {job['error']}", gr.update(visible=False), gr.update(active=False)
+    path, written = job["result"]
+    return f"**Exported {written:,} rows.**", gr.update(value=path, visible=True), gr.update(active=False)
 
 # Main app
 
@@ -77,23 +202,62 @@ def main():
     parser = argparse.ArgumentParser(description="Gradio News Tagging App")
     parser.add_argument("--port", type=int, default=7860)
     parser.add_argument("--share", action="store_true")
+    parser.add_argument("--compact-interval", type=int, default=30, help="Seconds between tag log compactions / CSV exports")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv", help="Storage backend for tags and credentials")
+    parser.add_argument("--db-path", default="tagging.db", help="Database file for the sqlite backend")
+    parser.add_argument("--page-size", type=int, default=10, help="Rows per page in batch tagging mode")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests Gradio handles in parallel")
+    parser.add_argument("--prefetch-depth", type=int, default=0,
+                        help="Upcoming articles to prefetch per annotator and cache as previews, e.g. "
+                             f"{prefetch.PREFETCH_DEPTH} (0, the default, fetches nothing server-side)")
+    parser.add_argument("--preview-cache-dir", default=prefetch.CACHE_DIR, help="Directory for cached article previews")
+    parser.add_argument("--preview-cache-mb", type=int, default=prefetch.MAX_CACHE_BYTES // (1024 * 1024),
+                        help="Size cap of the preview cache in MB")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics on this port at /metrics (0 disables)")
+    parser.add_argument("--metrics-json", default=None, help="Write all metrics to this JSON file at shutdown")
     args = parser.parse_args()
 
+    # Restore tags from the storage backend
+    global news_data, store, prefetcher, page_size
+    page_size = args.page_size
+    if args.prefetch_depth > 0:
+        cache = prefetch.PreviewCache(args.preview_cache_dir, args.preview_cache_mb * 1024 * 1024)
+        prefetcher = prefetch.Prefetcher(cache, depth=args.prefetch_depth)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    if args.metrics_json:
+        metrics.dump_json_at_exit(args.metrics_json)
+    store = storage.open_storage(args.storage, args.db_path, output_file=output_file, progress_file=None,
+                                 credentials_file=credentials_file, tag_log_file=tag_log_file)
+    news_data, _ = store.load_state()
+    counters.rebuild(news_data)
+    tag_log.start_compactor(compact_results, args.compact_interval)
+
     with gr.Blocks(theme=gr.themes.Ocean()) as app:
         gr.Markdown("# News Tagging Application")
 
         with gr.Tab("Upload File"):
             admin_pwd = gr.Textbox(label="Admin Password", type="password")
-            excel_file = gr.File(label="Excel File (.xlsx)")
+            excel_file = gr.File(label="News File (.xlsx, .csv, .parquet)")
             account_ids_file = gr.File(label="Upload Account IDs (.txt)")
             upload_btn = gr.Button("Upload", variant="primary")
             upload_status = gr.Markdown()
             credentials_table = gr.DataFrame()
 
+            upload_job = gr.State(None)
+            upload_timer = gr.Timer(1.0, active=False)
+
             upload_btn.click(
                 upload_excel, 
                 [excel_file, account_ids_file, admin_pwd],
-                [upload_status, credentials_table]
+                [upload_status, upload_job, upload_timer]
+            )
+
+            upload_timer.tick(
+                check_upload,
+                [upload_job],
+                [upload_status, credentials_table, upload_timer]
             )
 
         with gr.Tab("Tag News"):
@@ -110,24 +274,33 @@ def main():
             idx_input = gr.Number(label="Index", value=0, interactive=False, visible=False)
             tag_input = gr.Radio(["Yes", "No"], label="Related?", visible=False)
             tag_btn = gr.Button("Submit", interactive=False, visible=False, variant="primary")
+            session_token = gr.State()
+            with gr.Accordion("Batch Tagging", open=False, visible=False) as batch_panel:
+                gr.Markdown("Enter Yes or No in the Tag column and submit the whole page at once.")
+                batch_table = gr.Dataframe(headers=BATCH_COLUMNS, interactive=True)
+                batch_status = gr.Markdown()
+                batch_btn = gr.Button("Submit Page", variant="primary")
 
-            def user_login(account_id, password):
+            @metrics.timed()
+            async def user_login(account_id, password):
                 global news_data
-                if authenticate(account_id, password):
+                if await jobs.run_blocking(authenticate, account_id, password):
                     if news_data:
+                        if prefetcher:
+                            prefetcher.schedule_rows(news_data, range(len(news_data)), 1)
                         news_url = news_data[0]['URL']
                         company_name = news_data[0]['Company Name']
-                        embed_code = f'<iframe src="{news_url}" width="100%" height="500px"></iframe>'
-                        return ("**Authenticated ✅**", gr.update(visible=False), gr.update(visible=False), gr.update(value=news_url, visible=True), gr.update(value=company_name, visible=True), gr.update(value=embed_code, visible=True), gr.update(value=0, visible=True), gr.update(visible=True), gr.update(interactive=False, visible=True))
+                        embed_code = render_preview(news_url)
+                        return ("**Authenticated ✅**", gr.update(visible=False), gr.update(visible=False), gr.update(value=news_url, visible=True), gr.update(value=company_name, visible=True), gr.update(value=embed_code, visible=True), gr.update(value=0, visible=True), gr.update(visible=True), gr.update(interactive=False, visible=True), auth.issue_session(account_id))
                     else:
-                        return ("**No news data found.**", gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
+                        return ("**No news data found.**", gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), None)
                 else:
-                    return ("**Authentication failed.**", gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
+                    return ("**Authentication failed.**", gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), None)
             
             login_btn.click(
                 user_login, 
                 [user_id, user_pwd], 
-                [user_account_display, user_id, user_pwd, url_display, company_display, preview, idx_input, tag_input, tag_btn]
+                [user_account_display, user_id, user_pwd, url_display, company_display, preview, idx_input, tag_input, tag_btn, session_token]
             ).then(
                 lambda account_id: gr.update(value=f'**Logged in as:** {account_id}', visible=True),
                 inputs=[user_id],
@@ -136,6 +309,10 @@ def main():
                 lambda _: gr.update(visible=False),
                 inputs=[user_id],
                 outputs=[login_btn]
+            ).then(
+                lambda token, idx: (gr.update(visible=token is not None), batch_page(idx)),
+                inputs=[session_token, idx_input],
+                outputs=[batch_panel, batch_table]
             )
 
             tag_input.change(
@@ -146,12 +323,18 @@ def main():
 
             tag_btn.click(
                 tag_news,
-                inputs=[user_id, user_pwd, idx_input, tag_input],
+                inputs=[session_token, idx_input, tag_input],
                 outputs=[url_display, company_display, preview, idx_input]
             ).then(
                 lambda idx: gr.update(interactive=False) if idx == -1 else gr.update(interactive=True),
                 inputs=[idx_input],
                 outputs=[tag_btn]
+            ).then(batch_page, inputs=[idx_input], outputs=[batch_table])
+
+            batch_btn.click(
+                submit_page,
+                inputs=[session_token, idx_input, batch_table],
+                outputs=[batch_status, batch_table, url_display, company_display, preview, idx_input]
             )
 
         with gr.Tab("Summary"):
@@ -161,6 +344,29 @@ def main():
 
             summary_btn.click(show_summary, [summary_pwd], summary_output)
 
+            gr.Markdown("### Export Results")
+            with gr.Row():
+                export_format = gr.Dropdown(list(export.EXPORT_FORMATS), value="csv", label="Format")
+                export_users = gr.Textbox(label="Tagged By (comma-separated account IDs, blank for all)")
+            with gr.Row():
+                export_tags = gr.CheckboxGroup(["Yes", "No", export.UNTAGGED], label="Tags (none selected for all)")
+                export_start = gr.Textbox(label="Tagged From (e.g. 2025-01-31 09:00, UTC)")
+                export_end = gr.Textbox(label="Tagged Before")
+            export_btn = gr.Button("Export", variant="secondary")
+            export_status = gr.Markdown()
+            export_file = gr.File(label="Download", visible=False)
+            export_job = gr.State()
+            export_timer = gr.Timer(1.0, active=False)
+
+            export_btn.click(
+                start_export,
+                [summary_pwd, export_format, export_users, export_tags, export_start, export_end],
+                [export_status, export_job, export_timer]
+            )
+            export_timer.tick(check_export, [export_job], [export_status, export_file, export_timer])
+
+    # Writes are serialized by the tag writer, so handlers can run in parallel
+    app.queue(default_concurrency_limit=args.concurrency)
     app.launch(share=args.share, server_port=args.port)
 
 if __name__ == "__main__":
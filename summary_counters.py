@@ -0,0 +1,112 @@
+import threading
+
+import numpy as np
+
+import common
+import item_store
+
+DONE_TAGS = ('Yes', 'No')
+
+
+class SummaryCounters:
+    """
+    Tag, per-set and per-user counts maintained as tags arrive, so summary
+    views never have to rescan the dataset.
+
+    A row counts as done for the tag and set counts once it carries one of
+    DONE_TAGS. Several users can share a set, so a user's done rows are the
+    rows of their sets that they tagged themselves, counted from their own
+    labels rather than from the shared Tag column.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rebuild(item_store.ItemStore())
+
+    def rebuild(self, news_data, sets=None, set_to_users=None, user_to_rows=None, annotations=None):
+        """
+        Recompute every counter from scratch with vectorized counts over the
+        item store's tag codes.
+
+        Args:
+            annotations: Optional (row_idx, account_id, tag) labels, later
+                entries superseding earlier ones (Storage.load_annotations()),
+                for the per-user done rows.
+        """
+        sets = sets or []
+        set_to_users = set_to_users or {}
+        row_to_set = {}
+        set_of_row = np.full(len(news_data), -1, dtype=np.int64)
+        for set_idx, rows in enumerate(sets):
+            rows = np.asarray(rows, dtype=np.int64)
+            row_to_set.update(dict.fromkeys(rows.tolist(), set_idx))
+            set_of_row[rows[(rows >= 0) & (rows < len(news_data))]] = set_idx
+        tag_counts = news_data.tag_counts('Tag')
+        done = news_data.isin('Tag', DONE_TAGS) & (set_of_row >= 0)
+        set_done = np.bincount(set_of_row[done], minlength=len(sets)).tolist()
+        user_sets = {}
+        for set_idx, users in set_to_users.items():
+            for user in users:
+                user_sets.setdefault(user, []).append(set_idx)
+        if user_to_rows:
+            for user in user_to_rows:
+                user_sets.setdefault(user, [])
+        labels = {}
+        for row_idx, account_id, tag in annotations or []:
+            labels[(int(row_idx), account_id)] = None if common.is_blank(tag) else tag
+        user_done = {user: set() for user in user_sets}
+        for (row_idx, account_id), tag in labels.items():
+            if tag in DONE_TAGS and row_to_set.get(row_idx) in user_sets.get(account_id, ()):
+                user_done[account_id].add(row_idx)
+        with self._lock:
+            self.row_to_set = row_to_set
+            self.tag_counts = tag_counts
+            self.set_sizes = [len(rows) for rows in sets]
+            self.set_done = set_done
+            self.set_users = {set_idx: list(users) for set_idx, users in set_to_users.items()}
+            self.user_sets = user_sets
+            self.user_done = user_done
+
+    def record(self, row_idx, old_tag, new_tag, account_id=None):
+        """Account for row_idx changing from old_tag to new_tag, tagged by account_id, in O(1)."""
+        old_tag, new_tag = (None if common.is_blank(tag) else tag for tag in (old_tag, new_tag))
+        if account_id is not None:
+            with self._lock:
+                if self.row_to_set.get(row_idx) in self.user_sets.get(account_id, ()):
+                    done = self.user_done.setdefault(account_id, set())
+                    if new_tag in DONE_TAGS:
+                        done.add(row_idx)
+                    else:
+                        done.discard(row_idx)
+        if old_tag == new_tag:
+            return
+        with self._lock:
+            if old_tag is not None:
+                self.tag_counts[old_tag] -= 1
+            if new_tag is not None:
+                self.tag_counts[new_tag] += 1
+            set_idx = self.row_to_set.get(row_idx)
+            if set_idx is not None:
+                self.set_done[set_idx] += (new_tag in DONE_TAGS) - (old_tag in DONE_TAGS)
+
+    def tag_count(self, tag):
+        return self.tag_counts.get(tag, 0)
+
+    def user_totals(self, user):
+        """Return (total rows, rows the user tagged) for a user."""
+        sets = self.user_sets.get(user, [])
+        return sum(self.set_sizes[s] for s in sets), len(self.user_done.get(user, ()))
+
+    def snapshot(self):
+        """Return all counters as plain dicts, e.g. for a polling endpoint."""
+        with self._lock:
+            return {
+                "tags": {tag: count for tag, count in self.tag_counts.items() if count},
+                "sets": [{"set": set_idx, "rows": size, "done": done}
+                         for set_idx, (size, done) in enumerate(zip(self.set_sizes, self.set_done))],
+                "users": {user: dict(zip(("rows", "done"), self.user_totals(user))) for user in self.user_sets},
+            }
+
+    def matches(self, other):
+        """Return True if another instance holds the same counts."""
+        return self.snapshot() == other.snapshot()
@@ -0,0 +1,273 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+import export
+import item_store
+import metrics
+
+# Held while a tag is logged and applied in memory, so compaction always sees
+# the log and the in-memory state agree
+log_lock = threading.RLock()
+
+ANNOTATION_COLUMNS = ['row', 'account_id', 'tag']
+
+# Bumped whenever the log is reset for a new dataset; a compaction that started
+# before the reset must not overwrite the freshly uploaded results
+_generation = 0
+
+
+def _pending_file(log_file):
+    return log_file + ".compacting"
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def append_tag_event(log_file, row_idx, account_id, tag, current_idx=None):
+    """
+    Append a single tag event to the log and fsync it before returning.
+
+    Args:
+        log_file: Path of the append-only event log.
+        row_idx: Index of the tagged row in the dataset.
+        account_id: Annotator that submitted the tag.
+        tag: The submitted tag.
+        current_idx: Optional new progress of the account, logged with the tag.
+
+    Returns:
+        dict: The tag record that was written.
+    """
+    progress = None if current_idx is None else {account_id: current_idx}
+    return append_tag_events(log_file, [(row_idx, account_id, tag)], progress)[0]
+
+
+@metrics.timed("tag_log.append")
+def append_tag_events(log_file, events, progress=None):
+    """
+    Append several tag events and progress updates with a single write and
+    fsync (group commit).
+
+    Args:
+        log_file: Path of the append-only event log.
+        events: Iterable of (row_idx, account_id, tag) tuples.
+        progress: Optional dict of account_id -> new progress, logged as
+            progress records after the events.
+
+    Returns:
+        list: The records that were written.
+    """
+    now = time.time()
+    records = [{"row": int(row_idx), "account_id": account_id, "tag": tag, "ts": now}
+               for row_idx, account_id, tag in events]
+    records += [{"account_id": account_id, "progress": int(current_idx), "ts": now}
+                for account_id, current_idx in (progress or {}).items()]
+    if not records:
+        return records
+    data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+    with log_lock:
+        with open(log_file, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    metrics.add_io("tag_log.append", written=len(data))
+    return records
+
+
+def read_log_records(log_file):
+    """
+    Yield the logged tag events and progress records in the order they were
+    written, including those of an interrupted compaction. A torn trailing
+    line left by a crash is skipped.
+    """
+    for path in (_pending_file(log_file), log_file):
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def read_tag_events(log_file):
+    """Yield the logged tag events (not the progress records) in the order they were written."""
+    return (record for record in read_log_records(log_file) if "row" in record)
+
+
+def replay_tag_log(log_file, news_data, progress=None):
+    """
+    Apply logged tags to news_data and, if given, the logged progress records
+    to progress (the latest record of each account wins).
+
+    Returns:
+        int: Number of records replayed.
+    """
+    count = 0
+    for record in read_log_records(log_file):
+        if "row" in record:
+            row_idx = record["row"]
+            if 0 <= row_idx < len(news_data):
+                news_data.set(row_idx, 'Tag', record["tag"])
+                news_data.set(row_idx, export.TAGGED_BY, record["account_id"])
+                news_data.set(row_idx, export.TAGGED_AT, record.get("ts"))
+        elif progress is not None:
+            progress[record["account_id"]] = record["progress"]
+        count += 1
+    return count
+
+
+@metrics.timed("tag_log.load")
+def load_tagged_state(output_file, log_file, progress_file=None):
+    """
+    Rebuild the in-memory dataset and user progress from the last compacted
+    results plus every event logged since.
+
+    Returns:
+        tuple: (news_data, progress) where news_data is an item_store.ItemStore and
+        progress maps account_id to the index of the next row to tag.
+    """
+    news_data = item_store.ItemStore()
+    progress = {}
+    if os.path.exists(output_file):
+        news_data = item_store.ItemStore.from_frame(pd.read_csv(output_file))
+    if progress_file and os.path.exists(progress_file):
+        progress_df = pd.read_csv(progress_file)
+        progress = dict(zip(progress_df['account_id'], progress_df['current_idx'].astype(int)))
+    # Size the inputs before replaying, so events appended meanwhile are not counted
+    read = sum(_file_size(path) for path in (output_file, progress_file, log_file, _pending_file(log_file)))
+    replayed = replay_tag_log(log_file, news_data, progress)
+    metrics.add_io("tag_log.load", read=read, rows=len(news_data) + replayed)
+    return news_data, progress
+
+
+def load_annotations(annotations_file, log_file):
+    """
+    Each user's latest label per row: the compacted annotations_file plus every
+    event logged since, in order.
+
+    Returns:
+        list: (row_idx, account_id, tag) tuples; later entries supersede earlier ones.
+    """
+    annotations = []
+    if annotations_file and os.path.exists(annotations_file):
+        df = pd.read_csv(annotations_file, dtype={'account_id': str})
+        annotations.extend(zip(df['row'].astype(int).tolist(), df['account_id'].tolist(), df['tag'].tolist()))
+    annotations.extend((event["row"], event["account_id"], event["tag"]) for event in read_tag_events(log_file))
+    return annotations
+
+
+def reset_tag_log(log_file):
+    """Discard all logged events, e.g. after a new dataset has been uploaded."""
+    global _generation
+    with log_lock:
+        _generation += 1
+        for path in (log_file, _pending_file(log_file)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _write_csv_atomic(df, path):
+    tmp_path = path + ".tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+@metrics.timed("tag_log.compact")
+def compact_tag_log(log_file, output_file, news_data, progress=None, progress_file=None,
+                    annotations=None, annotations_file=None):
+    """
+    Fold the logged events into output_file (and progress_file) and drop them
+    from the log. Only the progress snapshot and the log rotation happen under
+    the lock; the items are then streamed to CSV in chunks while new tag
+    submissions keep appending to a fresh log. A tag that lands in the CSV and
+    in the fresh log is simply applied twice on replay.
+
+    The log is also the only record of each user's own label on rows that
+    several users tag; pass annotations (a zero-argument callable returning
+    (row_idx, account_id, tag) tuples) and annotations_file to keep them.
+
+    Returns:
+        bool: True if there was anything to compact.
+    """
+    pending = _pending_file(log_file)
+    with log_lock:
+        if not os.path.exists(log_file) and not os.path.exists(pending):
+            return False
+        generation = _generation
+        progress_df = None
+        if progress is not None and progress_file:
+            progress_df = pd.DataFrame({'account_id': list(progress.keys()),
+                                        'current_idx': list(progress.values())})
+        annotations_df = None
+        if annotations is not None and annotations_file:
+            annotations_df = pd.DataFrame(annotations(), columns=ANNOTATION_COLUMNS)
+        if os.path.exists(log_file):
+            if os.path.exists(pending):
+                # A previous compaction was interrupted; keep its events ahead of ours
+                with open(pending, "a", encoding="utf-8") as dst, open(log_file, "r", encoding="utf-8") as src:
+                    dst.write(src.read())
+                os.remove(log_file)
+            else:
+                os.replace(log_file, pending)
+
+    tmp_output = output_file + ".tmp"
+    export.write_items_csv(tmp_output, news_data)
+    if progress_df is not None:
+        progress_df.to_csv(progress_file + ".tmp", index=False)
+    if annotations_df is not None:
+        annotations_df.to_csv(annotations_file + ".tmp", index=False)
+
+    with log_lock:
+        if generation != _generation:
+            # The dataset was replaced while we were writing
+            for path in (tmp_output, (progress_file or "") + ".tmp", (annotations_file or "") + ".tmp"):
+                if os.path.exists(path):
+                    os.remove(path)
+            return False
+        os.replace(tmp_output, output_file)
+        if progress_df is not None:
+            os.replace(progress_file + ".tmp", progress_file)
+        if annotations_df is not None:
+            os.replace(annotations_file + ".tmp", annotations_file)
+        if os.path.exists(pending):
+            os.remove(pending)
+    written = _file_size(output_file) + (_file_size(progress_file) if progress_df is not None else 0)
+    written += _file_size(annotations_file) if annotations_df is not None else 0
+    metrics.add_io("tag_log.compact", written=written, rows=len(news_data))
+    return True
+
+
+def start_compactor(compact, interval=30):
+    """
+    Run compact() every interval seconds on a daemon thread.
+
+    Args:
+        compact: Zero-argument callable that performs the compaction.
+        interval: Seconds between compactions.
+
+    Returns:
+        threading.Thread: The started thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                compact()
+            except Exception as e:
+                print(f"Error occurred while compacting tag log: {e}")
+
+    thread = threading.Thread(target=run, name="tag-log-compactor", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,147 @@
+import asyncio
+import numbers
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+
+MAX_BATCH = 256
+
+
+class TagWriter:
+    """
+    Single writer for tag and progress mutations.
+
+    Handlers submit updates and wait on the returned future; one background
+    thread drains the queue, stores everything queued so far with a single
+    store.record_tags() call (one fsync / transaction per batch) and then
+    applies it to the in-memory state. Updates are checked before they are
+    stored, and each future gets its own result: a failed apply only fails
+    the submission it belongs to, since the other updates are already
+    stored. The store lock is only held by this
+    thread, compaction and dataset uploads, so handlers never contend for it
+    and readers work lock-free on the in-memory data.
+    """
+
+    def __init__(self, get_store, apply, max_batch=MAX_BATCH):
+        """
+        Args:
+            get_store: Zero-argument callable returning the current Storage
+                (the apps swap their backend in main()).
+            apply: apply(account_id, row_idx, tag, current_idx) called on the
+                writer thread after the batch is durable; row_idx and tag are
+                None for progress-only updates.
+            max_batch: Most updates stored in one write.
+        """
+        self._get_store = get_store
+        self._apply = apply
+        self._max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="tag-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, account_id, row_idx=None, tag=None, current_idx=None):
+        """Queue a tag and/or progress update; returns a Future resolved once it is stored and applied."""
+        return self.submit_many([(account_id, row_idx, tag, current_idx)])
+
+    def submit_many(self, updates):
+        """
+        Queue several (account_id, row_idx, tag, current_idx) updates that are
+        stored in the same write and applied together, in order.
+        """
+        future = Future()
+        self._queue.put((list(updates), future))
+        return future
+
+    def write(self, account_id, row_idx=None, tag=None, current_idx=None):
+        """Submit an update and wait for it."""
+        return self.submit(account_id, row_idx, tag, current_idx).result()
+
+    def write_many(self, updates):
+        """Submit a batch of updates and wait for all of them."""
+        return self.submit_many(updates).result()
+
+    async def write_async(self, account_id, row_idx=None, tag=None, current_idx=None):
+        """Like write(), but waits without holding a worker thread."""
+        return await asyncio.wrap_future(self.submit(account_id, row_idx, tag, current_idx))
+
+    async def write_many_async(self, updates):
+        """Like write_many(), but waits without holding a worker thread."""
+        return await asyncio.wrap_future(self.submit_many(updates))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while sum(len(updates) for updates, _ in batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        # An update that cannot be applied is refused before anything is stored, so it fails alone
+        accepted = []
+        for updates, future in batch:
+            try:
+                for update in updates:
+                    _check_update(*update)
+            except ValueError as e:
+                future.set_exception(e)
+            else:
+                accepted.append((updates, future))
+        if not accepted:
+            return
+        updates = [update for queued, _ in accepted for update in queued]
+        events = [(row_idx, account_id, tag) for account_id, row_idx, tag, _ in updates if row_idx is not None]
+        progress = {account_id: current_idx for account_id, _, _, current_idx in updates if current_idx is not None}
+        store = self._get_store()
+        with store.lock:
+            try:
+                store.record_tags(events, progress)
+            except Exception as e:
+                for _, future in accepted:
+                    future.set_exception(e)
+                return
+            # Everything is durable now: apply every update, and fail only the futures whose own update raised
+            for queued, future in accepted:
+                error = None
+                for account_id, row_idx, tag, current_idx in queued:
+                    try:
+                        self._apply(account_id, row_idx, tag, current_idx)
+                    except Exception as e:
+                        error = error or e
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+
+def _check_update(account_id, row_idx, tag, current_idx):
+    """
+    Raise ValueError for an update the writer must not store: a missing
+    account, a negative or non-integer row or progress index, or a tag that
+    is not a string.
+    """
+    if not isinstance(account_id, str) or not account_id:
+        raise ValueError(f"Invalid account id {account_id!r}")
+    for name, value in (("row", row_idx), ("progress index", current_idx)):
+        if value is not None and (isinstance(value, bool) or not isinstance(value, numbers.Integral) or value < 0):
+            raise ValueError(f"Invalid {name} {value!r} for {account_id}")
+    if row_idx is not None and tag is not None and not isinstance(tag, str):
+        raise ValueError(f"Invalid tag {tag!r} for row {row_idx}")
+
+
+class KeyedLocks:
+    """
+    One lock per key (e.g. per account), for read-modify-write sequences on a
+    single user's state. Pass asyncio.Lock as the factory for async handlers.
+    """
+
+    def __init__(self, factory=threading.Lock):
+        self._locks = defaultdict(factory)
+        self._guard = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._guard:
+            return self._locks[key]
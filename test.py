@@ -1,191 +1,401 @@
 import argparse
+import asyncio
 import gradio as gr
+import numpy as np
 import pandas as pd
-import os
 import secrets
-import random
+import time
+import agreement
+import assignment_plan
+import auth
+import dedup
+import export
+import ingest
+import item_store
+import jobs
+import metrics
+import planner
+import prefetch
+import storage
+import summary_counters
+import tag_log
+import tag_writer
 
 # Global variables
 output_file = "tagged_results.csv"
 admin_password = "x"  # Change to a secure password
 credentials_file = "user_credentials.csv"
 progress_file = "user_progress.csv"  # New file to store user progress
+tag_log_file = "tag_events.log"  # Append-only log of tag submissions, compacted into output_file
+ASSIGNMENT_PLAN_DIR = "assignment_plan"  # Binary copy of sets/user_to_rows for restarts
 
 # Load dataset and assignment mappings
-global news_data, user_to_rows, sets, set_to_users
-news_data = []
+global news_data, user_to_rows, sets, set_to_users, user_progress
+news_data = item_store.ItemStore()
 user_to_rows = {}
 sets = []
 set_to_users = {}
+user_progress = {}
 
-# Admin: Upload Excel and Account IDs
-def upload_excel(file, account_ids_file, password, num_sets, num_users_per_set):
-    global news_data, user_to_rows, sets, set_to_users
+# Rows shown per page in batch tagging mode
+page_size = 10
+BATCH_COLUMNS = ["Row", "Company Name", "Headline", "Tag"]
+
+# Shared queue that hands out rows on demand (only with --dynamic-assignment)
+dynamic_assignment = False
+work_queue = None
+
+# Background fetcher for upcoming article previews (off unless --prefetch-depth is given)
+prefetcher = None
+
+# Persistence backend (CSV files + tag log by default, SQLite with --storage sqlite)
+store = storage.FileStorage(output_file, progress_file, credentials_file, tag_log_file)
+
+# Tag/set/user counts for the Summary tab, updated as tags are submitted
+counters = summary_counters.SummaryCounters()
+
+# Per-user labels and agreement statistics for rows tagged by several users
+agreement_tracker = agreement.AgreementTracker()
+
+# Admin: Upload Excel and Account IDs (checked here, processed as a background job)
+@metrics.timed()
+def upload_excel(file, account_ids_file, password, num_sets, num_users_per_set, skip_duplicates=True):
     if password != admin_password:
-        return "**Error:** Unauthorized - Incorrect password.", None, None, gr.update(visible=False), gr.update(visible=False)
+        return "**Error:** Unauthorized - Incorrect password.", None, gr.update(active=False)
     if file is None or account_ids_file is None:
-        return "**Error:** Please upload both Excel and Account IDs files.", None, None, gr.update(visible=False), gr.update(visible=False)
-    df = pd.read_excel(file.name)
-    if not {'URL', 'Company Name', 'Tag'}.issubset(df.columns):
-        return "**Error:** Excel file must contain 'URL', 'Company Name', and 'Tag'.", None, None, gr.update(visible=False), gr.update(visible=False)
-    
-    # Prepare news data
-    news_data = [{'URL': row['URL'], 'Company Name': row['Company Name'], 'Tag': row.get('Tag', '')} for _, row in df.iterrows()]
-    N = len(df)
-    account_ids = open(account_ids_file.name).read().splitlines()
-    M = len(account_ids)
+        return "**Error:** Please upload both Excel and Account IDs files.", None, gr.update(active=False)
     
     # Validate set and user inputs
     num_sets = int(num_sets)
     num_users_per_set = int(num_users_per_set)
     if num_sets <= 0 or num_users_per_set <= 0:
-        return "**Error:** Number of sets and users per set must be positive.", None, None, gr.update(visible=False), gr.update(visible=False)
+        return "**Error:** Number of sets and users per set must be positive.", None, gr.update(active=False)
+    job_id = jobs.start_job(process_upload, file.name, account_ids_file.name, num_sets, num_users_per_set,
+                            skip_duplicates, name="upload")
+    return "**Upload started...**", job_id, gr.update(active=True)
+
+@metrics.timed()
+def process_upload(report, data_path, account_ids_path, num_sets, num_users_per_set, skip_duplicates=True):
+    global news_data, user_to_rows, sets, set_to_users, user_progress, work_queue
+    df = ingest.read_items(data_path, lambda fraction, message: report(0.6 * fraction, message))
+    account_ids = open(account_ids_path).read().splitlines()
+    M = len(account_ids)
     total_assignments_needed = num_sets * num_users_per_set
     if total_assignments_needed > M and M < num_users_per_set:
-        return "**Error:** Not enough users for the requested assignments.", None, None, gr.update(visible=False), gr.update(visible=False)
-    
-    # Divide rows into sets
-    indices = list(range(N))
-    sets = [indices[i::num_sets] for i in range(num_sets)]
-    
-    # Distribute users evenly across sets
-    base_users_per_set = M // num_sets
-    extra_users = M % num_sets
-    set_to_users = {}
-    shuffled_users = account_ids.copy()
-    random.shuffle(shuffled_users)
-    user_idx = 0
-    for set_idx in range(num_sets):
-        num_users = base_users_per_set + (1 if set_idx < extra_users else 0)
-        assigned_users = shuffled_users[user_idx:user_idx + num_users]
-        set_to_users[set_idx] = assigned_users
-        user_idx += num_users
+        raise ValueError("Not enough users for the requested assignments.")
+
+    columns = ingest.item_columns(df.columns)
+    rows = None
+    if skip_duplicates:
+        # Only one article per cluster of near-duplicates is assigned; the others take its tag on export
+        duplicate_of = dedup.find_duplicates(df, report=lambda fraction, message: report(0.6 + 0.2 * fraction, message))
+        df[export.DUPLICATE_OF] = pd.Series(duplicate_of, index=df.index).mask(duplicate_of < 0).astype("Int64")
+        columns.append(export.DUPLICATE_OF)
+        rows = np.flatnonzero(duplicate_of < 0)
+
+    # Only salted hashes are stored; hashing every account takes a while, so it is done before taking the lock
+    passwords = [secrets.token_urlsafe(8) for _ in account_ids]
+    credentials_stored = auth.hash_credentials(account_ids, passwords)
     
-    # Compute user to row mapping
-    user_to_sets = {account_id: [] for account_id in account_ids}
-    for set_idx, users in set_to_users.items():
-        for user in users:
-            user_to_sets[user].append(set_idx)
-    user_to_rows = {}
-    for account_id in account_ids:
-        assigned_sets = user_to_sets[account_id]
-        rows = sum([sets[set_idx] for set_idx in assigned_sets], [])
-        user_to_rows[account_id] = sorted(rows)
+    # Swap in the new dataset while no tag is being written
+    with store.lock:
+        # Prepare news data
+        report(0.8, "Assigning sets")
+        news_data = ingest.build_items(df, columns)
+        N = len(df)
     
-    # Generate credentials
-    passwords = [secrets.token_urlsafe(8) for _ in account_ids]
-    credentials_hidden = pd.DataFrame({
-        'account_id': account_ids,
-        'password': ['[Hidden]' for _ in account_ids]
-    })
-    credentials_full = pd.DataFrame({
-        'account_id': account_ids,
-        'password': passwords
-    })
-    credentials_full.to_csv(credentials_file, index=False)
-    df.to_csv(output_file, index=False)
+        if dynamic_assignment:
+            # Rows are pulled from a shared queue as annotators go, num_users_per_set times each
+            sets, set_to_users = [], {}
+            user_to_rows = {account_id: [] for account_id in account_ids}
+            work_queue = planner.WorkQueue(range(N) if rows is None else rows, num_users_per_set)
+        else:
+            # Divide rows into sets and give each set num_users_per_set distinct users
+            sets, set_to_users, user_to_rows = planner.plan_assignments(N, account_ids, num_sets, num_users_per_set,
+                                                                        rows=rows)
+            work_queue = None
     
-    # Initialize user progress
-    progress_df = pd.DataFrame({'account_id': account_ids, 'current_idx': [0] * len(account_ids)})
-    progress_df.to_csv(progress_file, index=False)
+        # Generate credentials
+        report(0.9, "Saving credentials and dataset")
+        credentials_hidden = pd.DataFrame({
+            'account_id': account_ids,
+            'password': ['[Hidden]' for _ in account_ids]
+        })
+        credentials_full = pd.DataFrame({
+            'account_id': account_ids,
+            'password': passwords
+        })
+        store.save_credentials(credentials_stored)
+        auth.revoke_all_sessions()
     
-    return "**Files uploaded, sets assigned evenly, and credentials created successfully!**", credentials_hidden, credentials_full, gr.update(visible=True), gr.update(visible=True)
+        # Store the dataset and initialize user progress
+        store.save_dataset(df, account_ids)
+        user_progress = {account_id: 0 for account_id in account_ids}
+        # What restore_state() needs to rebuild the assignments after a restart
+        store.save_admin_state(dict(store.load_admin_state(), num_sets=num_sets, num_users_per_set=num_users_per_set,
+                                    dynamic_assignment=dynamic_assignment))
+        if not dynamic_assignment:
+            assignment_plan.save_plan(ASSIGNMENT_PLAN_DIR, N, sets, set_to_users, user_to_rows)
+        counters.rebuild(news_data, sets, set_to_users, user_to_rows)
+        agreement_tracker.rebuild(sets, set_to_users, raters_per_row=num_users_per_set if dynamic_assignment else None)
+    duplicates = 0 if rows is None else N - len(rows)
+    return credentials_hidden, credentials_full, duplicates
+
+# Poll the upload job; the timer is switched off once it has finished
+def check_upload(job_id):
+    job = jobs.job_status(job_id)
+    if job is None:
+        return gr.update(), gr.update(), gr.update(), gr.update(), gr.update(), gr.update(active=False)
+    if job["state"] == "running":
+        return (f"**Processing upload:** {job['message']} ({job['progress']:.0%})", gr.update(), gr.update(), 
+                gr.update(), gr.update(), gr.update())
+    if job["state"] == "error":
+        return f"**Error:** {job['error']}", None, None, gr.update(visible=False), gr.update(visible=False), gr.update(active=False)
+    credentials_hidden, credentials_full, duplicates = job["result"]
+    message = "**Files uploaded, sets assigned evenly, and credentials created successfully!**"
+    if duplicates:
+        message += f" {duplicates:,} near-duplicate articles will take the tag of their first copy."
+    return (message, credentials_hidden, credentials_full, 
+            gr.update(visible=True), gr.update(visible=True), gr.update(active=False))
 
 def toggle_passwords(show_passwords, hidden_df, full_df):
     return full_df if show_passwords else hidden_df
 
-# User authentication
+# User authentication (in-memory credential index, reloaded when the file changes)
+@metrics.timed()
 def authenticate(account_id, password):
-    if not os.path.exists(credentials_file):
-        return False
-    credentials = pd.read_csv(credentials_file)
-    user = credentials[(credentials['account_id'] == account_id) & (credentials['password'] == password)]
-    return not user.empty
+    success, _ = auth.authenticate(store, account_id, password)
+    return success
 
-# Load and save user progress
+# Load and save user progress (served from memory, persisted through the storage backend)
 def load_user_progress(account_id):
-    if not os.path.exists(progress_file):
-        return 0
-    progress_df = pd.read_csv(progress_file)
-    user_progress = progress_df[progress_df['account_id'] == account_id]
-    return user_progress['current_idx'].values[0] if not user_progress.empty else 0
-
-def save_user_progress(account_id, current_idx):
-    if not os.path.exists(progress_file):
-        return
-    progress_df = pd.read_csv(progress_file)
-    progress_df.loc[progress_df['account_id'] == account_id, 'current_idx'] = current_idx
-    progress_df.to_csv(progress_file, index=False)
-
-def user_login(account_id, password):
+    return user_progress.get(account_id, 0)
+
+async def save_user_progress(account_id, current_idx):
+    if account_id in user_progress:
+        await writer.write_async(account_id, current_idx=current_idx)
+
+# Apply a stored tag/progress update to the in-memory state (runs on the writer thread)
+def apply_update(account_id, row_idx, tag, current_idx):
+    if row_idx is not None and 0 <= row_idx < len(news_data):
+        counters.record(row_idx, news_data[row_idx]['Tag'], tag, account_id)
+        agreement_tracker.record(row_idx, account_id, tag)
+        news_data[row_idx]['Tag'] = tag
+        news_data[row_idx][export.TAGGED_BY] = account_id
+        news_data[row_idx][export.TAGGED_AT] = time.time()
+    if current_idx is not None:
+        user_progress[account_id] = current_idx
+
+# All tag and progress writes go through one writer thread; handlers only wait for their update
+writer = tag_writer.TagWriter(lambda: store, apply_update)
+
+# Serializes each account's read-progress-then-tag step without blocking other accounts
+account_locks = tag_writer.KeyedLocks(asyncio.Lock)
+
+# A user's rows; in dynamic mode the next row is claimed from the shared queue when they run out
+def assigned_rows_for(account_id, current_idx):
+    rows = user_to_rows.get(account_id)
+    if work_queue is not None and rows is not None and current_idx >= len(rows):
+        row_idx = work_queue.next_row(account_id)
+        if row_idx is not None:
+            rows.append(row_idx)
+    return rows
+
+# Rows for a full page starting at current_idx; in dynamic mode the missing ones are claimed from the queue
+def assigned_page_rows(account_id, current_idx):
+    rows = assigned_rows_for(account_id, current_idx)
+    while work_queue is not None and rows is not None and len(rows) < current_idx + page_size:
+        claimed = len(rows)
+        assigned_rows_for(account_id, claimed)
+        if len(rows) == claimed:
+            break
+    return rows
+
+# Article preview, served from the local snapshot cache once it has been prefetched
+@metrics.timed()
+def render_preview(url):
+    return prefetch.preview_html(url, prefetcher.cache if prefetcher else None)
+
+# Restore tags, progress, assignments, counters and agreement from the storage backend (at startup)
+def restore_state():
+    global news_data, user_progress, user_to_rows, sets, set_to_users, work_queue
+    news_data, user_progress = store.load_state()
+    annotations = store.load_annotations()
+    state = store.load_admin_state()
+    raters_per_row = None
+    if state.get("dynamic_assignment"):
+        # Claims only lived in memory: claim every stored label again, so tagged rows are not handed out twice
+        raters_per_row = state["num_users_per_set"]
+        rows = np.flatnonzero(np.isnan(news_data.floats(export.DUPLICATE_OF)))
+        sets, set_to_users = [], {}
+        work_queue, user_to_rows = planner.restore_work_queue(rows, raters_per_row, user_progress, annotations)
+        # Untagged claims are gone, so each user resumes right after the rows they tagged
+        user_progress = {account_id: len(rows) for account_id, rows in user_to_rows.items()}
+    else:
+        plan = assignment_plan.load_plan(ASSIGNMENT_PLAN_DIR, len(news_data))
+        if plan is not None:
+            sets, set_to_users, user_to_rows = plan
+        work_queue = None
+    counters.rebuild(news_data, sets, set_to_users, user_to_rows, annotations)
+    agreement_tracker.rebuild(sets, set_to_users, annotations, raters_per_row)
+
+# Bring output_file and progress_file up to date with the storage backend
+def compact_results():
+    return store.compact(news_data, user_progress, agreement_tracker.snapshot)
+
+# Async handlers: hashing and writes are awaited off the event loop instead of holding a worker thread
+@metrics.timed()
+async def user_login(account_id, password):
     global news_data
-    if not authenticate(account_id, password):
+    if not await jobs.run_blocking(authenticate, account_id, password):
         return ("**Authentication failed.**", gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), 
-                gr.update(visible=False), gr.update(visible=False), [], -1, gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
-    assigned_rows = user_to_rows.get(account_id, [])
-    if not assigned_rows:
+                gr.update(visible=False), gr.update(visible=False), [], -1, gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), None)
+    assigned_rows = assigned_rows_for(account_id, load_user_progress(account_id))
+    if assigned_rows is None or len(assigned_rows) == 0:
         return ("**No rows assigned to this user.**", gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), 
-                gr.update(visible=False), gr.update(visible=False), [], -1, gr.update(visible=False), gr.update(visible=False), gr.update(visible=False))
+                gr.update(visible=False), gr.update(visible=False), [], -1, gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), None)
+    session_token = auth.issue_session(account_id)
     current_idx = load_user_progress(account_id)
     if current_idx < len(assigned_rows):
+        if prefetcher:
+            prefetcher.schedule_rows(news_data, assigned_rows, current_idx + 1)
         row_idx = assigned_rows[current_idx]
         news_url = news_data[row_idx]['URL']
         company_name = news_data[row_idx]['Company Name']
-        embed_code = f'<iframe src="{news_url}" width="100%" height="500px"></iframe>'
+        embed_code = render_preview(news_url)
         return ("**Authenticated ✅**", gr.update(visible=False), gr.update(visible=False), gr.update(value=news_url, visible=True), 
                 gr.update(value=company_name, visible=True), gr.update(value=embed_code, visible=True), assigned_rows, current_idx, 
-                gr.update(visible=True), gr.update(interactive=False, visible=True), gr.update(visible=True))
+                gr.update(visible=True), gr.update(interactive=False, visible=True), gr.update(visible=True), session_token)
     else:
         return ("**All records tagged.**", gr.update(visible=False), gr.update(visible=False), gr.update(value="**All records tagged.**", visible=True), 
                 gr.update(visible=False), gr.update(visible=False), assigned_rows, current_idx, 
-                gr.update(visible=False), gr.update(visible=False), gr.update(visible=True))
+                gr.update(visible=False), gr.update(visible=False), gr.update(visible=True), session_token)
 
-def submit_tag(account_id, password, user_assigned_rows, user_current_idx, tag):
+@metrics.timed()
+async def submit_tag(session_token, user_assigned_rows, user_current_idx, tag):
     global news_data
-    if not authenticate(account_id, password):
-        return "**Authentication failed.**", "", "", user_current_idx
-    if not user_assigned_rows or user_current_idx >= len(user_assigned_rows):
-        return "**All records tagged.**", "", "", user_current_idx
-    row_idx = user_assigned_rows[user_current_idx]
-    if 0 <= row_idx < len(news_data):
-        news_data[row_idx]['Tag'] = tag
-        pd.DataFrame(news_data).to_csv(output_file, index=False)
-    user_current_idx += 1
-    save_user_progress(account_id, user_current_idx)
-    if user_current_idx < len(user_assigned_rows):
+    account_id = auth.check_session(session_token)
+    if account_id is None:
+        return "**Authentication failed.**", "", "", user_current_idx, user_assigned_rows
+    async with account_locks[account_id]:
+        # The stored progress, not the session's copy, so a repeated submit never tags the same row twice
+        user_current_idx = user_progress.get(account_id, user_current_idx)
+        if user_assigned_rows is None or user_current_idx >= len(user_assigned_rows):
+            return "**All records tagged.**", "", "", user_current_idx, user_assigned_rows
+        row_idx = int(user_assigned_rows[user_current_idx])
+        user_current_idx += 1
+        if 0 <= row_idx < len(news_data):
+            await writer.write_async(account_id, row_idx, tag, user_current_idx)
+        else:
+            await save_user_progress(account_id, user_current_idx)
+        user_assigned_rows = assigned_rows_for(account_id, user_current_idx)
+    if user_assigned_rows is not None and user_current_idx < len(user_assigned_rows):
+        if prefetcher:
+            prefetcher.schedule_rows(news_data, user_assigned_rows, user_current_idx + 1)
         next_row_idx = user_assigned_rows[user_current_idx]
         next_url = news_data[next_row_idx]['URL']
         next_company = news_data[next_row_idx]['Company Name']
-        next_embed = f'<iframe src="{next_url}" width="100%" height="500px"></iframe>'
-        return next_url, next_company, next_embed, user_current_idx
+        next_embed = render_preview(next_url)
+        return next_url, next_company, next_embed, user_current_idx, user_assigned_rows
     else:
-        return "**All records tagged.**", "", "", user_current_idx
+        return "**All records tagged.**", "", "", user_current_idx, user_assigned_rows
+
+# Hand a user's unfinished dynamically claimed rows (from current_idx on) back to the queue
+def release_claims(account_id, current_idx):
+    rows = user_to_rows.get(account_id)
+    if work_queue is not None and rows and 0 <= current_idx < len(rows):
+        for row_idx in rows[current_idx:]:
+            work_queue.release(account_id, row_idx)
+        del rows[current_idx:]
+
+# Users whose session expired without a logout give their unfinished claims back too (run by the session sweeper)
+def release_expired_claims(account_id):
+    release_claims(account_id, load_user_progress(account_id))
+
+# Batch mode: the user's next page of rows as an editable table (claims a page of rows in dynamic mode)
+@metrics.timed()
+def batch_page(session_token, user_current_idx):
+    account_id = auth.check_session(session_token)
+    rows = assigned_page_rows(account_id, user_current_idx) if account_id is not None else None
+    if rows is None or user_current_idx is None or user_current_idx < 0:
+        return pd.DataFrame(columns=BATCH_COLUMNS), rows
+    page = [int(row_idx) for row_idx in rows[user_current_idx:user_current_idx + page_size]]
+    page_df = pd.DataFrame({
+        "Row": page,
+        "Company Name": [news_data[row_idx]['Company Name'] for row_idx in page],
+        "Headline": [news_data[row_idx].get('Headline') or news_data[row_idx]['URL'] for row_idx in page],
+        "Tag": [""] * len(page)
+    }, columns=BATCH_COLUMNS)
+    return page_df, rows
+
+# Batch mode: after a single tag, refresh the page only while the batch panel is open
+def batch_page_if_open(session_token, user_current_idx, batch_open):
+    if not batch_open:
+        return gr.update(), gr.update()
+    return batch_page(session_token, user_current_idx)
 
-def logout_user(account_id, user_current_idx):
-    save_user_progress(account_id, user_current_idx)
+# Batch mode: store every tag on the page in one write and advance progress past them
+@metrics.timed()
+async def submit_page(session_token, user_assigned_rows, user_current_idx, page_df):
+    account_id = auth.check_session(session_token)
+    if account_id is None:
+        return ("**Authentication failed.**", gr.update(), gr.update(), gr.update(), gr.update(),
+                user_current_idx, user_assigned_rows)
+    user_assigned_rows = user_to_rows.get(account_id, user_assigned_rows)
+    # Progress is a position in the user's rows, so only the tagged rows at the top of the page count
+    updates = []
+    async with account_locks[account_id]:
+        idx = user_progress.get(account_id, user_current_idx)
+        for row_idx, tag in zip(page_df["Row"], page_df["Tag"]):
+            tag = str(tag).strip().capitalize()
+            if tag not in ("Yes", "No") or idx >= len(user_assigned_rows) or int(row_idx) != int(user_assigned_rows[idx]):
+                break
+            idx += 1
+            updates.append((account_id, int(row_idx), tag, idx))
+        if updates:
+            await writer.write_many_async(updates)
+    page_df, user_assigned_rows = batch_page(session_token, idx)
+    status = f"**Saved {len(updates)} tag(s).**" if updates else "**Tag the rows from the top of the page with Yes or No.**"
+    if user_assigned_rows is not None and idx < len(user_assigned_rows):
+        row_idx = user_assigned_rows[idx]
+        url, company = news_data[row_idx]['URL'], news_data[row_idx]['Company Name']
+        return status, page_df, url, company, render_preview(url), idx, user_assigned_rows
+    return status, page_df, "**All records tagged.**", "", "", idx, user_assigned_rows
+
+@metrics.timed()
+async def logout_user(session_token, user_current_idx):
+    account_id = auth.check_session(session_token)
+    if account_id is not None:
+        await save_user_progress(account_id, user_current_idx)
+        release_claims(account_id, user_current_idx)
+    auth.revoke_session(session_token)
     return ("**Logged out successfully.**", gr.update(visible=True), gr.update(visible=True), gr.update(visible=False), 
-            gr.update(visible=False), gr.update(visible=False), [], -1, gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=True))
+            gr.update(visible=False), gr.update(visible=False), [], -1, gr.update(visible=False), gr.update(visible=False), gr.update(visible=False), gr.update(visible=True), None)
+
+# Summary tables are built on the blocking executor so a large summary never stalls annotators
+@metrics.timed()
+async def show_summary(password):
+    return await jobs.run_blocking(summary_tables, password)
 
-def show_summary(password):
+def summary_tables(password):
     if password != admin_password:
         return gr.update(visible=False), gr.update(visible=False), gr.update(visible=False)
-    if not os.path.exists(output_file):
+    if not news_data:
         return (gr.update(value=pd.DataFrame({"Error": ["No tagging data found."]}), visible=True), 
                 gr.update(visible=False), gr.update(visible=False))
-    df = pd.read_csv(output_file)
-    df['Tag'] = df['Tag'].fillna('')  # Handle NaN in Tag column
-    yes_count = df[df['Tag'] == 'Yes'].shape[0]
-    no_count = df[df['Tag'] == 'No'].shape[0]
-    summary_df = pd.DataFrame({"Tag": ["Yes", "No"], "Count": [yes_count, no_count]})
+    summary_df = pd.DataFrame({"Tag": ["Yes", "No"], "Count": [counters.tag_count('Yes'), counters.tag_count('No')]})
     assignment_data = [{"Set Index": set_idx, "Number of Rows": len(sets[set_idx]), "Assigned Users": ", ".join(set_to_users[set_idx])} 
                       for set_idx in range(len(sets))]
     assignment_df = pd.DataFrame(assignment_data)
     status_data = []
     for user, rows in user_to_rows.items():
         total_rows = len(rows)
-        tagged_rows = sum(1 for row_idx in rows if news_data[row_idx]['Tag'] in ['Yes', 'No'])
+        if work_queue is not None:
+            tagged_rows = user_progress.get(user, 0)
+        else:
+            _, tagged_rows = counters.user_totals(user)
         remaining = total_rows - tagged_rows
-        assigned_sets = [set_idx for set_idx, users in set_to_users.items() if user in users]
+        assigned_sets = counters.user_sets.get(user, [])
         status_data.append({
             "User": user,
             "Assigned Sets": ", ".join(map(str, assigned_sets)),
@@ -197,33 +407,164 @@ def show_summary(password):
             gr.update(value=assignment_df, visible=True), 
             gr.update(value=status_df, visible=True))
 
+# Raw counters for dashboards that poll the app
+@metrics.timed()
+def summary_counts(password):
+    if password != admin_password:
+        return {"error": "Unauthorized - Incorrect password."}
+    snapshot = counters.snapshot()
+    if prefetcher:
+        snapshot["previews"] = prefetcher.stats()
+    snapshot["agreement"] = agreement_tracker.summary()
+    return snapshot
+
+# Consistency check: rebuild the counters from stored tags (replaying the tag log) and report any drift.
+# Reloading the stored state is slow on large datasets, so it runs as a background job polled by a timer
+def start_verify(password):
+    if password != admin_password:
+        return "**Error:** Unauthorized - Incorrect password.", None, gr.update(active=False)
+    job_id = jobs.start_job(verify_counters, name="verify")
+    return "**Verifying counters...**", job_id, gr.update(active=True)
+
+def verify_counters(report):
+    global counters
+    report(0.1, "Reloading stored tags")
+    with store.lock:
+        stored_data, _ = store.load_state()
+        rebuilt = summary_counters.SummaryCounters()
+        rebuilt.rebuild(stored_data, sets, set_to_users, user_to_rows, store.load_annotations())
+        consistent = rebuilt.matches(counters)
+        counters = rebuilt
+    return consistent
+
+def check_verify(job_id):
+    job = jobs.job_status(job_id)
+    if job is None:
+        return gr.update(), gr.update(active=False)
+    if job["state"] == "running":
+        return f"**Verifying counters:** {job['message']} ({job['progress']:.0%})", gr.update()
+    if job["state"] == "error":
+        return f"**Error:** {job['error']}", gr.update(active=False)
+    if job["result"]:
+        return "**Counters are consistent with the stored tags.**", gr.update(active=False)
+    return "**Counters had drifted from the stored tags and have been rebuilt.**", gr.update(active=False)
+
+# Admin export: stream the filtered results to a file as a background job, then offer it for download
+@metrics.timed()
+def start_export(password, fmt, set_text, user_text, tags, start_text, end_text):
+    if password != admin_password:
+        return "**Error:** Unauthorized - Incorrect password.", None, gr.update(active=False)
+    if not news_data:
+        return "**Error:** No tagging data found.", None, gr.update(active=False)
+    try:
+        set_indexes = [int(value) for value in export.parse_list(set_text)]
+        start, end = export.parse_time(start_text), export.parse_time(end_text)
+    except ValueError as e:
+        return f"**Error:** {e}", None, gr.update(active=False)
+    rows = export.select_rows(len(news_data), sets, set_indexes)
+    job_id = jobs.start_job(export.export_results, news_data, fmt, rows, export.parse_list(user_text), tags,
+                            start, end, name="export")
+    return "**Export started...**", job_id, gr.update(active=True)
+
+# Agreement statistics are computed from running counts, so they are cheap enough to serve directly
+@metrics.timed()
+def show_agreement(password):
+    if password != admin_password:
+        return "**Error:** Unauthorized - Incorrect password.", gr.update(visible=False), gr.update(visible=False)
+    pair_df, set_df = agreement.stats_frames(agreement_tracker)
+    overview = agreement_tracker.summary()
+    status = (f"**{overview['labelled_rows']:,} labelled rows, {overview['conflicting_rows']:,} with conflicting "
+              f"labels, {overview['pairs']:,} annotator pairs.**")
+    return status, gr.update(value=pair_df, visible=True), gr.update(value=set_df, visible=True)
+
+# Rows annotators disagree on, exported for adjudication with the same job/timer flow as the results export
+def start_conflict_export(password, fmt):
+    if password != admin_password:
+        return "**Error:** Unauthorized - Incorrect password.", None, gr.update(active=False)
+    job_id = jobs.start_job(agreement.export_conflicts, agreement_tracker, news_data, fmt, name="conflicts")
+    return "**Conflict export started...**", job_id, gr.update(active=True)
+
+def check_export(job_id):
+    job = jobs.job_status(job_id)
+    if job is None:
+        return gr.update(), gr.update(), gr.update(active=False)
+    if job["state"] == "running":
+        return f"**Exporting:** {job['message']} ({job['progress']:.0%})", gr.update(), gr.update()
+    if job["state"] == "error":
+        return f"**Error:** {job['error']}", gr.update(visible=False), gr.update(active=False)
+    path, written = job["result"]
+    return f"**Exported {written:,} rows.**", gr.update(value=path, visible=True), gr.update(active=False)
+
 # Main app
 def main():
     parser = argparse.ArgumentParser(description="Gradio News Tagging App")
     parser.add_argument("--port", type=int, default=7860)
     parser.add_argument("--share", action="store_true")
+    parser.add_argument("--compact-interval", type=int, default=30, help="Seconds between tag log compactions / CSV exports")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv", help="Storage backend for tags, progress and credentials")
+    parser.add_argument("--db-path", default="tagging.db", help="Database file for the sqlite backend")
+    parser.add_argument("--page-size", type=int, default=10, help="Rows per page in batch tagging mode")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests Gradio handles in parallel")
+    parser.add_argument("--dynamic-assignment", action="store_true",
+                        help="Hand out rows from a shared queue instead of fixed per-user sets")
+    parser.add_argument("--prefetch-depth", type=int, default=0,
+                        help="Upcoming articles to prefetch per annotator and cache as previews, e.g. "
+                             f"{prefetch.PREFETCH_DEPTH} (0, the default, fetches nothing server-side)")
+    parser.add_argument("--preview-cache-dir", default=prefetch.CACHE_DIR, help="Directory for cached article previews")
+    parser.add_argument("--preview-cache-mb", type=int, default=prefetch.MAX_CACHE_BYTES // (1024 * 1024),
+                        help="Size cap of the preview cache in MB")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics on this port at /metrics (0 disables)")
+    parser.add_argument("--metrics-json", default=None, help="Write all metrics to this JSON file at shutdown")
     args = parser.parse_args()
 
+    # Restore tags and progress from the storage backend
+    global store, dynamic_assignment, prefetcher, page_size
+    dynamic_assignment = args.dynamic_assignment
+    page_size = args.page_size
+    if args.prefetch_depth > 0:
+        cache = prefetch.PreviewCache(args.preview_cache_dir, args.preview_cache_mb * 1024 * 1024)
+        prefetcher = prefetch.Prefetcher(cache, depth=args.prefetch_depth)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    if args.metrics_json:
+        metrics.dump_json_at_exit(args.metrics_json)
+    store = storage.open_storage(args.storage, args.db_path, output_file=output_file, progress_file=progress_file,
+                                 credentials_file=credentials_file, tag_log_file=tag_log_file)
+    restore_state()
+    tag_log.start_compactor(compact_results, args.compact_interval)
+    auth.start_session_sweeper(release_expired_claims)
+
     with gr.Blocks(theme=gr.themes.Ocean()) as app:
         gr.Markdown("# News Tagging Application")
 
         with gr.Tab("Upload File"):
             admin_pwd = gr.Textbox(label="Admin Password", type="password")
-            excel_file = gr.File(label="Excel File (.xlsx)")
+            excel_file = gr.File(label="News File (.xlsx, .csv, .parquet)")
             account_ids_file = gr.File(label="Upload Account IDs (.txt)")
             num_sets_input = gr.Number(label="Number of Sets", value=1, precision=0)
             num_users_per_set_input = gr.Number(label="Number of Users per Set", value=1, precision=0)
+            skip_duplicates_input = gr.Checkbox(label="Skip near-duplicate articles", value=True)
             upload_btn = gr.Button("Upload", variant="primary")
             upload_status = gr.Markdown()
             credentials_table = gr.DataFrame(visible=False)
             show_passwords = gr.Checkbox(label="Show Passwords", value=False, visible=False)
             hidden_credentials = gr.State(None)
             full_credentials = gr.State(None)
+            upload_job = gr.State(None)
+            upload_timer = gr.Timer(1.0, active=False)
 
             upload_btn.click(
                 upload_excel,
-                [excel_file, account_ids_file, admin_pwd, num_sets_input, num_users_per_set_input],
-                [upload_status, credentials_table, full_credentials, credentials_table, show_passwords]
+                [excel_file, account_ids_file, admin_pwd, num_sets_input, num_users_per_set_input,
+                 skip_duplicates_input],
+                [upload_status, upload_job, upload_timer]
+            )
+
+            upload_timer.tick(
+                check_upload,
+                [upload_job],
+                [upload_status, credentials_table, full_credentials, credentials_table, show_passwords, upload_timer]
             ).then(
                 lambda df: df,
                 inputs=[credentials_table],
@@ -249,14 +590,21 @@ def main():
             preview = gr.HTML(visible=False)
             user_assigned_rows = gr.State()
             user_current_idx = gr.State()
+            session_token = gr.State()
             tag_input = gr.Radio(["Yes", "No"], label="Related?", visible=False)
             tag_btn = gr.Button("Submit", interactive=False, visible=False, variant="primary")
             logout_btn = gr.Button("Logout", visible=False, variant="secondary")
+            batch_open = gr.State(False)
+            with gr.Accordion("Batch Tagging", open=False, visible=False) as batch_panel:
+                gr.Markdown("Enter Yes or No in the Tag column, top to bottom, and submit the whole page at once.")
+                batch_table = gr.Dataframe(headers=BATCH_COLUMNS, interactive=True)
+                batch_status = gr.Markdown()
+                batch_btn = gr.Button("Submit Page", variant="primary")
 
             login_btn.click(
                 user_login,
                 [user_id, user_pwd],
-                [auth_status, user_id, user_pwd, url_display, company_display, preview, user_assigned_rows, user_current_idx, tag_input, tag_btn, logout_btn]
+                [auth_status, user_id, user_pwd, url_display, company_display, preview, user_assigned_rows, user_current_idx, tag_input, tag_btn, logout_btn, session_token]
             ).then(
                 lambda account_id: gr.update(value=f'**Logged in as:** {account_id}', visible=True),
                 inputs=[user_id],
@@ -265,8 +613,23 @@ def main():
                 lambda _: gr.update(visible=False),
                 inputs=[user_id],
                 outputs=[login_btn]
+            ).then(
+                lambda token: gr.update(visible=token is not None),
+                inputs=[session_token],
+                outputs=[batch_panel]
             )
 
+            # The page (and, in dynamic mode, its claims) is only built once the batch panel is opened
+            batch_panel.expand(
+                lambda: True,
+                outputs=[batch_open]
+            ).then(
+                batch_page,
+                inputs=[session_token, user_current_idx],
+                outputs=[batch_table, user_assigned_rows]
+            )
+            batch_panel.collapse(lambda: False, outputs=[batch_open])
+
             tag_input.change(
                 lambda choice: gr.update(interactive=True),
                 inputs=[tag_input],
@@ -275,21 +638,31 @@ def main():
 
             tag_btn.click(
                 submit_tag,
-                inputs=[user_id, user_pwd, user_assigned_rows, user_current_idx, tag_input],
-                outputs=[url_display, company_display, preview, user_current_idx]
+                inputs=[session_token, user_assigned_rows, user_current_idx, tag_input],
+                outputs=[url_display, company_display, preview, user_current_idx, user_assigned_rows]
             ).then(
                 lambda idx, rows: gr.update(interactive=False) if idx >= len(rows) else gr.update(interactive=True),
                 inputs=[user_current_idx, user_assigned_rows],
                 outputs=[tag_btn]
+            ).then(
+                batch_page_if_open,
+                inputs=[session_token, user_current_idx, batch_open],
+                outputs=[batch_table, user_assigned_rows]
+            )
+
+            batch_btn.click(
+                submit_page,
+                inputs=[session_token, user_assigned_rows, user_current_idx, batch_table],
+                outputs=[batch_status, batch_table, url_display, company_display, preview, user_current_idx, user_assigned_rows]
             )
 
             logout_btn.click(
                 logout_user,
-                inputs=[user_id, user_current_idx],
-                outputs=[auth_status, user_id, user_pwd, url_display, company_display, preview, user_assigned_rows, user_current_idx, tag_input, tag_btn, logout_btn, login_btn]
+                inputs=[session_token, user_current_idx],
+                outputs=[auth_status, user_id, user_pwd, url_display, company_display, preview, user_assigned_rows, user_current_idx, tag_input, tag_btn, logout_btn, login_btn, session_token]
             ).then(
-                lambda: gr.update(value=""),
-                outputs=[user_account_display]
+                lambda: (gr.update(value=""), gr.update(visible=False, open=False), False),
+                outputs=[user_account_display, batch_panel, batch_open]
             )
 
         with gr.Tab("Summary"):
@@ -298,6 +671,13 @@ def main():
             summary_output = gr.DataFrame(visible=False)
             assignment_summary = gr.DataFrame(visible=False)
             tagging_status = gr.DataFrame(visible=False)
+            with gr.Row():
+                counts_btn = gr.Button("Live Counts", variant="secondary")
+                verify_btn = gr.Button("Verify Counters", variant="secondary")
+            verify_status = gr.Markdown()
+            verify_job = gr.State()
+            verify_timer = gr.Timer(1.0, active=False)
+            live_counts = gr.JSON(label="Live Counts")
 
             summary_btn.click(
                 show_summary,
@@ -305,6 +685,50 @@ def main():
                 [summary_output, assignment_summary, tagging_status]
             )
 
+            counts_btn.click(summary_counts, [summary_pwd], [live_counts], api_name="summary_counts")
+            verify_btn.click(start_verify, [summary_pwd], [verify_status, verify_job, verify_timer])
+            verify_timer.tick(check_verify, [verify_job], [verify_status, verify_timer])
+
+            gr.Markdown("### Export Results")
+            with gr.Row():
+                export_format = gr.Dropdown(list(export.EXPORT_FORMATS), value="csv", label="Format")
+                export_sets = gr.Textbox(label="Sets (comma-separated indexes, blank for all)")
+                export_users = gr.Textbox(label="Tagged By (comma-separated account IDs, blank for all)")
+            with gr.Row():
+                export_tags = gr.CheckboxGroup(["Yes", "No", export.UNTAGGED], label="Tags (none selected for all)")
+                export_start = gr.Textbox(label="Tagged From (e.g. 2025-01-31 09:00, UTC)")
+                export_end = gr.Textbox(label="Tagged Before")
+            export_btn = gr.Button("Export", variant="secondary")
+            export_status = gr.Markdown()
+            export_file = gr.File(label="Download", visible=False)
+            export_job = gr.State()
+            export_timer = gr.Timer(1.0, active=False)
+
+            export_btn.click(
+                start_export,
+                [summary_pwd, export_format, export_sets, export_users, export_tags, export_start, export_end],
+                [export_status, export_job, export_timer]
+            )
+            export_timer.tick(check_export, [export_job], [export_status, export_file, export_timer])
+
+            gr.Markdown("### Annotator Agreement")
+            with gr.Row():
+                agreement_btn = gr.Button("Show Agreement", variant="secondary")
+                conflicts_btn = gr.Button("Export Conflicts", variant="secondary")
+            agreement_status = gr.Markdown()
+            pair_agreement = gr.DataFrame(visible=False, label="Pairs (Cohen's kappa)")
+            set_agreement = gr.DataFrame(visible=False, label="Sets (Fleiss' kappa)")
+            conflicts_file = gr.File(label="Conflicts", visible=False)
+            conflicts_job = gr.State()
+            conflicts_timer = gr.Timer(1.0, active=False)
+
+            agreement_btn.click(show_agreement, [summary_pwd], [agreement_status, pair_agreement, set_agreement])
+            conflicts_btn.click(start_conflict_export, [summary_pwd, export_format],
+                                [agreement_status, conflicts_job, conflicts_timer])
+            conflicts_timer.tick(check_export, [conflicts_job], [agreement_status, conflicts_file, conflicts_timer])
+
+    # Writes are serialized by the tag writer, so handlers can run in parallel
+    app.queue(default_concurrency_limit=args.concurrency)
     app.launch(share=args.share, server_port=args.port)
 
 if __name__ == "__main__":
@@ -1,42 +1,60 @@
 import argparse
+import asyncio
 import gradio as gr
 import pandas as pd
 import os
 import secrets
-import random
-import json
+import time
 import shutil
+import assignment_plan
+import auth
+import export
+import ingest
+import item_store
+import jobs
+import metrics
+import planner
+import storage
+import summary_counters
+import tag_log
+import tag_writer
 
 # Global variables
 output_file = "tagged_results.csv"
 admin_password = "x"  # Change to a secure password in production
 credentials_file = "user_credentials.csv"
 progress_file = "user_progress.csv"
+tag_log_file = "tag_events.log"  # Append-only log of tag submissions, compacted into output_file
 ADMIN_STATE_FILE = "admin_state.json"
+ASSIGNMENT_PLAN_DIR = "assignment_plan"  # Binary copy of sets/user_to_rows for warm restarts
 
 # Ensure uploads directory exists
 os.makedirs("uploads", exist_ok=True)
 
 # Load dataset and assignment mappings
-global news_data, user_to_rows, sets, set_to_users
-news_data = []
+global news_data, user_to_rows, sets, set_to_users, user_progress
+news_data = item_store.ItemStore()
 user_to_rows = {}
 sets = []
 set_to_users = {}
+user_progress = {}
 
-# Load admin state from file
+# Persistence backend (CSV/JSON files + tag log by default, SQLite with --storage sqlite)
+store = storage.FileStorage(output_file, progress_file, credentials_file, tag_log_file, ADMIN_STATE_FILE)
+
+# Tag counts for the Summary tab, updated as tags are submitted
+counters = summary_counters.SummaryCounters()
+
+# Load admin state from the storage backend
 def load_admin_state():
-    if os.path.exists(ADMIN_STATE_FILE):
-        with open(ADMIN_STATE_FILE, "r") as f:
-            return json.load(f)
-    return {"logged_in": False, "excel_file": None, "account_ids_file": None, "num_sets": 1, "num_users_per_set": 1}
+    return store.load_admin_state()
 
-# Save admin state to file
+# Save admin state to the storage backend
 def save_admin_state(state):
-    with open(ADMIN_STATE_FILE, "w") as f:
-        json.dump(state, f)
+    store.save_admin_state(state)
 
 # Admin login function
+@metrics.timed()
 def admin_login(username, password):
     if username == "admin" and password == "adminpass":
         state = load_admin_state()
@@ -97,9 +115,8 @@ def admin_logout():
 
 # Admin reset function
 def admin_reset():
-    if os.path.exists(ADMIN_STATE_FILE):
-        os.remove(ADMIN_STATE_FILE)
-    for file in ["news_data.xlsx", "account_ids.txt"]:
+    store.reset_admin_state()
+    for file in ["news_data.xlsx", "news_data.csv", "news_data.parquet", "account_ids.txt"]:
         file_path = os.path.join("uploads", file)
         if os.path.exists(file_path):
             os.remove(file_path)
@@ -119,19 +136,20 @@ def admin_reset():
         gr.update(value="State reset", visible=True)  # admin_auth_status
     )
 
-# Admin upload function (updated to handle file paths)
-def admin_upload(excel_file, account_ids_file, num_sets, num_users_per_set):
-    global news_data, user_to_rows, sets, set_to_users
+# Admin upload function (updated to handle file paths; processing runs as a background job).
+# Async so the file copies run on the blocking executor instead of holding a worker thread
+@metrics.timed()
+async def admin_upload(excel_file, account_ids_file, num_sets, num_users_per_set):
     state = load_admin_state()
     
     # Save new files if uploaded by copying them to the uploads directory
     if excel_file is not None:
-        excel_path = "uploads/news_data.xlsx"
-        shutil.copy(excel_file, excel_path)
+        excel_path = "uploads/news_data" + os.path.splitext(excel_file)[1].lower()
+        await jobs.run_blocking(shutil.copy, excel_file, excel_path)
         state["excel_file"] = excel_path
     if account_ids_file is not None:
         account_ids_path = "uploads/account_ids.txt"
-        shutil.copy(account_ids_file, account_ids_path)
+        await jobs.run_blocking(shutil.copy, account_ids_file, account_ids_path)
         state["account_ids_file"] = account_ids_path
     
     # Update settings
@@ -143,162 +161,190 @@ def admin_upload(excel_file, account_ids_file, num_sets, num_users_per_set):
     excel_file_path = state.get("excel_file")
     account_ids_file_path = state.get("account_ids_file")
     if not excel_file_path or not os.path.exists(excel_file_path) or not account_ids_file_path or not os.path.exists(account_ids_file_path):
+        message = "**Error:** Files not uploaded."
+    elif state["num_sets"] <= 0 or state["num_users_per_set"] <= 0:
+        message = "**Error:** Number of sets and users per set must be positive."
+    else:
+        job_id = jobs.start_job(process_upload, excel_file_path, account_ids_file_path, state["num_sets"],
+                                state["num_users_per_set"], name="upload")
         return (
-            gr.update(value="**Error:** Files not uploaded.", visible=True),
-            None,
-            None,
-            gr.update(value=state.get("excel_file", "No file uploaded")),
-            gr.update(value=state.get("account_ids_file", "No file uploaded")),
-            gr.update(visible=True),
-            gr.update(visible=True)
-        )
-    
-    # Original upload logic
-    df = pd.read_excel(excel_file_path)
-    if not {'URL', 'Company Name', 'Tag'}.issubset(df.columns):
-        return (
-            gr.update(value="**Error:** Excel file must contain 'URL', 'Company Name', and 'Tag'.", visible=True),
-            None,
-            None,
-            gr.update(value=state.get("excel_file", "No file uploaded")),
-            gr.update(value=state.get("account_ids_file", "No file uploaded")),
-            gr.update(visible=True),
-            gr.update(visible=True)
+            gr.update(value="**Upload started...**", visible=True),
+            gr.update(value=state["excel_file"]),
+            gr.update(value=state["account_ids_file"]),
+            job_id,
+            gr.update(active=True)
         )
-    
-    news_data = [{'URL': row['URL'], 'Company Name': row['Company Name'], 'Tag': row.get('Tag', '')} for _, row in df.iterrows()]
-    N = len(df)
+    return (
+        gr.update(value=message, visible=True),
+        gr.update(value=state.get("excel_file", "No file uploaded")),
+        gr.update(value=state.get("account_ids_file", "No file uploaded")),
+        None,
+        gr.update(active=False)
+    )
+
+@metrics.timed()
+def process_upload(report, excel_file_path, account_ids_file_path, num_sets, num_users_per_set):
+    global news_data, user_to_rows, sets, set_to_users, user_progress
+    df = ingest.read_items(excel_file_path, lambda fraction, message: report(0.8 * fraction, message))
     with open(account_ids_file_path, "r") as f:
         account_ids = f.read().splitlines()
     M = len(account_ids)
+
+    # Only salted hashes are stored; hashing every account takes a while, so it is done before taking the lock
+    passwords = [secrets.token_urlsafe(8) for _ in account_ids]
+    credentials_stored = auth.hash_credentials(account_ids, passwords)
     
-    num_sets = int(num_sets)
-    num_users_per_set = int(num_users_per_set)
-    if num_sets <= 0 or num_users_per_set <= 0:
+    # Swap in the new dataset while no tag is being written
+    with store.lock:
+        report(0.8, "Assigning sets")
+        news_data = ingest.build_items(df)
+        N = len(df)
+    
+        # Divide rows into sets and give each set num_users_per_set distinct users
+        sets, set_to_users, user_to_rows = planner.plan_assignments(N, account_ids, num_sets, num_users_per_set)
+    
+        # Generate credentials
+        report(0.9, "Saving credentials and dataset")
+        credentials_hidden = pd.DataFrame({
+            'account_id': account_ids,
+            'password': ['[Hidden]' for _ in account_ids]
+        })
+        credentials_full = pd.DataFrame({
+            'account_id': account_ids,
+            'password': passwords
+        })
+        store.save_credentials(credentials_stored)
+        auth.revoke_all_sessions()
+    
+        # Store the dataset and initialize user progress
+        store.save_dataset(df, account_ids)
+        user_progress = {account_id: 0 for account_id in account_ids}
+        assignment_plan.save_plan(ASSIGNMENT_PLAN_DIR, N, sets, set_to_users, user_to_rows)
+        counters.rebuild(news_data, sets, set_to_users, user_to_rows)
+    return credentials_hidden, credentials_full
+
+# Poll the upload job; the timer is switched off once it has finished
+def check_upload(job_id):
+    job = jobs.job_status(job_id)
+    if job is None:
+        return gr.update(), gr.update(), gr.update(), gr.update(), gr.update(), gr.update(active=False)
+    if job["state"] == "running":
         return (
-            gr.update(value="**Error:** Number of sets and users per set must be positive.", visible=True),
+            gr.update(value=f"**Processing upload:** {job['message']} ({job['progress']:.0%})", visible=True),
+            gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+        )
+    if job["state"] == "error":
+        return (
+            gr.update(value=f"**Error:** {job['error']}", visible=True),
             None,
             None,
-            gr.update(value=state.get("excel_file", "No file uploaded")),
-            gr.update(value=state.get("account_ids_file", "No file uploaded")),
             gr.update(visible=True),
-            gr.update(visible=True)
+            gr.update(visible=True),
+            gr.update(active=False)
         )
-    
-    # Divide rows into sets
-    indices = list(range(N))
-    sets = [indices[i::num_sets] for i in range(num_sets)]
-    
-    # Distribute users evenly across sets
-    base_users_per_set = M // num_sets
-    extra_users = M % num_sets
-    set_to_users = {}
-    shuffled_users = account_ids.copy()
-    random.shuffle(shuffled_users)
-    user_idx = 0
-    for set_idx in range(num_sets):
-        num_users = base_users_per_set + (1 if set_idx < extra_users else 0)
-        assigned_users = shuffled_users[user_idx:user_idx + num_users]
-        set_to_users[set_idx] = assigned_users
-        user_idx += num_users
-    
-    # Compute user to row mapping
-    user_to_sets = {account_id: [] for account_id in account_ids}
-    for set_idx, users in set_to_users.items():
-        for user in users:
-            user_to_sets[user].append(set_idx)
-    user_to_rows = {}
-    for account_id in account_ids:
-        assigned_sets = user_to_sets[account_id]
-        rows = sum([sets[set_idx] for set_idx in assigned_sets], [])
-        user_to_rows[account_id] = sorted(rows)
-    
-    # Generate credentials
-    passwords = [secrets.token_urlsafe(8) for _ in account_ids]
-    credentials_hidden = pd.DataFrame({
-        'account_id': account_ids,
-        'password': ['[Hidden]' for _ in account_ids]
-    })
-    credentials_full = pd.DataFrame({
-        'account_id': account_ids,
-        'password': passwords
-    })
-    credentials_full.to_csv(credentials_file, index=False)
-    df.to_csv(output_file, index=False)
-    
-    # Initialize user progress
-    progress_df = pd.DataFrame({'account_id': account_ids, 'current_idx': [0] * len(account_ids)})
-    progress_df.to_csv(progress_file, index=False)
-    
+    credentials_hidden, credentials_full = job["result"]
     return (
         gr.update(value="**Files uploaded, sets assigned evenly, and credentials created successfully!**", visible=True),
         credentials_hidden,
         credentials_full,
-        gr.update(value=state["excel_file"]),
-        gr.update(value=state["account_ids_file"]),
         gr.update(visible=True),
-        gr.update(visible=True)
+        gr.update(visible=True),
+        gr.update(active=False)
     )
 
-# User authentication function
+# User authentication function (in-memory credential index, reloaded when the file changes)
+@metrics.timed()
 def authenticate(account_id, password):
-    if not os.path.exists(credentials_file):
-        return False, "No credentials found. Please upload files first."
-    credentials = pd.read_csv(credentials_file)
-    if account_id in credentials['account_id'].values:
-        stored_password = credentials[credentials['account_id'] == account_id]['password'].values[0]
-        if stored_password == password:
-            return True, "Login successful!"
-        return False, "Incorrect password."
-    return False, "Account ID not found."
-
-# Tag news function
-def tag_news(account_id, password, tag):
-    success, message = authenticate(account_id, password)
-    if not success:
-        return message, None
-    if not os.path.exists(progress_file) or not os.path.exists(output_file):
-        return "Files not uploaded yet.", None
-    
-    progress_df = pd.read_csv(progress_file)
-    tagged_df = pd.read_csv(output_file)
+    return auth.authenticate(store, account_id, password)
+
+# Apply a stored tag to the in-memory state (runs on the writer thread)
+def apply_update(account_id, row_idx, tag, current_idx):
+    if row_idx is not None and 0 <= row_idx < len(news_data):
+        counters.record(row_idx, news_data[row_idx]['Tag'], tag, account_id)
+        news_data[row_idx]['Tag'] = tag
+        news_data[row_idx][export.TAGGED_BY] = account_id
+        news_data[row_idx][export.TAGGED_AT] = time.time()
+    if current_idx is not None:
+        user_progress[account_id] = current_idx
+
+# All tag and progress writes go through one writer thread; handlers only wait for their update
+writer = tag_writer.TagWriter(lambda: store, apply_update)
+
+# Serializes each account's read-progress-then-tag step without blocking other accounts
+account_locks = tag_writer.KeyedLocks(asyncio.Lock)
+
+# Tag news function; the password is only checked until a session token has been issued.
+# Async: password hashing runs on the blocking executor and the write is awaited on the event loop
+@metrics.timed()
+async def tag_news(account_id, password, tag, session_token=None):
+    if auth.check_session(session_token) != account_id:
+        success, message = await jobs.run_blocking(authenticate, account_id, password)
+        if not success:
+            return message, None, None
+        session_token = auth.issue_session(account_id)
+    if not news_data:
+        return "Files not uploaded yet.", None, session_token
     if account_id not in user_to_rows:
-        return "No rows assigned to this user.", None
+        return "No rows assigned to this user.", None, session_token
     
-    current_idx = progress_df[progress_df['account_id'] == account_id]['current_idx'].values[0]
     assigned_rows = user_to_rows[account_id]
-    
-    if current_idx >= len(assigned_rows):
-        return "All assigned rows tagged!", tagged_df
-    
-    row_idx = assigned_rows[current_idx]
-    tagged_df.at[row_idx, 'Tag'] = tag
-    tagged_df.to_csv(output_file, index=False)
-    
-    progress_df.loc[progress_df['account_id'] == account_id, 'current_idx'] = current_idx + 1
-    progress_df.to_csv(progress_file, index=False)
+    async with account_locks[account_id]:
+        current_idx = user_progress.get(account_id, 0)
+        if current_idx >= len(assigned_rows):
+            return "All assigned rows tagged!", None, session_token
+        
+        row_idx = int(assigned_rows[current_idx])
+        await writer.write_async(account_id, row_idx, tag, current_idx + 1)
+    tagged_df = pd.DataFrame([dict(news_data[row_idx])], index=[row_idx])
     
     next_idx = current_idx + 1
     if next_idx < len(assigned_rows):
         next_row = news_data[assigned_rows[next_idx]]
-        return f"Tagged row {current_idx + 1}/{len(assigned_rows)}. Next: {next_row['Company Name']} - {next_row['URL']}", tagged_df
-    return "All assigned rows tagged!", tagged_df
+        return f"Tagged row {current_idx + 1}/{len(assigned_rows)}. Next: {next_row['Company Name']} - {next_row['URL']}", tagged_df, session_token
+    return "All assigned rows tagged!", tagged_df, session_token
+
+# Bring output_file and progress_file up to date with the storage backend
+def compact_results():
+    return store.compact(news_data, user_progress)
 
 # Summary function
+@metrics.timed()
 def view_summary():
-    if not os.path.exists(output_file):
+    if not news_data:
         return "No data tagged yet."
-    df = pd.read_csv(output_file)
-    summary = df['Tag'].value_counts().to_dict()
-    return "\n".join([f"{tag}: {count}" for tag, count in summary.items()])
+    summary = counters.snapshot()["tags"]
+    return "\n".join([f"{tag}: {count}" for tag, count in sorted(summary.items(), key=lambda item: -item[1])])
 
 # Main app
 def main():
     parser = argparse.ArgumentParser(description="Gradio News Tagging App")
     parser.add_argument("--port", type=int, default=7860)
     parser.add_argument("--share", action="store_true")
+    parser.add_argument("--compact-interval", type=int, default=30, help="Seconds between tag log compactions / CSV exports")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv", help="Storage backend for tags, progress, credentials and admin state")
+    parser.add_argument("--db-path", default="tagging.db", help="Database file for the sqlite backend")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests Gradio handles in parallel")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics on this port at /metrics (0 disables)")
+    parser.add_argument("--metrics-json", default=None, help="Write all metrics to this JSON file at shutdown")
     args = parser.parse_args()
 
+    # Restore tags and progress from the storage backend and reuse the saved assignment plan
+    global news_data, user_to_rows, sets, set_to_users, user_progress, store
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    if args.metrics_json:
+        metrics.dump_json_at_exit(args.metrics_json)
+    store = storage.open_storage(args.storage, args.db_path, output_file=output_file, progress_file=progress_file,
+                                 credentials_file=credentials_file, tag_log_file=tag_log_file,
+                                 admin_state_file=ADMIN_STATE_FILE)
+    news_data, user_progress = store.load_state()
+    plan = assignment_plan.load_plan(ASSIGNMENT_PLAN_DIR, len(news_data))
+    if plan is not None:
+        sets, set_to_users, user_to_rows = plan
+    counters.rebuild(news_data, sets, set_to_users, user_to_rows, store.load_annotations())
+    tag_log.start_compactor(compact_results, args.compact_interval)
+
     state = load_admin_state()
     admin_logged_in = state["logged_in"]
 
@@ -313,7 +359,7 @@ def main():
             
             current_excel_label = gr.Textbox(label="Current Excel File", value=state.get("excel_file", "No file uploaded"), interactive=False, visible=admin_logged_in)
             current_account_ids_label = gr.Textbox(label="Current Account IDs File", value=state.get("account_ids_file", "No file uploaded"), interactive=False, visible=admin_logged_in)
-            excel_file = gr.File(label="Excel File (.xlsx)", type="filepath", visible=admin_logged_in)
+            excel_file = gr.File(label="News File (.xlsx, .csv, .parquet)", type="filepath", visible=admin_logged_in)
             account_ids_file = gr.File(label="Upload Account IDs (.txt)", type="filepath", visible=admin_logged_in)
             num_sets_input = gr.Number(label="Number of Sets", value=state.get("num_sets", 1), precision=0, visible=admin_logged_in)
             num_users_per_set_input = gr.Number(label="Number of Users per Set", value=state.get("num_users_per_set", 1), precision=0, visible=admin_logged_in)
@@ -324,6 +370,8 @@ def main():
             credentials_table = gr.DataFrame(visible=admin_logged_in)
             full_credentials = gr.State(None)
             show_passwords = gr.Checkbox(label="Show Passwords", value=False, visible=admin_logged_in)
+            upload_job = gr.State(None)
+            upload_timer = gr.Timer(1.0, active=False)
 
             admin_login_btn.click(
                 admin_login,
@@ -362,9 +410,14 @@ def main():
             upload_btn.click(
                 admin_upload,
                 inputs=[excel_file, account_ids_file, num_sets_input, num_users_per_set_input],
+                outputs=[upload_status, current_excel_label, current_account_ids_label, upload_job, upload_timer]
+            )
+
+            upload_timer.tick(
+                check_upload,
+                inputs=[upload_job],
                 outputs=[upload_status, credentials_table, full_credentials,
-                         current_excel_label, current_account_ids_label,
-                         credentials_table, show_passwords]
+                         credentials_table, show_passwords, upload_timer]
             ).then(
                 lambda df: df,
                 inputs=[credentials_table],
@@ -384,13 +437,16 @@ def main():
             submit_tag_btn = gr.Button("Submit Tag")
             tag_status = gr.Markdown()
             tagged_data = gr.DataFrame()
-            submit_tag_btn.click(tag_news, inputs=[account_id_input, password_input, tag_input], outputs=[tag_status, tagged_data])
+            session_token = gr.State()
+            submit_tag_btn.click(tag_news, inputs=[account_id_input, password_input, tag_input, session_token], outputs=[tag_status, tagged_data, session_token])
 
         with gr.Tab("Summary"):
             summary_btn = gr.Button("View Summary")
             summary_output = gr.Textbox(label="Tag Summary")
             summary_btn.click(view_summary, outputs=[summary_output])
 
+    # Writes are serialized by the tag writer, so handlers can run in parallel
+    app.queue(default_concurrency_limit=args.concurrency)
     app.launch(share=args.share, server_port=args.port)
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import asyncio
+import importlib.util
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import storage  # noqa: E402
+
+
+def load_module(name, filename):
+    """Import one of the app scripts by path (test.py would otherwise clash with the stdlib test package)."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+
+@pytest.fixture
+def start_app(tmp_path, monkeypatch):
+    """
+    start_app(backend="csv", dynamic=False) loads a fresh copy of the tagging
+    app (test.py) on storage in tmp_path and restores its state, as main()
+    does at startup. Calling it again simulates a restart.
+    """
+    monkeypatch.chdir(tmp_path)
+    started = []
+
+    def start(backend="csv", dynamic=False):
+        app = load_module(f"tagging_app_{len(started)}", "test.py")
+        app.dynamic_assignment = dynamic
+        app.store = storage.open_storage(backend, str(tmp_path / "tagging.db"), output_file=app.output_file,
+                                         progress_file=app.progress_file, credentials_file=app.credentials_file,
+                                         tag_log_file=app.tag_log_file)
+        app.restore_state()
+        started.append(app)
+        return app
+
+    yield start
+    for app in started:
+        app.store.close()
+
+
+def upload(app, tmp_path, account_ids, num_rows=12, num_sets=1, num_users_per_set=1):
+    """Upload a small dataset as the admin would; returns account_id -> password."""
+    data_path = tmp_path / "news.csv"
+    pd.DataFrame({
+        "URL": [f"https://news.example.com/{i}" for i in range(num_rows)],
+        "Company Name": ["Acme" if i % 2 else "Globex" for i in range(num_rows)],
+        "Tag": [None] * num_rows,
+        "Headline": [f"Headline number {i}" for i in range(num_rows)],
+    }).to_csv(data_path, index=False)
+    ids_path = tmp_path / "accounts.txt"
+    ids_path.write_text("\n".join(account_ids))
+    _, credentials, _ = app.process_upload(lambda fraction, message: None, str(data_path), str(ids_path),
+                                           num_sets, num_users_per_set, skip_duplicates=False)
+    return dict(zip(credentials["account_id"], credentials["password"]))
+
+
+def login(app, account_id, password):
+    """Log in through the app's handler; returns (session token, assigned rows, current index)."""
+    result = asyncio.run(app.user_login(account_id, password))
+    return result[-1], result[6], result[7]
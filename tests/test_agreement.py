@@ -0,0 +1,111 @@
+import random
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import agreement
+import item_store
+
+USERS = ["ann", "bob", "cat"]
+SETS = [[0, 1, 2, 3, 4, 5], [6, 7, 8, 9]]
+SET_TO_USERS = {0: USERS, 1: USERS[:2]}
+
+
+def expected_pair_stats(labels):
+    """Cohen's kappa of every pair of users, recomputed from the final labels."""
+    stats = []
+    for user_a, user_b in combinations(sorted({user for row in labels.values() for user in row}), 2):
+        pairs = [(row[user_a], row[user_b]) for row in labels.values() if user_a in row and user_b in row]
+        if not pairs:
+            continue
+        n = len(pairs)
+        observed = sum(a == b for a, b in pairs) / n
+        counts_a, counts_b = Counter(a for a, _ in pairs), Counter(b for _, b in pairs)
+        expected = sum(counts_a[label] * counts_b[label] for label in counts_a) / (n * n)
+        kappa = None if expected >= 1 else (observed - expected) / (1 - expected)
+        stats.append((user_a, user_b, n, observed, kappa))
+    return stats
+
+
+def expected_fleiss(rows_labels, raters):
+    """Fleiss' kappa by the textbook per-row formula."""
+    rows = [Counter(row.values()) for row in rows_labels if len(row) == raters]
+    if not rows or raters < 2:
+        return None
+    p_rows = [(sum(count * count for count in counts.values()) - raters) / (raters * (raters - 1)) for counts in rows]
+    totals = sum(rows, Counter())
+    expected = sum((count / (len(rows) * raters)) ** 2 for count in totals.values())
+    return None if expected >= 1 else (np.mean(p_rows) - expected) / (1 - expected)
+
+
+def test_cohen_kappa():
+    confusion = Counter({("Yes", "Yes"): 20, ("Yes", "No"): 5, ("No", "Yes"): 10, ("No", "No"): 15})
+    assert agreement.cohen_kappa(confusion) == pytest.approx(0.4)
+    assert agreement.cohen_kappa(Counter()) is None
+    assert agreement.cohen_kappa(Counter({("Yes", "Yes"): 3})) is None
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_incremental_stats_match_a_recount(seed):
+    rng = random.Random(seed)
+    tracker = agreement.AgreementTracker()
+    tracker.rebuild(SETS, SET_TO_USERS)
+    labels = {}
+    for _ in range(120):
+        set_idx = rng.randrange(len(SETS))
+        row_idx, user = rng.choice(SETS[set_idx]), rng.choice(SET_TO_USERS[set_idx])
+        # Relabels and withdrawals in every form a missing tag arrives in
+        tag = rng.choice(["Yes", "No", "Maybe", None, np.nan, "", pd.NA])
+        tracker.record(row_idx, user, tag)
+        if isinstance(tag, str) and tag:
+            labels.setdefault(row_idx, {})[user] = tag
+        else:
+            labels.get(row_idx, {}).pop(user, None)
+    labels = {row_idx: row for row_idx, row in labels.items() if row}
+
+    pair_stats = tracker.pair_stats()
+    expected = expected_pair_stats(labels)
+    assert [(s["User A"], s["User B"], s["Shared Rows"]) for s in pair_stats] == [e[:3] for e in expected]
+    for stats, (*_, observed, kappa) in zip(pair_stats, expected):
+        assert stats["Agreement"] == pytest.approx(observed)
+        assert stats["Cohen's Kappa"] == pytest.approx(kappa)
+    for stats, rows in zip(tracker.set_stats(), SETS):
+        rows_labels = [labels[row_idx] for row_idx in rows if row_idx in labels]
+        assert stats["Fully Rated Rows"] == sum(len(row) == stats["Users"] for row in rows_labels)
+        assert stats["Conflicting Rows"] == sum(len(set(row.values())) > 1 for row in rows_labels)
+        assert stats["Fleiss' Kappa"] == pytest.approx(expected_fleiss(rows_labels, stats["Users"]))
+    assert tracker.conflict_rows() == [(row_idx, labels[row_idx]) for row_idx in sorted(labels)
+                                       if len(set(labels[row_idx].values())) > 1]
+    assert sorted(tracker.snapshot()) == sorted((row_idx, user, tag) for row_idx, row in labels.items()
+                                                for user, tag in row.items())
+
+
+def test_rebuild_replays_annotations_and_dynamic_rows_use_one_group():
+    tracker = agreement.AgreementTracker()
+    tracker.rebuild(raters_per_row=2, annotations=[(0, "ann", "Yes"), (0, "bob", "No"), (1, "ann", "Yes"),
+                                                   (1, "bob", "Yes"), (0, "bob", "Yes")])
+    assert tracker.conflict_rows() == []
+    assert tracker.set_stats() == [{"Set": -1, "Users": 2, "Fully Rated Rows": 2, "Conflicting Rows": 0,
+                                    "Fleiss' Kappa": None}]
+    assert tracker.summary() == {"labelled_rows": 2, "conflicting_rows": 0, "pairs": 1}
+
+
+def test_export_conflicts(tmp_path):
+    news_data = item_store.ItemStore.from_frame(pd.DataFrame({
+        "URL": [f"https://news.example.com/{i}" for i in range(10)],
+        "Company Name": ["Acme"] * 10,
+        "Tag": [None] * 10,
+    }))
+    tracker = agreement.AgreementTracker()
+    tracker.rebuild(SETS, SET_TO_USERS, [(7, "bob", "No"), (7, "ann", "Yes"), (2, "ann", "Yes"), (2, "cat", "Yes"),
+                                         (12, "ann", "Yes"), (12, "bob", "No")])
+    path, written = agreement.export_conflicts(lambda fraction, message: None, tracker, news_data, "csv",
+                                               export_dir=str(tmp_path))
+    assert written == 1
+    df = pd.read_csv(path)
+    assert df["Row"].tolist() == [7]
+    assert df["Set"].tolist() == [1]
+    assert df["Labels"].tolist() == ["ann=Yes; bob=No"]
@@ -0,0 +1,93 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import auth
+import storage
+
+
+@pytest.fixture
+def store(tmp_path, request):
+    backend = getattr(request, "param", "csv")
+    store = storage.open_storage(backend, str(tmp_path / "tagging.db"),
+                                 credentials_file=str(tmp_path / "user_credentials.csv"))
+    yield store
+    store.close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(auth, "_credentials", {})
+    monkeypatch.setattr(auth, "_credentials_version", None)
+
+
+@pytest.mark.parametrize("store", ["csv", "sqlite"], indirect=True)
+def test_only_hashes_are_stored(store, tmp_path):
+    store.save_credentials(auth.hash_credentials(["alice", "bob"], ["s3cret-a", "s3cret-b"]))
+
+    stored = (tmp_path / "user_credentials.csv").read_bytes() if isinstance(store, storage.FileStorage) \
+        else (tmp_path / "tagging.db").read_bytes()
+    assert b"s3cret" not in stored
+    assert auth.authenticate(store, "alice", "s3cret-a") == (True, "Login successful!")
+    assert auth.authenticate(store, "bob", "s3cret-a") == (False, "Incorrect password.")
+    assert auth.authenticate(store, "carol", "s3cret-a") == (False, "Account ID not found.")
+
+
+def test_plaintext_credentials_file_is_hashed_on_first_read(store, tmp_path):
+    pd.DataFrame({"account_id": ["alice"], "password": ["s3cret-a"]}).to_csv(store.credentials_file, index=False)
+
+    assert auth.authenticate(store, "alice", "s3cret-a")[0]
+    assert b"s3cret" not in (tmp_path / "user_credentials.csv").read_bytes()
+    assert auth.authenticate(store, "alice", "s3cret-a")[0]
+
+
+def test_plaintext_credentials_table_is_hashed_on_open(tmp_path):
+    import sqlite3
+    db_path = str(tmp_path / "tagging.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE credentials (account_id TEXT PRIMARY KEY, password TEXT NOT NULL)")
+    conn.execute("INSERT INTO credentials VALUES ('alice', 's3cret-a')")
+    conn.commit()
+    conn.close()
+
+    store = storage.SqliteStorage(db_path, str(tmp_path / "out.csv"), None)
+    try:
+        assert store.credentials_version() is not None
+        assert auth.authenticate(store, "alice", "s3cret-a")[0]
+        assert not auth.authenticate(store, "alice", "wrong")[0]
+        assert "s3cret-a" not in str(store._connect().execute("SELECT * FROM credentials").fetchall())
+    finally:
+        store.close()
+
+
+def test_login_hashes_only_the_candidate_password(store, monkeypatch):
+    store.save_credentials(auth.hash_credentials([f"user{i}" for i in range(20)], ["pw"] * 20))
+    hashed = []
+    original = auth.hash_password
+    monkeypatch.setattr(auth, "hash_password", lambda password, salt: hashed.append(password) or original(password, salt))
+
+    assert auth.authenticate(store, "user3", "pw")[0]
+    assert auth.authenticate(store, "user4", "nope") == (False, "Incorrect password.")
+    assert hashed == ["pw", "nope"]
+
+
+def test_concurrent_logins_load_the_index_once(store, monkeypatch):
+    store.save_credentials(auth.hash_credentials(["alice"], ["pw"]))
+    reads = []
+    read_credentials = store.read_credentials
+    monkeypatch.setattr(store, "read_credentials", lambda: reads.append(1) or read_credentials())
+    start = threading.Barrier(8)
+    results = []
+
+    def login():
+        start.wait()
+        results.append(auth.authenticate(store, "alice", "pw")[0])
+
+    threads = [threading.Thread(target=login) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [True] * 8
+    assert len(reads) == 1
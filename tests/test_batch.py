@@ -0,0 +1,96 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+import auth
+from conftest import login, upload
+
+
+def expire(token):
+    account_id, _ = auth._sessions[token]
+    auth._sessions[token] = (account_id, 0)
+
+
+def test_login_and_single_tags_claim_one_row_at_a_time(start_app, tmp_path):
+    app = start_app(dynamic=True)
+    passwords = upload(app, tmp_path, ["alice", "bob"], num_rows=30)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    assert len(rows) == 1 and app.work_queue.remaining() == 29
+
+    # The batch panel is closed: the page is not built and nothing more is claimed
+    assert app.batch_page_if_open(token, current_idx, False) == (app.gr.update(), app.gr.update())
+    assert app.work_queue.remaining() == 29
+
+    page, rows = app.batch_page_if_open(token, current_idx, True)
+    assert len(page) == app.page_size and rows is app.user_to_rows["alice"]
+    assert app.work_queue.remaining() == 30 - app.page_size
+
+
+def test_submit_page_stores_tags_from_the_top(start_app, tmp_path):
+    app = start_app(dynamic=True)
+    passwords = upload(app, tmp_path, ["alice"], num_rows=30)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    page, rows = app.batch_page(token, current_idx)
+    page["Tag"] = ["yes", "No", ""] + ["Yes"] * (len(page) - 3)
+
+    result = asyncio.run(app.submit_page(token, rows, current_idx, page))
+    status, next_page, current_idx = result[0], result[1], result[5]
+    assert status == "**Saved 2 tag(s).**" and current_idx == 2
+    assert [app.news_data[row_idx]["Tag"] for row_idx in page["Row"][:3]] == ["Yes", "No", None]
+    assert next_page["Row"].tolist()[0] == page["Row"][2]
+    assert app.user_progress["alice"] == 2
+
+
+def test_expired_session_releases_unfinished_claims(start_app, tmp_path):
+    app = start_app(dynamic=True)
+    passwords = upload(app, tmp_path, ["alice", "bob"], num_rows=30)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    page, rows = app.batch_page(token, current_idx)
+    asyncio.run(app.submit_page(token, rows, current_idx, page.assign(Tag=["Yes"] + [""] * (len(page) - 1))))
+    # Refreshing the page after the tag claimed one more row
+    assert app.work_queue.remaining() == 30 - app.page_size - 1
+
+    expire(token)
+    assert app.auth.check_session(token) is None
+    for account_id in auth.expire_sessions():
+        app.release_expired_claims(account_id)
+
+    # Only the tagged row stays claimed; the rest of the page goes to the next annotator
+    assert app.user_to_rows["alice"] == [page["Row"][0]]
+    assert app.work_queue.remaining() == 29
+    bob_token, _, bob_idx = login(app, "bob", passwords["bob"])
+    bob_page, _ = app.batch_page(bob_token, bob_idx)
+    assert set(bob_page["Row"]) == set(page["Row"][1:]) | {bob_page["Row"].iloc[-1]}
+
+
+def test_expire_sessions_reports_users_without_a_live_session():
+    auth.revoke_all_sessions()
+    stale = auth.issue_session("alice")
+    auth.issue_session("alice")
+    gone = auth.issue_session("bob")
+    expire(stale)
+    expire(gone)
+    assert auth.expire_sessions() == {"bob"}
+    assert auth.check_session(stale) is None and auth.check_session(gone) is None
+    assert auth.expire_sessions() == set()
+
+
+def test_batch_page_without_session_is_empty(start_app, tmp_path):
+    app = start_app(dynamic=True)
+    upload(app, tmp_path, ["alice"], num_rows=5)
+    page, rows = app.batch_page("not-a-token", 0)
+    assert isinstance(page, pd.DataFrame) and page.empty and rows is None
+    assert app.work_queue.remaining() == 5
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_batch_page_keeps_headlines_after_restart(start_app, tmp_path, backend):
+    app = start_app(backend)
+    passwords = upload(app, tmp_path, ["alice"])
+    app.compact_results()
+
+    app = start_app(backend)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    page, rows = app.batch_page(token, current_idx)
+    assert page["Headline"].tolist() == [f"Headline number {row_idx}" for row_idx in page["Row"]]
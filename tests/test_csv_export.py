@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+
+import csv_export
+
+ROWS = 23
+
+
+def articles():
+    return pd.DataFrame({
+        "ArticleID": [i if i % 5 else None for i in range(1, ROWS + 1)],
+        "Company": ["Acme Corp" if i % 3 else "Globex" for i in range(ROWS)],
+        "Date": ["2024-01-%02d" % (i % 28 + 1) if i % 4 else None for i in range(ROWS)],
+        "URL": [f"https://news.example.com/{i}" if i % 2 else None for i in range(ROWS)],
+        "Title": [f"Title, number {i}\x00" if i % 7 else None for i in range(ROWS)],
+        "Body": [f"Body `{i}`, " * 10 if i % 6 else None for i in range(ROWS)],
+        # Integers with gaps: a batch without a gap must not write them differently from one with
+        "hiddenMarker": pd.Series([3 if i % 8 else None for i in range(ROWS)], dtype=object),
+    })
+
+
+@pytest.mark.parametrize("ext", [".xlsx", ".csv", ".parquet"])
+def test_output_does_not_depend_on_chunk_size(tmp_path, ext):
+    input_file = tmp_path / f"input{ext}"
+    df = articles()
+    if ext == ".xlsx":
+        df.to_excel(input_file, index=False)
+    elif ext == ".csv":
+        df.to_csv(input_file, index=False)
+    else:
+        df.to_parquet(input_file, index=False)
+
+    outputs = []
+    for chunk_size in (7, csv_export.CHUNK_SIZE):
+        output_file = tmp_path / f"output_{chunk_size}.csv"
+        assert csv_export.export_csv(str(input_file), str(output_file), chunk_size=chunk_size) == ROWS
+        outputs.append(output_file.read_text(encoding="utf-8"))
+
+    assert outputs[0] == outputs[1]
+    written = pd.read_csv(tmp_path / "output_7.csv", dtype=object)
+    assert written["Index"].tolist() == [str(i) for i in range(1, ROWS + 1)]
+    assert set(written["HiddenMarker"].dropna()) == {"3"}
+
+
+def test_missing_url_gets_generated_link():
+    df = articles().iloc[1:3]
+    out = csv_export.transform_batch(df, first_index=5)
+    assert out["Index"].tolist() == [5, 6]
+    assert out["Title"][0] == "Title number 1..."
+    assert out["Body"][0].endswith("...`https://news.example.com/1")
+    assert out["Body"][1].endswith("...`" + csv_export.COMMON_PREFIX + "3_acme_corp_2024-01-03")
+
+
+def test_date_strings_are_parsed_the_same_in_every_chunk(tmp_path):
+    df = articles()
+    # Dates with and without a time: pandas would infer the format from each chunk's first date
+    df["Date"] = ["2024-01-05 10:30:00" if i % 3 else "2024-02-0%d" % (i % 9 + 1) for i in range(ROWS)]
+    df.loc[4, "Date"] = "05/01/2024"
+    input_file = tmp_path / "input.csv"
+    df.to_csv(input_file, index=False)
+
+    outputs = []
+    for chunk_size in (5, csv_export.CHUNK_SIZE):
+        output_file = tmp_path / f"output_{chunk_size}.csv"
+        csv_export.export_csv(str(input_file), str(output_file), chunk_size=chunk_size)
+        outputs.append(pd.read_csv(output_file, dtype=object))
+
+    pd.testing.assert_frame_equal(outputs[0], outputs[1])
+    dates = outputs[0]["Date"]
+    assert dates[1] == "2024-01-05" and dates[3] == "2024-02-04"
+    assert pd.isna(dates[4])
+
+    output_file = tmp_path / "output_dayfirst.csv"
+    df["Date"] = "05/01/2024"
+    df.to_csv(input_file, index=False)
+    csv_export.export_csv(str(input_file), str(output_file), chunk_size=5, date_format="%d/%m/%Y")
+    assert set(pd.read_csv(output_file)["Date"]) == {"2024-01-05"}
+
+
+def test_hidden_marker_is_written_as_in_the_input():
+    df = articles().iloc[:3].assign(hiddenMarker=pd.Series([3, None, 1.5], dtype=object))
+    out = csv_export.transform_batch(df)
+    lines = out.to_csv(index=False).splitlines()[1:]
+    assert [line.rsplit(",", 1)[1] for line in lines] == ["3", "", "1.5"]
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+import dedup
+
+
+def test_url_slugs_differing_by_one_word_are_not_merged():
+    df = pd.DataFrame({
+        "URL": ["https://news.example.com/acme-quarterly-results-live-updates-from-the-earnings-call-day-1",
+                "https://news.example.com/acme-quarterly-results-live-updates-from-the-earnings-call-day-2"],
+        "Company Name": ["Acme", "Acme"],
+    })
+    assert dedup.find_duplicates(df).tolist() == [-1, -1]
+
+
+def test_urls_without_headline_match_when_normalized_equal():
+    df = pd.DataFrame({
+        "URL": ["https://www.news.example.com/acme-profit/?utm_source=x",
+                "http://news.example.com/acme-profit#comments",
+                "https://news.example.com/acme-loss"],
+        "Company Name": ["Acme", "acme", "Acme"],
+    })
+    assert dedup.find_duplicates(df).tolist() == [-1, 0, -1]
+
+
+def test_near_duplicate_headlines_are_merged_per_company():
+    headline = "Acme reports record quarterly profit as sales in Europe and Asia keep growing"
+    df = pd.DataFrame({
+        "URL": ["https://a.example.com/1", "https://b.example.com/2", "https://c.example.com/3",
+                "https://d.example.com/4"],
+        "Company Name": ["Acme", "Acme", "Globex", "Acme"],
+        "Headline": [headline, headline + " again", headline, "Acme opens a new office in Berlin"],
+    })
+    assert dedup.find_duplicates(df).tolist() == [-1, 0, -1, -1]
+
+
+def test_missing_headlines_fall_back_to_url_matching_only():
+    df = pd.DataFrame({
+        "URL": ["https://news.example.com/2024/05/acme-reports-record-quarterly-profit-in-europe-and-asia",
+                "https://news.example.com/2024/06/acme-reports-record-quarterly-profit-in-europe-and-asia"],
+        "Company Name": ["Acme", "Acme"],
+        "Headline": [None, np.nan],
+    })
+    assert dedup.find_duplicates(df).tolist() == [-1, -1]
+
+
+def test_near_duplicates_behind_an_outlier_first_row_are_merged(monkeypatch):
+    # Rows 1 and 2 agree on 52 of 64 hashes, but every band they share also holds row 0, which is first in
+    # each of those buckets and agrees with them on only 16
+    close = np.arange(dedup.NUM_PERM, dtype=np.uint32)
+    other = close.copy()
+    other[4 * np.arange(4, 16)] += 1000
+    outlier = np.where(np.arange(dedup.NUM_PERM) < 16, close, close + 5000).astype(np.uint32)
+    monkeypatch.setattr(dedup, "minhash_signatures", lambda token_lists, num_perm: np.stack([outlier, close, other]))
+    df = pd.DataFrame({
+        "URL": ["https://a.example.com/1", "https://b.example.com/2", "https://c.example.com/3"],
+        "Company Name": ["Acme"] * 3,
+        "Headline": ["Acme opens a new plant in Ohio", "Acme reports record quarterly profit today",
+                     "Acme reports record quarterly profits today"],
+    })
+    assert dedup.find_duplicates(df).tolist() == [-1, -1, 1]
+
+
+def test_candidate_pairs_cover_small_buckets_completely():
+    keys = np.array([7, 3, 7, 7, 3, 9], dtype=np.int64)
+    first, other = dedup._candidate_pairs(keys)
+    assert set(zip(first.tolist(), other.tolist())) == {(0, 2), (0, 3), (2, 3), (1, 4)}
+    # Beyond the cap each row is still paired with the first row and its predecessor
+    first, other = dedup._candidate_pairs(np.zeros(5, dtype=np.int64), max_bucket=2)
+    assert set(zip(first.tolist(), other.tolist())) == {(0, 1), (0, 2), (0, 3), (0, 4), (1, 2), (2, 3), (3, 4)}
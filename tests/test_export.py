@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import export
+import item_store
+import metrics
+
+T0 = 1700000000.0
+
+
+@pytest.fixture
+def news_data():
+    df = pd.DataFrame({
+        "URL": [f"https://news.example.com/{i}" for i in range(6)],
+        "Company Name": ["Acme", "Acme", "Globex", "Globex", "Initech", "Acme"],
+        "Tag": [None] * 6,
+        export.DUPLICATE_OF: pd.array([None, None, None, None, None, 0], dtype="Int64"),
+    })
+    items = item_store.ItemStore.from_frame(df)
+    for row_idx, tag, account_id, tagged_at in [(0, "Yes", "alice", T0), (1, "No", "bob", T0 + 60),
+                                                (2, "Yes", "bob", T0 + 120), (3, "No", "alice", T0 + 180)]:
+        items[row_idx]['Tag'] = tag
+        items[row_idx][export.TAGGED_BY] = account_id
+        items[row_idx][export.TAGGED_AT] = tagged_at
+    return items
+
+
+def export_frame(news_data, rows=None, **filters):
+    rows = range(len(news_data)) if rows is None else rows
+    chunks = list(export.iter_export_chunks(news_data, rows, chunk_size=2, **filters))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def test_duplicates_take_the_tag_of_their_representative(news_data):
+    df = export_frame(news_data)
+    assert df["Row"].tolist() == list(range(6))
+    assert df["Tag"].fillna(export.UNTAGGED).tolist() == ["Yes", "No", "Yes", "No", export.UNTAGGED, "Yes"]
+    assert df[export.TAGGED_BY].tolist()[5] == "alice"
+    assert df[export.TAGGED_AT].tolist()[0] == "2023-11-14 22:13:20"
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"tags": ["Yes"]}, [0, 2, 5]),
+    ({"tags": [export.UNTAGGED]}, [4]),
+    ({"users": ["bob"]}, [1, 2]),
+    ({"start": T0 + 60, "end": T0 + 180}, [1, 2]),
+    ({"users": ["alice"], "tags": ["No"]}, [3]),
+])
+def test_filters(news_data, filters, expected):
+    assert export_frame(news_data, **filters)["Row"].tolist() == expected
+
+
+def test_set_selection_and_empty_result(news_data):
+    rows = export.select_rows(len(news_data), [np.array([0, 2, 4]), np.array([1, 3, 5])], [1])
+    assert export_frame(news_data, rows)["Row"].tolist() == [1, 3, 5]
+    assert export_frame(news_data, tags=["Maybe"]).empty
+
+
+@pytest.mark.parametrize("fmt", export.EXPORT_FORMATS)
+def test_formats_hold_the_same_rows(news_data, tmp_path, fmt):
+    path, written = export.export_results(lambda fraction, message: None, news_data, fmt, range(len(news_data)),
+                                          tags=["Yes", export.UNTAGGED], export_dir=str(tmp_path))
+    assert written == 4 and path.endswith("." + fmt)
+    read = {"csv": pd.read_csv, "parquet": pd.read_parquet, "xlsx": pd.read_excel}[fmt]
+    df = read(path)
+    assert df.columns.tolist() == ["Row"] + export.item_columns(news_data)
+    assert df["Row"].tolist() == [0, 2, 4, 5]
+    assert df["Tag"].fillna(export.UNTAGGED).tolist() == ["Yes", "Yes", export.UNTAGGED, "Yes"]
+
+
+def test_export_metrics_count_the_rows_written(news_data, tmp_path):
+    metrics.reset()
+    export.export_results(lambda fraction, message: None, news_data, "csv", range(len(news_data)),
+                          tags=["No"], export_dir=str(tmp_path))
+    assert metrics.snapshot()["export.export_results"]["rows_scanned"] == 2
+
+
+def test_parse_helpers():
+    assert export.parse_list(" a, ,b ") == ["a", "b"]
+    assert export.parse_time("") is None
+    assert export.parse_time("1700000000") == T0
+    assert export.parse_time("2023-11-14 22:13:20") == T0
+    with pytest.raises(ValueError):
+        export.write_chunks("out.txt", "txt", [], [])
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import merge
+
+
+def merge_groups_loop(combined_df, special_col):
+    """The per-group loop merge_groups replaced, as a reference."""
+    merged_rows = []
+    skipped_a_values = []
+    for name, group in combined_df.groupby(['A', 'B', 'C'], as_index=False):
+        non_special_cols = [col for col in group.columns if col not in ['A', 'B', 'C', special_col, 'file_id']]
+        if any(group[col].nunique(dropna=False) > 1 for col in non_special_cols):
+            skipped_a_values.append(name[0])
+            continue
+        special_values = group[[special_col, 'file_id']].dropna(subset=[special_col])
+        special_combined = ', '.join(f"{val}-{file_id}" for val, file_id
+                                     in zip(special_values[special_col], special_values['file_id']))
+        merged_row = {'A': name[0], 'B': name[1], 'C': name[2], special_col: special_combined}
+        for col in non_special_cols:
+            merged_row[col] = group[col].iloc[0] if not group[col].isna().all() else ''
+        merged_rows.append(merged_row)
+    return pd.DataFrame(merged_rows) if merged_rows else pd.DataFrame(), skipped_a_values
+
+
+def random_frame(rng, rows, special_density=0.5, nan_keys=True):
+    def keys(values):
+        column = rng.choice(values, rows).astype(object)
+        if nan_keys:
+            column[rng.random(rows) < 0.05] = np.nan
+        return column
+
+    special = rng.choice(["x", "y", "z"], rows).astype(object)
+    special[rng.random(rows) >= special_density] = np.nan
+    return pd.DataFrame({
+        "A": keys([1, 2, 3]),
+        "B": keys(["b1", "b2"]),
+        "C": keys([10, 20]),
+        "S": special,
+        # Mostly constant per key, so that some groups merge and others conflict
+        "D": np.where(rng.random(rows) < 0.9, 7.0, np.nan),
+        "E": rng.choice(["e", "e", "e", "f"], rows),
+        "file_id": rng.integers(1, 4, rows),
+    })
+
+
+def assert_matches_loop(combined_df):
+    merged_df, skipped_df = merge.merge_groups(combined_df, "S")
+    expected_df, skipped_a_values = merge_groups_loop(combined_df, "S")
+    pd.testing.assert_frame_equal(merged_df, expected_df)
+    assert skipped_df["A"].tolist() == skipped_a_values
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_merge_groups_matches_the_per_group_loop(seed):
+    rng = np.random.default_rng(seed)
+    assert_matches_loop(random_frame(rng, int(rng.integers(1, 60)), special_density=rng.choice([0.0, 0.3, 1.0])))
+
+
+def test_special_column_without_values():
+    combined_df = pd.DataFrame({"A": [1, 2], "B": [1, 1], "C": [1, 1], "S": [np.nan, np.nan], "file_id": [1, 2]})
+    merged_df, skipped_df = merge.merge_groups(combined_df, "S")
+    assert merged_df["S"].tolist() == ["", ""]
+    assert skipped_df.empty
+    assert_matches_loop(combined_df)
+
+
+def test_special_values_are_labelled_in_row_order():
+    combined_df = pd.DataFrame({"A": [1, 1, 2, 1], "B": [1, 1, 1, 1], "C": [1, 1, 1, 1], "S": ["p", np.nan, "q", "r"],
+                                "D": ["d", "d", np.nan, "d"], "file_id": [1, 2, 2, 3]})
+    merged_df, skipped_df = merge.merge_groups(combined_df, "S")
+    assert merged_df.to_dict("records") == [{"A": 1, "B": 1, "C": 1, "S": "p-1, r-3", "D": "d"},
+                                            {"A": 2, "B": 1, "C": 1, "S": "q-2", "D": ""}]
+    assert skipped_df.empty
+
+
+def test_conflicting_groups_are_skipped_with_their_columns():
+    combined_df = pd.DataFrame({"A": [1, 1, 2], "B": [1, 1, 1], "C": [1, 1, 1], "S": ["p", "q", "r"],
+                                "D": ["d", "e", "d"], "E": [1, np.nan, 1], "file_id": [1, 2, 1]})
+    merged_df, skipped_df = merge.merge_groups(combined_df, "S")
+    assert merged_df["A"].tolist() == [2]
+    assert skipped_df.to_dict("records") == [{"A": 1, "B": 1, "C": 1, merge.SKIPPED_REASON: "D, E"}]
+
+
+def write_streaming_inputs(tmp_path):
+    # 20 keys per file, half of them without a special value
+    paths = []
+    for file_id in (1, 2):
+        path = tmp_path / f"input{file_id}.csv"
+        pd.DataFrame({"A": range(20), "B": ["b"] * 20, "C": [file_id % 2] * 20,
+                      "S": [f"s{i}" if i % 2 else None for i in range(20)], "D": ["d"] * 20}).to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_streaming_merge_matches_the_in_memory_merge(tmp_path):
+    paths = write_streaming_inputs(tmp_path)
+    output_file = str(tmp_path / "out.csv")
+    merge.merge_streaming(paths, "S", output_file, partitions=8, chunk_size=7)
+
+    streamed = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+    combined_df = pd.concat([pd.read_csv(path, dtype=str).assign(file_id=i) for i, path in enumerate(paths, 1)],
+                            ignore_index=True)
+    expected, _ = merge.merge_groups(combined_df, "S")
+    streamed = streamed.sort_values(merge.KEY_COLS, ignore_index=True)
+    pd.testing.assert_frame_equal(streamed, expected.astype(str).sort_values(merge.KEY_COLS, ignore_index=True))
+    assert sorted(tmp_path.iterdir()) == sorted([tmp_path / "input1.csv", tmp_path / "input2.csv",
+                                                  tmp_path / "out.csv", tmp_path / "out_skipped.csv"])
+
+
+def test_failed_streaming_merge_keeps_the_previous_output(tmp_path, monkeypatch):
+    paths = write_streaming_inputs(tmp_path)
+    output_file = tmp_path / "out.csv"
+    output_file.write_text("previous\n")
+    calls = []
+
+    def failing_merge_groups(combined_df, special_col):
+        calls.append(len(combined_df))
+        if len(calls) == 3:
+            raise RuntimeError("disk full")
+        return merge_groups(combined_df, special_col)
+
+    merge_groups = merge.merge_groups
+    monkeypatch.setattr(merge, "merge_groups", failing_merge_groups)
+    with pytest.raises(SystemExit):
+        merge.merge_streaming(paths, "S", str(output_file), partitions=8)
+    assert output_file.read_text() == "previous\n"
+    assert not (tmp_path / "out_skipped.csv").exists()
+    assert not list(tmp_path.glob("*.partial.*"))
+
+
+def write_workbooks(tmp_path, special_values):
+    paths = []
+    for file_id, values in enumerate(special_values, start=1):
+        path = tmp_path / f"sheet{file_id}.xlsx"
+        pd.DataFrame({"A": range(len(values)), "B": ["b"] * len(values), "C": [1] * len(values), "S": values,
+                      "D": ["d"] * len(values)}).to_excel(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+def test_incremental_merge_matches_a_full_merge_after_an_edit(tmp_path):
+    paths = write_workbooks(tmp_path, [["p", None, "q", None], ["r", None, None, "s"]])
+    output_file, full_file = str(tmp_path / "out.csv"), str(tmp_path / "full.csv")
+    merge.merge_incremental(paths, "S", output_file, workers=1)
+
+    # The edited keys have no special value in any input
+    pd.DataFrame({"A": range(4), "B": ["b"] * 4, "C": [1] * 4, "S": ["r", None, None, "s"],
+                  "D": ["d", "e", "d", "d"]}).to_excel(paths[1], index=False)
+    df = pd.read_excel(paths[0])
+    df.loc[2, "S"] = None
+    df.to_excel(paths[0], index=False)
+    merge.merge_incremental(paths, "S", output_file, workers=1)
+    merge.merge_excel_sheets(paths, "S", full_file, workers=1)
+
+    with open(output_file, "rb") as incremental, open(full_file, "rb") as full:
+        assert incremental.read() == full.read()
+    skipped = pd.read_csv(merge.skipped_path(output_file))
+    assert skipped[["A", merge.SKIPPED_REASON]].values.tolist() == [[1, "D"]]
+
+
+def test_globs_and_sheets_give_file_ids_in_input_order(tmp_path):
+    for name, values in (("b.xlsx", ["q"]), ("a.xlsx", ["p"])):
+        with pd.ExcelWriter(tmp_path / name) as writer:
+            for sheet in ("one", "two"):
+                pd.DataFrame({"A": [1], "B": [1], "C": [1], "S": [f"{values[0]}{sheet}"]}).to_excel(
+                    writer, sheet_name=sheet, index=False)
+    (tmp_path / "c.xlsx").write_bytes((tmp_path / "a.xlsx").read_bytes())
+
+    paths = merge.expand_inputs([str(tmp_path / "c.xlsx"), str(tmp_path / "[ab].xlsx")])
+    assert [path.rsplit("/", 1)[1] for path in paths] == ["c.xlsx", "a.xlsx", "b.xlsx"]
+    assert merge.list_sources(paths[:1], merge.ALL_SHEETS) == [(paths[0], "one"), (paths[0], "two")]
+    with pytest.raises(FileNotFoundError):
+        merge.expand_inputs([str(tmp_path / "*.csv")])
+
+    output_file = str(tmp_path / "out.csv")
+    merge.merge_excel_sheets([str(tmp_path / "[ab].xlsx")], "S", output_file, sheets=merge.ALL_SHEETS, workers=2)
+    assert pd.read_csv(output_file)["S"].tolist() == ["pone-1, ptwo-2, qone-3, qtwo-4"]
+    merge.merge_excel_sheets([str(tmp_path / "b.xlsx")], "S", output_file, sheets=["two"], workers=1)
+    assert pd.read_csv(output_file)["S"].tolist() == ["qtwo-1"]
@@ -0,0 +1,22 @@
+import pytest
+
+import merge_bench
+
+
+@pytest.mark.parametrize("nan_density", [0.05, 1.0])
+def test_bench_runs_at_every_nan_density(tmp_path, nan_density):
+    generated = merge_bench.generate_inputs(str(tmp_path / "data"), 400, files=2, nan_density=nan_density)
+    result = merge_bench.run_merge(generated["files"], str(tmp_path / "merged.csv"))
+    assert result["output_bytes"] > 0
+    assert set(result["phases"]) == set(merge_bench.PHASES)
+
+
+def test_runs_are_compared_per_row_count_and_nan_density():
+    def results(*runs):
+        return {"runs": [{"config": {"rows": rows, "nan_density": nan_density}, "total_s": total_s,
+                          "peak_rss_mb": 100.0, "phases": {}} for rows, nan_density, total_s in runs]}
+
+    compared = merge_bench.compare(results((100, 0.05, 2.0), (100, 1.0, 1.0)),
+                                   results((100, 0.05, 1.0), (100, 1.0, 1.0)), tolerance=0.1)
+    regressed = {metric for metric, _, _, _, regressed in compared if regressed}
+    assert regressed == {"100.nan0.05.total_s"}
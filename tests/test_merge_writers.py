@@ -0,0 +1,89 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl.utils.escape import unescape
+
+import merge_writers
+
+TEXT = ["plain", "", "a & <b>", None, "_x0041_", "_X00ff_ and _x0041", "bell\x07"]
+
+
+def frame():
+    return pd.DataFrame({
+        "int": [1, 2, 3],
+        "float": [0.25, np.nan, 3.0],
+        "bool": [True, False, True],
+        "date": pd.to_datetime(["2024-01-02 03:04:05", None, "2024-12-31 00:00:00"]),
+        "mixed": ["text", 5, datetime.date(2024, 2, 1)],
+    })
+
+
+def test_xlsx_round_trip(tmp_path):
+    path = str(tmp_path / "out.xlsx")
+    df = frame()
+    with merge_writers.open_writer(path, df.columns) as writer:
+        writer.write(df.iloc[:2])
+        writer.write(df.iloc[2:])
+    assert writer.rows == 3
+
+    read = pd.read_excel(path)
+    assert read.columns.tolist() == df.columns.tolist()
+    assert read["int"].tolist() == [1, 2, 3]
+    assert read["float"].tolist()[::2] == [0.25, 3.0] and np.isnan(read["float"][1])
+    assert read["bool"].tolist() == [True, False, True]
+    assert read["date"].tolist()[::2] == df["date"].tolist()[::2] and pd.isna(read["date"][1])
+    assert read["mixed"].tolist() == ["text", 5, datetime.datetime(2024, 2, 1)]
+
+
+@pytest.mark.parametrize("dtype", [object, "string"])
+def test_xlsx_text_is_escaped_the_way_excel_decodes_it(tmp_path, dtype):
+    path = str(tmp_path / "out.xlsx")
+    with merge_writers.open_writer(path, ["text"]) as writer:
+        writer.write(pd.DataFrame({"text": pd.Series(TEXT, dtype=dtype)}))
+
+    # openpyxl leaves inline strings encoded; unescape decodes them the way Excel does
+    stored = pd.read_excel(path, dtype=object, keep_default_na=False)["text"].tolist()
+    assert [unescape(value) for value in stored] == [value or "" for value in TEXT]
+
+
+def test_xlsx_continues_on_a_new_sheet(tmp_path, monkeypatch):
+    monkeypatch.setattr(merge_writers, "XLSX_MAX_ROWS", 4)
+    path = str(tmp_path / "out.xlsx")
+    with merge_writers.open_writer(path, ["n"]) as writer:
+        writer.write(pd.DataFrame({"n": range(5)}))
+        writer.write(pd.DataFrame({"n": range(5, 7)}))
+
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == ["Sheet1", "Sheet2", "Sheet3"]
+    assert [sheet["n"].tolist() for sheet in sheets.values()] == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+@pytest.mark.parametrize("ext", [".csv", ".parquet"])
+def test_chunks_are_appended_with_fixed_columns(tmp_path, ext):
+    path = str(tmp_path / f"out{ext}")
+    with merge_writers.open_writer(path, ["a", "b"]) as writer:
+        writer.write(pd.DataFrame({"b": ["x", ""], "a": [1, 2]}))
+        writer.write(pd.DataFrame({"a": [3]}))
+    read = pd.read_csv(path, dtype=str) if ext == ".csv" else pd.read_parquet(path)
+    assert read["a"].tolist() == ["1", "2", "3"]
+    assert read["b"].fillna("").tolist() == ["x", "", ""]
+
+
+def test_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        merge_writers.open_writer(str(tmp_path / "out.json"), ["a"])
+
+
+def test_replace_on_success(tmp_path):
+    path = tmp_path / "out.csv"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with merge_writers.replace_on_success(str(path)) as tmp_path_:
+            open(tmp_path_, "w").write("partial")
+            raise RuntimeError
+    assert path.read_text() == "old" and not (tmp_path / "out.partial.csv").exists()
+    with merge_writers.replace_on_success(str(path)) as tmp_path_:
+        open(tmp_path_, "w").write("new")
+    assert path.read_text() == "new"
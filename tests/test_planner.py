@@ -0,0 +1,52 @@
+import numpy as np
+
+import planner
+
+
+def test_plan_gives_every_set_distinct_users():
+    sets, set_to_users, user_to_rows = planner.plan_assignments(10, ["a", "b", "c"], 3, 2, seed=1)
+    assert sorted(np.concatenate(sets).tolist()) == list(range(10))
+    assert all(len(set(users)) == 2 for users in set_to_users.values())
+    for account_id, rows in user_to_rows.items():
+        expected = sorted(row for set_idx, users in set_to_users.items() if account_id in users for row in sets[set_idx])
+        assert rows.tolist() == expected
+
+
+def test_work_queue_hands_each_row_to_replication_users():
+    queue = planner.WorkQueue(range(4), replication=2)
+    taken = {user: [] for user in ("a", "b", "c")}
+    for _ in range(4):
+        for user, rows in taken.items():
+            row_idx = queue.next_row(user)
+            if row_idx is not None:
+                rows.append(row_idx)
+    assert all(len(rows) == len(set(rows)) for rows in taken.values())
+    assert sorted(row for rows in taken.values() for row in rows) == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert queue.remaining() == 0
+
+
+def test_released_rows_are_offered_again_first():
+    queue = planner.WorkQueue([5, 6, 7])
+    assert queue.next_row("a") == 5
+    assert queue.next_row("a") == 6
+    queue.release("a", 6)
+    assert queue.next_row("b") == 6
+    assert queue.next_row("b") == 7
+    assert queue.next_row("a") is None
+
+
+def test_claim_skips_rows_outside_the_queue_and_repeats():
+    queue = planner.WorkQueue([1, 3], replication=1)
+    assert queue.claim("a", 1)
+    assert not queue.claim("a", 1)
+    assert not queue.claim("a", 2)
+    assert queue.remaining() == 1
+
+
+def test_restore_work_queue_claims_stored_labels():
+    annotations = [(0, "a", "Yes"), (2, "b", "No"), (0, "a", "No"), (9, "a", "Yes")]
+    queue, user_to_rows = planner.restore_work_queue([0, 1, 2, 3], 1, ["a", "b", "c"], annotations)
+    # Relabelling a row does not claim it twice; rows outside the queue (e.g. duplicates) are skipped
+    assert user_to_rows == {"a": [0], "b": [2], "c": []}
+    assert queue.remaining() == 2
+    assert [queue.next_row("c"), queue.next_row("a"), queue.next_row("b")] == [1, 3, None]
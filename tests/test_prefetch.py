@@ -0,0 +1,99 @@
+import http.server
+import socket
+import threading
+
+import pytest
+
+import prefetch
+
+
+@pytest.fixture
+def local_server():
+    """An HTTP server on 127.0.0.1 that records the paths requested and redirects /redirect to the metadata service."""
+    requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            if self.path == "/redirect":
+                self.send_response(302)
+                self.send_header("Location", "http://169.254.169.254/latest/meta-data/")
+                self.end_headers()
+                return
+            body = b"<html><body>internal</body></html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1], requests
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.1.2.3", "172.16.0.1", "192.168.1.1", "169.254.169.254",
+                                     "0.0.0.0", "100.64.0.1", "224.0.0.1", "::1", "fe80::1", "fc00::1",
+                                     "::ffff:127.0.0.1"])
+def test_internal_addresses_are_not_public(address):
+    assert not prefetch.is_public_address(address)
+
+
+@pytest.mark.parametrize("address", ["93.184.216.34", "8.8.8.8", "2606:4700:4700::1111"])
+def test_internet_addresses_are_public(address):
+    assert prefetch.is_public_address(address)
+
+
+def test_loopback_url_is_refused_before_connecting(local_server):
+    port, requests = local_server
+    with pytest.raises(ValueError, match="non-public address 127.0.0.1"):
+        prefetch.fetch_page(f"http://127.0.0.1:{port}/")
+    assert requests == []
+
+
+def test_hostname_resolving_to_internal_address_is_refused(monkeypatch):
+    def getaddrinfo(host, port, *args, **kwargs):
+        assert host == "news.example.com"
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("169.254.169.254", port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    with pytest.raises(ValueError, match="169.254.169.254"):
+        prefetch.fetch_page("http://news.example.com/article")
+
+
+def test_redirect_to_internal_address_is_refused(local_server, monkeypatch):
+    port, requests = local_server
+    resolve = socket.getaddrinfo
+    # Let the test server stand in for a public site; everything else is checked as usual
+    monkeypatch.setattr(socket, "getaddrinfo", lambda host, *args, **kwargs: resolve(
+        "127.0.0.1" if host == "news.example.com" else host, *args, **kwargs))
+    monkeypatch.setattr(prefetch, "is_public_address", lambda address: address == "127.0.0.1")
+
+    assert "internal" in prefetch.fetch_page(f"http://news.example.com:{port}/article")
+    with pytest.raises(ValueError, match="169.254.169.254"):
+        prefetch.fetch_page(f"http://news.example.com:{port}/redirect")
+    assert requests == ["/article", "/redirect"]
+
+
+def test_non_http_urls_are_refused():
+    with pytest.raises(ValueError, match="scheme 'file'"):
+        prefetch.fetch_page("file:///etc/passwd")
+
+
+def test_prefetcher_counts_refused_fetches_and_caches_nothing(local_server, tmp_path):
+    port, requests = local_server
+    cache = prefetch.PreviewCache(str(tmp_path / "cache"))
+    prefetcher = prefetch.Prefetcher(cache, workers=1)
+    try:
+        assert prefetcher.schedule([f"http://127.0.0.1:{port}/", f"http://localhost:{port}/"]) == 2
+        prefetcher.wait()
+    finally:
+        prefetcher.shutdown()
+    assert prefetcher.failed == 2 and prefetcher.fetched == 0
+    assert cache.stats()["entries"] == 0
+    assert requests == []
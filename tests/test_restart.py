@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+import export
+from conftest import login, upload
+
+
+def tag(app, token, rows, current_idx, value):
+    _, _, _, current_idx, rows = asyncio.run(app.submit_tag(token, rows, current_idx, value))
+    return rows, current_idx
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_tagging_continues_after_restart(start_app, tmp_path, backend):
+    app = start_app(backend)
+    passwords = upload(app, tmp_path, ["alice", "bob"], num_sets=2)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    rows, current_idx = tag(app, token, rows, current_idx, "Yes")
+    tagged_first = rows[0]
+    # The compactor writes the tag times to the results, which a restart then reads back
+    app.compact_results()
+
+    app = start_app(backend)
+    assert app.news_data[tagged_first]["Tag"] == "Yes"
+    assert app.news_data[tagged_first][export.TAGGED_AT] is not None
+    # Every write after a restart goes through the restored columns
+    app.writer.write("alice", rows[1], "No", 2)
+
+    assert app.user_progress["alice"] == 2
+    assert app.news_data[rows[1]]["Tag"] == "No"
+    assert app.news_data[rows[1]][export.TAGGED_BY] == "alice"
+    assert app.news_data[rows[1]][export.TAGGED_AT] is not None
+    assert app.counters.tag_count("Yes") == 1 and app.counters.tag_count("No") == 1
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_tag_log_replays_after_restart(start_app, tmp_path, backend):
+    app = start_app(backend)
+    passwords = upload(app, tmp_path, ["alice"])
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    for value in ("Yes", "No", "Yes"):
+        rows, current_idx = tag(app, token, rows, current_idx, value)
+
+    # No compaction: the file backend rebuilds the tags from its log alone
+    app = start_app(backend)
+    assert [app.news_data[row_idx]["Tag"] for row_idx in rows[:3]] == ["Yes", "No", "Yes"]
+    assert app.user_progress["alice"] == 3
+    assert sorted(tag for _, _, tag in app.store.load_annotations()) == ["No", "Yes", "Yes"]
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_fixed_assignments_survive_restart(start_app, tmp_path, backend):
+    app = start_app(backend)
+    passwords = upload(app, tmp_path, ["alice", "bob"], num_sets=2)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    rows, current_idx = tag(app, token, rows, current_idx, "Yes")
+    assigned = list(rows)
+
+    app = start_app(backend)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    assert list(rows) == assigned and current_idx == 1
+    rows, current_idx = tag(app, token, rows, current_idx, "No")
+    assert current_idx == 2
+    assert [app.news_data[row_idx]["Tag"] for row_idx in assigned[:2]] == ["Yes", "No"]
+    assert [len(rows) for rows in app.sets] == [6, 6]
+
+
+@pytest.mark.parametrize("backend", ["csv", "sqlite"])
+def test_dynamic_queue_is_rebuilt_after_restart(start_app, tmp_path, backend):
+    app = start_app(backend, dynamic=True)
+    passwords = upload(app, tmp_path, ["alice", "bob"], num_rows=6, num_users_per_set=1)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    for value in ("Yes", "No"):
+        rows, current_idx = tag(app, token, rows, current_idx, value)
+    tagged = list(rows[:2])
+    # alice holds a claim on her next row, which the restart forgets
+    assert len(rows) == 3
+
+    app = start_app(backend, dynamic=True)
+    assert app.work_queue is not None
+    assert app.user_to_rows == {"alice": tagged, "bob": []}
+    assert app.user_progress == {"alice": 2, "bob": 0}
+    assert app.work_queue.remaining() == 4
+
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    assert current_idx == 2 and rows[:2] == tagged
+    handed_out = set(tagged)
+    while current_idx < len(rows):
+        assert rows[current_idx] not in handed_out
+        handed_out.add(rows[current_idx])
+        rows, current_idx = tag(app, token, rows, current_idx, "Yes")
+    # Every row went to exactly one annotator, so nothing is left for bob
+    assert handed_out == set(range(6))
+    assert login(app, "bob", passwords["bob"])[1] == []
+
+
+def test_progress_without_tags_survives_restart(start_app, tmp_path):
+    app = start_app("csv")
+    passwords = upload(app, tmp_path, ["alice"])
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    rows, current_idx = tag(app, token, rows, current_idx, "Yes")
+    # Logging out stores progress on its own, without a tag
+    asyncio.run(app.logout_user(token, 3))
+
+    app = start_app("csv")
+    assert app.user_progress["alice"] == 3
+    assert app.news_data[rows[0]]["Tag"] == "Yes"
@@ -0,0 +1,20 @@
+import asyncio
+
+from conftest import login, upload
+
+
+def test_concurrent_submits_from_one_session_tag_consecutive_rows(start_app, tmp_path):
+    app = start_app()
+    passwords = upload(app, tmp_path, ["alice"])
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+
+    async def submit_twice():
+        # Both submits carry the same index, as two clicks before the page refreshes would
+        return await asyncio.gather(app.submit_tag(token, rows, current_idx, "Yes"),
+                                    app.submit_tag(token, rows, current_idx, "No"))
+
+    results = asyncio.run(submit_twice())
+    assert sorted(result[3] for result in results) == [1, 2]
+    assert app.user_progress["alice"] == 2
+    assert [app.news_data[row_idx]["Tag"] for row_idx in rows[:3]] == ["Yes", "No", None]
+    assert sorted(tag for _, _, tag in app.store.load_annotations()) == ["No", "Yes"]
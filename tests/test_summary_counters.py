@@ -0,0 +1,55 @@
+import asyncio
+
+import pandas as pd
+
+import item_store
+import summary_counters
+from conftest import login, upload
+
+SETS = [[0, 1, 2], [3, 4]]
+SET_TO_USERS = {0: ["alice", "bob"], 1: ["bob"]}
+
+
+def items(tags):
+    return item_store.ItemStore.from_frame(pd.DataFrame({"URL": [f"u{i}" for i in range(len(tags))],
+                                                         "Company Name": ["Acme"] * len(tags), "Tag": tags}))
+
+
+def test_users_sharing_a_set_count_their_own_tags():
+    news_data = items([None] * 5)
+    counters = summary_counters.SummaryCounters()
+    counters.rebuild(news_data, SETS, SET_TO_USERS)
+    for row_idx, account_id, tag in [(0, "alice", "Yes"), (1, "alice", "No"), (0, "bob", "No"), (3, "bob", "Yes")]:
+        counters.record(row_idx, news_data[row_idx]["Tag"], tag, account_id)
+        news_data[row_idx]["Tag"] = tag
+
+    assert counters.user_totals("alice") == (3, 2)
+    assert counters.user_totals("bob") == (5, 2)
+    assert counters.set_done == [2, 1]
+    assert counters.tag_count("No") == 2 and counters.tag_count("Yes") == 1
+
+    # Clearing a label takes the row off the user's done rows
+    counters.record(1, news_data[1]["Tag"], "", "alice")
+    news_data[1]["Tag"] = ""
+    assert counters.user_totals("alice") == (3, 1)
+
+    rebuilt = summary_counters.SummaryCounters()
+    rebuilt.rebuild(news_data, SETS, SET_TO_USERS, annotations=[
+        (0, "alice", "Yes"), (1, "alice", "No"), (0, "bob", "No"), (3, "bob", "Yes"), (1, "alice", "")])
+    assert rebuilt.matches(counters)
+
+
+def test_rows_remaining_is_per_annotator(start_app, tmp_path):
+    app = start_app()
+    passwords = upload(app, tmp_path, ["alice", "bob"], num_rows=6, num_sets=1, num_users_per_set=2)
+    token, rows, current_idx = login(app, "alice", passwords["alice"])
+    asyncio.run(app.submit_tag(token, rows, current_idx, "Yes"))
+
+    status_df = app.summary_tables(app.admin_password)[2]["value"].set_index("User")
+    assert status_df.loc["alice", "Rows Remaining"] == 5
+    assert status_df.loc["bob", "Rows Remaining"] == 6
+
+    # A restart rebuilds the same counts from the stored labels
+    app = start_app()
+    status_df = app.summary_tables(app.admin_password)[2]["value"].set_index("User")
+    assert status_df["Rows Remaining"].to_dict() == {"alice": 5, "bob": 6}
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+import export
+import item_store
+import tag_log
+
+
+@pytest.fixture
+def files(tmp_path):
+    output_file, log_file = str(tmp_path / "tagged_results.csv"), str(tmp_path / "tag_events.log")
+    pd.DataFrame({"URL": [f"u{i}" for i in range(4)], "Company Name": ["Acme"] * 4, "Tag": [None] * 4}) \
+        .to_csv(output_file, index=False)
+    tag_log.reset_tag_log(log_file)
+    return output_file, log_file, str(tmp_path / "user_progress.csv"), str(tmp_path / "annotations.csv")
+
+
+def test_replay_applies_logged_tags_and_progress(files):
+    output_file, log_file, _, _ = files
+    tag_log.append_tag_events(log_file, [(0, "alice", "Yes"), (1, "bob", "No")], {"alice": 1, "bob": 1})
+    tag_log.append_tag_event(log_file, 0, "bob", "No", current_idx=2)
+
+    news_data, progress = tag_log.load_tagged_state(output_file, log_file)
+    assert [news_data[row_idx]["Tag"] for row_idx in range(4)] == ["No", "No", None, None]
+    assert news_data[0][export.TAGGED_BY] == "bob" and news_data[0][export.TAGGED_AT] is not None
+    assert progress == {"alice": 1, "bob": 2}
+    assert tag_log.load_annotations(None, log_file) == [(0, "alice", "Yes"), (1, "bob", "No"), (0, "bob", "No")]
+
+
+def test_compaction_folds_the_log_into_the_results(files):
+    output_file, log_file, progress_file, annotations_file = files
+    tag_log.append_tag_events(log_file, [(0, "alice", "Yes"), (2, "alice", "No")], {"alice": 2})
+    news_data, progress = tag_log.load_tagged_state(output_file, log_file)
+    annotations = [(0, "alice", "Yes"), (2, "alice", "No")]
+
+    assert tag_log.compact_tag_log(log_file, output_file, news_data, progress, progress_file,
+                                   lambda: annotations, annotations_file)
+    assert not tag_log.compact_tag_log(log_file, output_file, news_data, progress, progress_file)
+    tag_log.append_tag_event(log_file, 3, "bob", "Yes", current_idx=1)
+
+    # Restored from the compacted files plus the events logged since
+    news_data, progress = tag_log.load_tagged_state(output_file, log_file, progress_file)
+    assert [news_data[row_idx]["Tag"] for row_idx in range(4)] == ["Yes", None, "No", "Yes"]
+    assert isinstance(news_data, item_store.ItemStore)
+    assert progress == {"alice": 2, "bob": 1}
+    assert sorted(tag_log.load_annotations(annotations_file, log_file)) == [
+        (0, "alice", "Yes"), (2, "alice", "No"), (3, "bob", "Yes")]
+
+
+def test_reset_discards_logged_events(files):
+    output_file, log_file, _, _ = files
+    tag_log.append_tag_event(log_file, 0, "alice", "Yes")
+    tag_log.reset_tag_log(log_file)
+    news_data, progress = tag_log.load_tagged_state(output_file, log_file)
+    assert news_data[0]["Tag"] is None and progress == {}
+
+
+def test_progress_records_are_replayed_as_logged(files):
+    output_file, log_file, _, _ = files
+    # A revisited row does not advance progress, and progress can move without a tag
+    tag_log.append_tag_events(log_file, [(0, "alice", "Yes"), (0, "alice", "No")], {"alice": 1})
+    tag_log.append_tag_events(log_file, [], {"alice": 3, "bob": 2})
+
+    news_data, progress = tag_log.load_tagged_state(output_file, log_file)
+    assert news_data[0]["Tag"] == "No"
+    assert progress == {"alice": 3, "bob": 2}
+    assert tag_log.load_annotations(None, log_file) == [(0, "alice", "Yes"), (0, "alice", "No")]
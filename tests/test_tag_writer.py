@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+import tag_writer
+
+
+class FakeStore:
+    def __init__(self, fail=False):
+        self.lock = threading.RLock()
+        self.writes = []
+        self.fail = fail
+
+    def record_tags(self, events, progress):
+        if self.fail:
+            raise OSError("disk full")
+        self.writes.append((list(events), dict(progress)))
+
+
+def start_writer(store, fail_row=None):
+    applied = []
+
+    def apply(account_id, row_idx, tag, current_idx):
+        if row_idx is not None and row_idx == fail_row:
+            raise KeyError(row_idx)
+        applied.append((account_id, row_idx, tag, current_idx))
+
+    return tag_writer.TagWriter(lambda: store, apply), applied
+
+
+def test_batch_is_stored_in_one_write():
+    store = FakeStore()
+    writer, applied = start_writer(store)
+    writer.write("warmup", current_idx=0)
+    with store.lock:
+        futures = [writer.submit("alice", row_idx, "Yes", row_idx + 1) for row_idx in range(3)]
+        # The writer thread waits for the lock with the first update, then drains the rest
+        assert not any(future.done() for future in futures)
+    for future in futures:
+        assert future.result(timeout=5) is None
+    events = [event for write_events, _ in store.writes[1:] for event in write_events]
+    assert events == [(0, "alice", "Yes"), (1, "alice", "Yes"), (2, "alice", "Yes")]
+    assert store.writes[-1][1] == {"alice": 3}
+    assert applied[1:] == [("alice", row_idx, "Yes", row_idx + 1) for row_idx in range(3)]
+
+
+def test_failed_apply_only_fails_its_own_submission():
+    store = FakeStore()
+    writer, applied = start_writer(store, fail_row=1)
+    writer.write("warmup", current_idx=0)
+    with store.lock:
+        ok = writer.submit("alice", 0, "Yes", 1)
+        failing = writer.submit_many([("bob", 1, "No", 1), ("bob", 2, "No", 2)])
+        later = writer.submit("carol", 3, "Yes", 1)
+    assert ok.result(timeout=5) is None and later.result(timeout=5) is None
+    with pytest.raises(KeyError):
+        failing.result(timeout=5)
+    # The stored updates are all applied, except the one that raised
+    assert [row_idx for _, row_idx, _, _ in applied[1:]] == [0, 2, 3]
+    assert sum(len(events) for events, _ in store.writes) == 4
+
+
+def test_invalid_updates_are_refused_before_they_are_stored():
+    store = FakeStore()
+    writer, applied = start_writer(store)
+    for update in [(None, 0, "Yes", 1), ("alice", -1, "Yes", 1), ("alice", 0, 3, 1), ("alice", None, None, "2")]:
+        with pytest.raises(ValueError):
+            writer.write(*update)
+    writer.write("alice", 0, "Yes", 1)
+    assert store.writes == [([(0, "alice", "Yes")], {"alice": 1})]
+    assert applied == [("alice", 0, "Yes", 1)]
+
+
+def test_failed_store_fails_every_submission_and_applies_nothing():
+    store = FakeStore(fail=True)
+    writer, applied = start_writer(store)
+    with pytest.raises(OSError):
+        writer.write_many([("alice", 0, "Yes", 1), ("alice", 1, "No", 2)])
+    assert applied == []
+
+
+def test_keyed_locks():
+    locks = tag_writer.KeyedLocks()
+    assert locks["alice"] is locks["alice"]
+    assert locks["alice"] is not locks["bob"]
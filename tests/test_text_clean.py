@@ -0,0 +1,53 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import text_clean
+
+# Letters, removed characters and category 'C' code points (controls, format, private use, unassigned)
+ALPHABET = list("abc XYZ \u00e9,`") + ["\x00", "\x1f", "\x7f", "\u200b", "\ue000", "\U0010fffd", "\U000e0001", "\u0378",
+                                  "😀", "\U00020000"]
+
+
+def random_texts(rng, count, surrogates=False):
+    alphabet = ALPHABET + (["\ud800", "\udfff"] if surrogates else [])
+    # Lengths around length * window, including strings mostly made of removed characters
+    return [None if rng.random() < 0.1 else
+            "".join(rng.choice(alphabet if rng.random() < 0.5 else ["\x00", ","]) for _ in range(rng.randrange(260)))
+            for _ in range(count)]
+
+
+@pytest.mark.parametrize("dtype", ["object", "pyarrow"])
+@pytest.mark.parametrize("remove_chars", [",", "`,"])
+def test_clean_prefix_matches_per_character_cleaning(dtype, remove_chars):
+    rng = random.Random(7)
+    texts = random_texts(rng, 400, surrogates=dtype == "object")
+    series = pd.Series(texts, dtype=object if dtype == "object" else pd.StringDtype("pyarrow")).fillna("")
+    expected = pd.Series(texts, dtype=object).fillna("").map(lambda text: text_clean.clean_text(text, remove_chars))
+    for length in (1, 50):
+        result = text_clean.clean_prefix(series, remove_chars, length)
+        assert result.astype(object).tolist() == expected.str[:length].tolist()
+
+
+def test_removal_pattern_without_surrogates():
+    pattern = text_clean.removal_pattern(",", surrogates=False)
+    series = pd.Series(["a,\x00b\u200c", "\U0010fffd"], dtype=pd.StringDtype("pyarrow"))
+    assert series.str.replace(pattern, "", regex=True).tolist() == ["ab", ""]
+    assert "\ud800" not in pattern and "\udfff" not in pattern
+
+
+def test_make_links():
+    df = pd.DataFrame({
+        "ArticleID": [12.0, 7.0, np.nan, 3.0],
+        "Company": ["Acme Corp", "Globex!", "Initech", "Initech"],
+        "URL": pd.array([None, "  ", None, "https://news.example.com/3"], dtype=pd.StringDtype()),
+    })
+    dates = pd.Series(["2024-01-02", "2024-01-03", "2024-01-04", None])
+    links = text_clean.make_links(df, "https://example.com/files/", dates)
+    assert links[0] == "https://example.com/files/12_acme_corp_2024-01-02"
+    assert links[1] == "https://example.com/files/7_globex_2024-01-03"
+    # Like csv.py, a row without a URL or an ArticleID gets no link
+    assert pd.isna(links[2])
+    assert links[3] == "https://news.example.com/3"
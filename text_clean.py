@@ -0,0 +1,105 @@
+import functools
+import sys
+import unicodedata
+
+import pandas as pd
+
+SURROGATES = (0xD800, 0xDFFF)
+SLUG_REMOVED = r'[^a-z0-9_-]'  # Slugs keep only letters, numbers, underscores and hyphens
+
+
+def clean_text(text, remove_chars):
+    """
+    Remove control characters (Unicode category 'C') and the characters in
+    remove_chars from one string. The per-row reference clean_series() matches.
+    """
+    # Remove control characters (Unicode category 'C')
+    text = ''.join(ch for ch in text if unicodedata.category(ch)[0] != 'C')
+    # Remove specified characters (e.g., commas, backticks)
+    text = text.translate(str.maketrans('', '', remove_chars))
+    return text
+
+
+@functools.lru_cache(maxsize=None)
+def _control_ranges():
+    """(first, last) code point ranges of Unicode category 'C', scanned once (about 0.3s)."""
+    ranges, start = [], None
+    for code in range(sys.maxunicode + 2):
+        control = code <= sys.maxunicode and unicodedata.category(chr(code))[0] == 'C'
+        if control and start is None:
+            start = code
+        elif not control and start is not None:
+            ranges.append((start, code - 1))
+            start = None
+    return tuple(ranges)
+
+
+def _class_char(code):
+    # \xHH is understood by both Python's re and pyarrow's RE2 and escapes the class syntax; other characters stand for themselves
+    return f"\\x{code:02x}" if code < 0x80 else chr(code)
+
+
+@functools.lru_cache(maxsize=None)
+def removal_pattern(remove_chars, surrogates=True):
+    """
+    Regex character class of the characters clean_text() removes: category
+    'C' plus remove_chars. Built once per remove_chars.
+
+    Args:
+        remove_chars: Characters removed besides the control characters.
+        surrogates: Whether to include the surrogate code points, which
+            pyarrow strings cannot hold (and RE2 patterns cannot contain).
+    """
+    ranges = list(_control_ranges()) + [(ord(ch), ord(ch)) for ch in sorted(set(remove_chars))]
+    if not surrogates:
+        first, last = SURROGATES
+        ranges = [part for start, end in ranges for part in ((start, min(end, first - 1)), (max(start, last + 1), end))
+                  if part[0] <= part[1]]
+    return "[" + "".join(_class_char(start) if start == end else f"{_class_char(start)}-{_class_char(end)}"
+                         for start, end in ranges) + "]"
+
+
+def clean_series(series, remove_chars):
+    """
+    clean_text() applied to every string of a Series in one regex pass: RE2
+    over the whole column for pyarrow-backed strings, Python's re otherwise.
+    """
+    arrow = getattr(series.dtype, "storage", None) == "pyarrow"
+    return series.str.replace(removal_pattern(remove_chars, surrogates=not arrow), '', regex=True)
+
+
+def clean_prefix(series, remove_chars, length, window=4):
+    """
+    The first `length` characters of clean_series(series, remove_chars),
+    cleaning only the first length * window characters of each string; the
+    few strings that then come out short are cleaned in full.
+    """
+    limit = length * window
+    prefix = clean_series(series.str[:limit], remove_chars).str[:length]
+    # Removal goes character by character, so a prefix that reached `length` is already final
+    short = (prefix.str.len() < length) & (series.str.len() > limit)
+    if short.any():
+        prefix[short] = clean_series(series[short], remove_chars).str[:length]
+    return prefix
+
+
+def make_links(df, common_prefix, dates):
+    """
+    Link of every row: its URL if non-empty, otherwise common_prefix plus the
+    slug of ArticleID_Company_Date.
+
+    Args:
+        df: The articles ('ArticleID', 'Company', 'URL').
+        common_prefix: Prefix of the generated links.
+        dates: The rows' dates already formatted as YYYY-MM-DD.
+    """
+    article_ids = df['ArticleID'].astype(str)
+    if df['ArticleID'].dtype.kind == 'f':
+        # IDs read as floats because some cells are blank keep their integer form (12, not 12.0)
+        article_ids = article_ids.str.replace(r'\.0$', '', regex=True)
+    # Generate the suffix: ArticleID_Company_Date
+    suffix = article_ids + '_' + df['Company'].str.replace(' ', '_') + '_' + dates
+    # Clean the suffix: keep only letters, numbers, underscores, and hyphens
+    slug = suffix.str.lower().str.replace(SLUG_REMOVED, '', regex=True)
+    # Use URL if non-empty; otherwise, use common_prefix + slug
+    return df['URL'].where(df['URL'].notna() & (df['URL'].str.strip() != ''), common_prefix + slug)